@@ -7,11 +7,24 @@ from scipy import stats
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
-import math
 
 from cache_service import cache, cached_analytics
 
 
+def _frame_values(frame) -> Tuple[np.ndarray, np.ndarray]:
+    """(mask of positive readings, their glucose as float64) for a database.GlucoseFrame"""
+    mask = frame.glucose > 0
+    return mask, frame.glucose[mask].astype(np.float64)
+
+
+def _group_by(keys: np.ndarray, values: np.ndarray, size: int) -> List[np.ndarray]:
+    """values split by integer key 0..size-1 (one sort instead of a dict of lists)"""
+    order = np.argsort(keys, kind="stable")
+    bounds = np.searchsorted(keys[order], np.arange(size + 1))
+    values = values[order]
+    return [values[bounds[key]:bounds[key + 1]] for key in range(size)]
+
+
 # ============================================================================
 # CLINICAL METRICS CALCULATIONS
 # ============================================================================
@@ -51,7 +64,7 @@ class ClinicalMetrics:
         - CV < 36%: Stable glucose
         - CV ≥ 36%: Unstable glucose (higher hypoglycemia risk)
         """
-        if not glucose_values or len(glucose_values) < 2:
+        if len(glucose_values) < 2:
             return 0.0
         
         mean_val = np.mean(glucose_values)
@@ -74,7 +87,7 @@ class ClinicalMetrics:
         - High: 181-250 mg/dL (Level 1 hyperglycemia)
         - Very High: > 250 mg/dL (Level 2 hyperglycemia)
         """
-        if not glucose_values:
+        if len(glucose_values) == 0:
             return {
                 "very_low": 0.0,
                 "low": 0.0,
@@ -83,13 +96,14 @@ class ClinicalMetrics:
                 "very_high": 0.0
             }
         
-        total = len(glucose_values)
+        values = np.asarray(glucose_values, dtype=np.float64)
+        total = len(values)
         
-        very_low = sum(1 for v in glucose_values if v < 54) / total * 100
-        low = sum(1 for v in glucose_values if 54 <= v < 70) / total * 100
-        in_range = sum(1 for v in glucose_values if 70 <= v <= 180) / total * 100
-        high = sum(1 for v in glucose_values if 180 < v <= 250) / total * 100
-        very_high = sum(1 for v in glucose_values if v > 250) / total * 100
+        very_low = int(np.count_nonzero(values < 54)) / total * 100
+        low = int(np.count_nonzero((values >= 54) & (values < 70))) / total * 100
+        in_range = int(np.count_nonzero((values >= 70) & (values <= 180))) / total * 100
+        high = int(np.count_nonzero((values > 180) & (values <= 250))) / total * 100
+        very_high = int(np.count_nonzero(values > 250)) / total * 100
         
         return {
             "very_low": round(very_low, 1),
@@ -109,24 +123,20 @@ class ClinicalMetrics:
         
         Source: Kovatchev et al., Diabetes Technology & Therapeutics
         """
-        if not glucose_values:
+        if len(glucose_values) == 0:
             return {"lbgi": 0.0, "hbgi": 0.0, "risk_category": "unknown"}
         
-        lbgi_sum = 0.0
-        hbgi_sum = 0.0
+        values = np.asarray(glucose_values, dtype=np.float64)
         
-        for glucose in glucose_values:
-            # Transform glucose to symmetric scale
-            if glucose > 0:
-                f_glucose = 1.509 * ((math.log(glucose) ** 1.084) - 5.381)
-                
-                # Risk function
-                if f_glucose < 0:
-                    lbgi_sum += 10 * (f_glucose ** 2)
-                else:
-                    hbgi_sum += 10 * (f_glucose ** 2)
+        # Transform glucose to symmetric scale
+        f_glucose = 1.509 * ((np.log(values[values > 0]) ** 1.084) - 5.381)
         
-        n = len(glucose_values)
+        # Risk function
+        risk = 10 * (f_glucose ** 2)
+        lbgi_sum = float(risk[f_glucose < 0].sum())
+        hbgi_sum = float(risk[f_glucose >= 0].sum())
+        
+        n = len(values)
         lbgi = lbgi_sum / n
         hbgi = hbgi_sum / n
         
@@ -188,6 +198,20 @@ class AGPCalculator:
             except Exception:
                 continue
         
+        return AGPCalculator._agp_from_buckets(time_buckets, days)
+    
+    @staticmethod
+    def calculate_agp_frame(frame, days: int = 14) -> Dict:
+        """calculate_agp for a database.GlucoseFrame"""
+        if len(frame) == 0:
+            return {"error": "No readings available"}
+        mask, values = _frame_values(frame)
+        groups = _group_by(frame.minute_of_day[mask] // 15, values, 96)
+        return AGPCalculator._agp_from_buckets(dict(enumerate(groups)), days)
+    
+    @staticmethod
+    def _agp_from_buckets(time_buckets: Dict[int, List[float]], days: int) -> Dict:
+        """Percentile curves and summary from the readings of each 15-minute slot"""
         # Calculate percentiles for each bucket
         agp_data = {
             "time_labels": [],
@@ -209,14 +233,15 @@ class AGPCalculator:
             
             values = time_buckets.get(bucket, [])
             
-            if values and len(values) >= 3:
-                agp_data["p5"].append(round(np.percentile(values, 5), 1))
-                agp_data["p10"].append(round(np.percentile(values, 10), 1))
-                agp_data["p25"].append(round(np.percentile(values, 25), 1))
-                agp_data["median"].append(round(np.percentile(values, 50), 1))
-                agp_data["p75"].append(round(np.percentile(values, 75), 1))
-                agp_data["p90"].append(round(np.percentile(values, 90), 1))
-                agp_data["p95"].append(round(np.percentile(values, 95), 1))
+            if len(values) >= 3:
+                p5, p10, p25, p50, p75, p90, p95 = np.percentile(values, [5, 10, 25, 50, 75, 90, 95])
+                agp_data["p5"].append(round(p5, 1))
+                agp_data["p10"].append(round(p10, 1))
+                agp_data["p25"].append(round(p25, 1))
+                agp_data["median"].append(round(p50, 1))
+                agp_data["p75"].append(round(p75, 1))
+                agp_data["p90"].append(round(p90, 1))
+                agp_data["p95"].append(round(p95, 1))
             else:
                 # Interpolate or use None for missing data
                 agp_data["p5"].append(None)
@@ -228,15 +253,15 @@ class AGPCalculator:
                 agp_data["p95"].append(None)
         
         # Calculate summary statistics
-        all_values = [v for values in time_buckets.values() for v in values]
+        all_values = np.concatenate([np.asarray(values, dtype=np.float64) for values in time_buckets.values()] or [[]])
         
         return {
             "agp_curves": agp_data,
             "summary": {
                 "total_readings": len(all_values),
                 "days_of_data": days,
-                "mean_glucose": round(np.mean(all_values), 1) if all_values else 0,
-                "gmi": ClinicalMetrics.calculate_gmi(np.mean(all_values) if all_values else 0),
+                "mean_glucose": round(np.mean(all_values), 1) if len(all_values) else 0,
+                "gmi": ClinicalMetrics.calculate_gmi(np.mean(all_values) if len(all_values) else 0),
                 "cv": ClinicalMetrics.calculate_cv(all_values),
                 "time_in_range": ClinicalMetrics.calculate_time_in_range(all_values)
             }
@@ -304,15 +329,30 @@ class PatternAnalyzer:
             except Exception:
                 continue
         
+        return PatternAnalyzer._time_period_stats(period_data)
+    
+    @staticmethod
+    def analyze_by_time_period_frame(frame) -> Dict[str, Dict]:
+        """analyze_by_time_period for a database.GlucoseFrame"""
+        mask, values = _frame_values(frame)
+        periods = list(PatternAnalyzer.TIME_PERIODS)
+        period_of_hour = np.array([periods.index(PatternAnalyzer.get_time_period(hour)) for hour in range(24)])
+        groups = _group_by(period_of_hour[frame.hour[mask]], values, len(periods))
+        return PatternAnalyzer._time_period_stats({
+            period: group for period, group in zip(periods, groups) if len(group)
+        })
+    
+    @staticmethod
+    def _time_period_stats(period_data: Dict[str, List[float]]) -> Dict[str, Dict]:
         results = {}
         for period, values in period_data.items():
-            if values:
+            if len(values):
                 results[period] = {
                     "mean": round(np.mean(values), 1),
                     "median": round(np.median(values), 1),
                     "std": round(np.std(values), 1),
-                    "min": round(min(values), 1),
-                    "max": round(max(values), 1),
+                    "min": round(float(np.min(values)), 1),
+                    "max": round(float(np.max(values)), 1),
                     "count": len(values),
                     "time_in_range": ClinicalMetrics.calculate_time_in_range(values)["in_range"],
                     "cv": ClinicalMetrics.calculate_cv(values)
@@ -352,7 +392,18 @@ class PatternAnalyzer:
             except Exception:
                 continue
         
-        if not pre_dawn_values or not dawn_values:
+        return PatternAnalyzer._dawn_result(pre_dawn_values, dawn_values)
+    
+    @staticmethod
+    def detect_dawn_phenomenon_frame(frame) -> Dict:
+        """detect_dawn_phenomenon for a database.GlucoseFrame"""
+        mask, values = _frame_values(frame)
+        hour = frame.hour[mask]
+        return PatternAnalyzer._dawn_result(values[(hour >= 3) & (hour < 5)], values[(hour >= 5) & (hour < 8)])
+    
+    @staticmethod
+    def _dawn_result(pre_dawn_values: List[float], dawn_values: List[float]) -> Dict:
+        if len(pre_dawn_values) == 0 or len(dawn_values) == 0:
             return {
                 "detected": False,
                 "message": "Insufficient data to analyze dawn phenomenon",
@@ -365,7 +416,7 @@ class PatternAnalyzer:
         dawn_avg = np.mean(dawn_values)
         rise = dawn_avg - pre_dawn_avg
         
-        detected = rise > 30  # Significant rise indicates dawn phenomenon
+        detected = bool(rise > 30)  # Significant rise indicates dawn phenomenon
         
         return {
             "detected": detected,
@@ -400,7 +451,25 @@ class PatternAnalyzer:
             except Exception:
                 continue
         
-        # Build the matrix
+        return PatternAnalyzer.build_heatmap({
+            (day, hour): np.mean(values)
+            for day, hours in heatmap.items() for hour, values in hours.items() if values
+        })
+    
+    @staticmethod
+    def generate_pattern_heatmap_frame(frame) -> Dict:
+        """generate_pattern_heatmap for a database.GlucoseFrame"""
+        mask, values = _frame_values(frame)
+        cells = frame.weekday[mask].astype(np.intp) * 24 + frame.hour[mask]
+        sums = np.bincount(cells, weights=values, minlength=7 * 24)
+        counts = np.bincount(cells, minlength=7 * 24)
+        return PatternAnalyzer.build_heatmap({
+            divmod(int(cell), 24): sums[cell] / counts[cell] for cell in np.flatnonzero(counts)
+        })
+    
+    @staticmethod
+    def build_heatmap(cell_means: Dict[Tuple[int, int], float]) -> Dict:
+        """The 7x24 heatmap payload from {(day_of_week (0 = Monday), hour): mean glucose}"""
         days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
         hours = list(range(24))
         
@@ -408,11 +477,8 @@ class PatternAnalyzer:
         for day in range(7):
             row = []
             for hour in range(24):
-                values = heatmap[day][hour]
-                if values:
-                    row.append(round(np.mean(values), 1))
-                else:
-                    row.append(None)
+                mean = cell_means.get((day, hour))
+                row.append(round(float(mean), 1) if mean is not None else None)
             matrix.append(row)
         
         return {
@@ -494,6 +560,58 @@ class PatternAnalyzer:
             except Exception:
                 continue
         
+        return PatternAnalyzer._meal_impact_summary(meal_impacts)
+    
+    @staticmethod
+    def analyze_meal_impact_frame(frame, meal_logs: List[Dict]) -> Dict:
+        """
+        analyze_meal_impact for a database.GlucoseFrame: each meal's window is
+        found by binary search on the (sorted) epochs instead of scanning every reading.
+        """
+        if len(frame) == 0 or not meal_logs:
+            return {"message": "Insufficient data for meal impact analysis"}
+        
+        meal_impacts = []
+        
+        for meal in meal_logs:
+            try:
+                meal_time = meal.get('timestamp')
+                if isinstance(meal_time, str):
+                    meal_time = datetime.fromisoformat(meal_time.replace('Z', '+00:00'))
+                meal_epoch = meal_time.timestamp()
+                
+                # Readings from 45 min before to 2.5 hours after
+                start = np.searchsorted(frame.epoch, meal_epoch - 45 * 60, side="left")
+                end = np.searchsorted(frame.epoch, meal_epoch + 150 * 60, side="right")
+                time_diff = (frame.epoch[start:end] - meal_epoch) / 60  # minutes
+                glucose = frame.glucose[start:end].astype(np.float64)
+                
+                pre = np.flatnonzero((time_diff >= -45) & (time_diff <= -15))
+                post = np.flatnonzero((time_diff > 0) & (time_diff <= 150))
+                pre_meal = round(float(glucose[pre[-1]]), 2) if len(pre) else None
+                
+                if pre_meal and len(post):
+                    peak = post[np.argmax(glucose[post])]
+                    post_2hr = post[np.argmin(np.abs(time_diff[post] - 120))]
+                    peak_glucose = round(float(glucose[peak]), 2)
+                    
+                    meal_impacts.append({
+                        "meal_time": meal_time.isoformat(),
+                        "description": meal.get('meal_description', 'Unknown'),
+                        "carbs": meal.get('carb_count', 0),
+                        "pre_meal_glucose": pre_meal,
+                        "peak_glucose": peak_glucose,
+                        "time_to_peak_min": round(float(time_diff[peak])),
+                        "glucose_rise": round(peak_glucose - pre_meal, 1),
+                        "post_2hr_glucose": round(float(glucose[post_2hr]), 2)
+                    })
+            except Exception:
+                continue
+        
+        return PatternAnalyzer._meal_impact_summary(meal_impacts)
+    
+    @staticmethod
+    def _meal_impact_summary(meal_impacts: List[Dict]) -> Dict:
         return {
             "meal_impacts": meal_impacts,
             "summary": {
@@ -644,13 +762,7 @@ def get_full_analytics(user_id: int, readings: List[Dict], meal_logs: List[Dict]
     glucose_values = [r.get('glucose_value') for r in readings if r.get('glucose_value')]
     
     # Calculate all metrics
-    clinical = {
-        "mean_glucose": round(np.mean(glucose_values), 1),
-        "gmi": ClinicalMetrics.calculate_gmi(np.mean(glucose_values)),
-        "cv": ClinicalMetrics.calculate_cv(glucose_values),
-        "time_in_range": ClinicalMetrics.calculate_time_in_range(glucose_values),
-        "risk_indices": ClinicalMetrics.calculate_glucose_risk_index(glucose_values)
-    }
+    clinical = _clinical_metrics(glucose_values)
     
     # Generate AGP
     agp = AGPCalculator.calculate_agp(readings, days)
@@ -676,6 +788,78 @@ def get_full_analytics(user_id: int, readings: List[Dict], meal_logs: List[Dict]
     }
 
 
+def get_full_analytics_frame(user_id: int, frame, meal_logs: List[Dict] = None, days: int = 7) -> Dict:
+    """get_full_analytics for a database.GlucoseFrame (same payload)"""
+    if len(frame) == 0:
+        return {"error": "No readings available for analytics"}
+    
+    _, glucose_values = _frame_values(frame)
+    patterns = {
+        "by_time_period": PatternAnalyzer.analyze_by_time_period_frame(frame),
+        "dawn_phenomenon": PatternAnalyzer.detect_dawn_phenomenon_frame(frame),
+        "heatmap": PatternAnalyzer.generate_pattern_heatmap_frame(frame)
+    }
+    if meal_logs:
+        patterns["meal_impact"] = PatternAnalyzer.analyze_meal_impact_frame(frame, meal_logs)
+    
+    return {
+        "clinical_metrics": _clinical_metrics(glucose_values),
+        "agp": AGPCalculator.calculate_agp_frame(frame, days),
+        "patterns": patterns,
+        "generated_at": datetime.now().isoformat(),
+        "data_range_days": days,
+        "total_readings": len(frame)
+    }
+
+
+def _clinical_metrics(glucose_values) -> Dict:
+    mean_glucose = np.mean(glucose_values)
+    return {
+        "mean_glucose": round(mean_glucose, 1),
+        "gmi": ClinicalMetrics.calculate_gmi(mean_glucose),
+        "cv": ClinicalMetrics.calculate_cv(glucose_values),
+        "time_in_range": ClinicalMetrics.calculate_time_in_range(glucose_values),
+        "risk_indices": ClinicalMetrics.calculate_glucose_risk_index(glucose_values)
+    }
+
+
+def get_rollup_analytics(summary: Dict, day_hour_stats: List[Dict], days: int = 90) -> Dict:
+    """
+    Long-window analytics from pre-aggregated rollups instead of raw readings:
+    `summary` is database.get_glucose_rollup_summary() and `day_hour_stats` is
+    database.get_glucose_stats_by_day_and_hour(). Same clinical metrics and
+    heatmap shape as get_full_analytics; percentiles are histogram estimates
+    (10 mg/dL bins).
+    """
+    total = summary["readings"]
+    mean = summary["mean"]
+    clinical = {
+        "mean_glucose": round(mean, 1),
+        "gmi": ClinicalMetrics.calculate_gmi(mean),
+        "cv": round(summary["sd"] / mean * 100, 1) if total > 1 and mean else 0.0,
+        "sd": round(summary["sd"], 1),
+        "time_in_range": {key: round(count / total * 100, 1) for key, count in summary["range_counts"].items()},
+        "min_glucose": round(summary["min"], 1),
+        "max_glucose": round(summary["max"], 1),
+        "percentiles": {key: round(value, 1) for key, value in summary["percentiles"].items()}
+    }
+    # PostgreSQL's DOW counts from Sunday = 0; the heatmap starts on Monday
+    heatmap = PatternAnalyzer.build_heatmap({
+        ((cell["day_of_week"] + 6) % 7, cell["hour"]): cell["avg_glucose"] for cell in day_hour_stats
+    })
+    return {
+        "clinical_metrics": clinical,
+        "patterns": {"heatmap": heatmap},
+        "generated_at": datetime.now().isoformat(),
+        "data_range_days": days,
+        "days_with_data": summary["days_with_data"],
+        "first_day": summary["first_day"].isoformat(),
+        "last_day": summary["last_day"].isoformat(),
+        "total_readings": total,
+        "source": "rollups"
+    }
+
+
 # ============================================================================
 # ADVANCED GLUCOSE ANALYTICS WRAPPER
 # ============================================================================
@@ -720,7 +904,16 @@ class AdvancedGlucoseAnalytics:
             except Exception:
                 continue
         
-        if not any(hourly_data.values()):
+        return self._hourly_agp(hourly_data)
+    
+    def calculate_agp_frame(self, frame, days: int = 7) -> Dict:
+        """calculate_agp for a database.GlucoseFrame"""
+        mask, values = _frame_values(frame)
+        return self._hourly_agp(dict(enumerate(_group_by(frame.hour[mask], values, 24))))
+    
+    @staticmethod
+    def _hourly_agp(hourly_data: Dict[int, List[float]]) -> Dict:
+        if not any(len(values) for values in hourly_data.values()):
             return None
         
         # Calculate percentiles per hour
@@ -735,12 +928,13 @@ class AdvancedGlucoseAnalytics:
         
         for hour in range(24):
             values = hourly_data.get(hour, [])
-            if values and len(values) >= 2:
-                result["p10"].append(round(np.percentile(values, 10), 1))
-                result["p25"].append(round(np.percentile(values, 25), 1))
-                result["median"].append(round(np.percentile(values, 50), 1))
-                result["p75"].append(round(np.percentile(values, 75), 1))
-                result["p90"].append(round(np.percentile(values, 90), 1))
+            if len(values) >= 2:
+                p10, p25, p50, p75, p90 = np.percentile(values, [10, 25, 50, 75, 90])
+                result["p10"].append(round(p10, 1))
+                result["p25"].append(round(p25, 1))
+                result["median"].append(round(p50, 1))
+                result["p75"].append(round(p75, 1))
+                result["p90"].append(round(p90, 1))
             else:
                 # Use previous value or placeholder
                 prev_idx = len(result["median"]) - 1
@@ -779,15 +973,24 @@ class AdvancedGlucoseAnalytics:
             except Exception:
                 continue
         
+        return self._hourly_patterns(hourly_data)
+    
+    def get_time_of_day_patterns_frame(self, frame) -> Dict[int, Dict]:
+        """get_time_of_day_patterns for a database.GlucoseFrame"""
+        mask, values = _frame_values(frame)
+        return self._hourly_patterns(dict(enumerate(_group_by(frame.hour[mask], values, 24))))
+    
+    @staticmethod
+    def _hourly_patterns(hourly_data: Dict[int, List[float]]) -> Dict[int, Dict]:
         result = {}
         for hour in range(24):
             values = hourly_data.get(hour, [])
-            if values:
+            if len(values):
                 result[hour] = {
                     "avg": round(np.mean(values), 1),
                     "count": len(values),
-                    "min": round(min(values), 1),
-                    "max": round(max(values), 1)
+                    "min": round(float(np.min(values)), 1),
+                    "max": round(float(np.max(values)), 1)
                 }
             else:
                 result[hour] = {"avg": 120, "count": 0, "min": 120, "max": 120}
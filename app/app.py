@@ -1,19 +1,29 @@
 import os
-from flask import Flask, jsonify, request, send_from_directory
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
+from startup import timed, get_startup_report, start_background_warmup, WARMUP_ON_START
 import database as db
 import simulator
-from intelligent_core import process_user_intent
+# The predictor (Keras) and the RL agent (torch) are imported lazily by intelligent_core
+from intelligent_core import process_user_intent, get_prediction_service
+from inference_pool import InferencePoolFull, InferenceTimeout, get_pool_stats
+from prediction_pipeline import get_latest_prediction, get_pipeline_stats
 import threading
 import model_trainer
 from flask import send_file
-import report_generator
 import matplotlib
 matplotlib.use('Agg')  # Use a non-GUI backend for matplotlib
+with timed("report_generator (matplotlib, fpdf)"):
+    import report_generator
 
 # Import new services
-from analytics_service import get_full_analytics, ClinicalMetrics, AGPCalculator, PatternAnalyzer, AdvancedGlucoseAnalytics
+with timed("analytics_service (scipy)"):
+    from analytics_service import (
+        get_full_analytics_frame, get_rollup_analytics, ClinicalMetrics, AGPCalculator, PatternAnalyzer,
+        AdvancedGlucoseAnalytics
+    )
 from cache_service import cache, on_new_glucose_reading, on_new_meal_log, on_model_calibration
 from websocket_service import (
     socketio, broadcast_glucose_update, broadcast_prediction_update,
@@ -37,10 +47,27 @@ print("[App] WebSocket initialized with Flask-SocketIO")
 def serve_frontend():
     return send_from_directory(app.static_folder, 'index.html')
 
+# --- Inference backpressure ---
+# Raised by the inference pool when its queue is full or a job runs too long
+@app.errorhandler(InferencePoolFull)
+def inference_pool_full(e):
+    response = jsonify({"error": "The AI service is busy, please retry shortly.", "retry_after": e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+@app.errorhandler(InferenceTimeout)
+def inference_timeout(e):
+    return jsonify({"error": str(e)}), 504
+
 @app.route('/api/health')
 def health_check():
     return "Project Aura Backend is running!"
 
+@app.route('/api/startup', methods=['GET'])
+def startup_report():
+    """Time spent per import and per model load, and whether the warmup thread has finished."""
+    return jsonify(get_startup_report())
+
 @app.route("/register", methods=['POST'], strict_slashes=False)
 def register():
     data = request.get_json()
@@ -54,15 +81,11 @@ def register():
         return jsonify({"error": "Username already taken"}), 409
 
     hashed_password = generate_password_hash(password)
-    conn = db.get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO users (username, password_hash, name, age, gender, phone_number, weight_kg, height_cm) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-        (username, hashed_password, name, age, gender, phone, weight, height)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db.db_cursor() as cur:
+        cur.execute(
+            "INSERT INTO users (username, password_hash, name, age, gender, phone_number, weight_kg, height_cm) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            (username, hashed_password, name, age, gender, phone, weight, height)
+        )
     return jsonify({"message": "User registered successfully!"}), 201
 
 @app.route("/login", methods=['POST'], strict_slashes=False)
@@ -191,8 +214,23 @@ def get_dashboard():
     if not user_id:
         return jsonify({"error": "A 'user_id' query parameter is required"}), 400
 
-    dashboard_data = db.get_dashboard_data_for_user(user_id)
-    return jsonify(dashboard_data)
+    # Read-through cache, invalidated by the on_new_glucose_reading / on_new_meal_log hooks
+    dashboard_data = cache.get_or_load_dashboard_data(int(user_id), db.get_dashboard_data_for_user)
+    # Forecast precomputed when the latest reading arrived (None until it is ready).
+    # Not part of the cached payload: it is refreshed on its own schedule.
+    return jsonify({**dashboard_data, "latest_prediction": get_latest_prediction(int(user_id))})
+
+@app.route('/api/prediction/latest', methods=['GET'])
+def latest_prediction():
+    """Forecast precomputed on glucose ingest. 202 while it is still being computed."""
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "A 'user_id' query parameter is required"}), 400
+
+    latest = get_latest_prediction(int(user_id))
+    if latest is None:
+        return jsonify({"status": "pending", "message": "Forecast is being computed, retry shortly."}), 202
+    return jsonify(latest)
 # ==================================================================
 # === NEW: PDF REPORT DOWNLOAD ENDPOINT ============================
 # ==================================================================
@@ -227,18 +265,147 @@ def simulate_data_endpoint():
     if not user_id:
         return jsonify({"error": "A 'user_id' is required"}), 400
     try:
+        # The simulator fires the cache hooks, which also precompute the newest reading's forecast
         simulator.generate_and_insert_data(user_id=user_id, days_of_data=3)
-        # Invalidate cache and broadcast update
-        cache.invalidate_all_user_cache(int(user_id))
         broadcast_dashboard_refresh(int(user_id), "demo_data_added")
         return jsonify({'message': f'Successfully generated 3 days of data for user {user_id}.'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ==================================================================
+# === BULK GLUCOSE INGESTION =======================================
+# ==================================================================
+
+GLUCOSE_BATCH_MAX = int(os.getenv("AURA_GLUCOSE_BATCH_MAX", "5000"))
+GLUCOSE_VALUE_RANGE = (20.0, 600.0)  # mg/dL; anything outside is a sensor error, not a reading
+GLUCOSE_MAX_CLOCK_SKEW = timedelta(minutes=5)  # How far in the future a device timestamp may be
+
+
+def _parse_glucose_batch(readings: list) -> tuple:
+    """
+    Validates uploaded readings ({"timestamp": ISO 8601 or epoch seconds,
+    "glucose_value": mg/dL}). Timestamps without a zone are taken as UTC.
+    Returns ([(timestamp, value), ...] deduplicated by timestamp with the last
+    upload winning, [{"index", "error"}, ...] for the rejected ones).
+    """
+    latest_allowed = datetime.now(timezone.utc) + GLUCOSE_MAX_CLOCK_SKEW
+    accepted, rejected = {}, []
+    for index, reading in enumerate(readings):
+        try:
+            raw_time, value = reading["timestamp"], float(reading["glucose_value"])
+            if isinstance(raw_time, (int, float)) and not isinstance(raw_time, bool):
+                timestamp = datetime.fromtimestamp(raw_time, timezone.utc)
+            else:
+                timestamp = datetime.fromisoformat(str(raw_time).replace("Z", "+00:00"))
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+        except (KeyError, TypeError, ValueError, OverflowError, OSError) as e:
+            rejected.append({"index": index, "error": f"invalid reading: {e}"})
+            continue
+        if not GLUCOSE_VALUE_RANGE[0] <= value <= GLUCOSE_VALUE_RANGE[1]:
+            rejected.append({"index": index, "error": f"glucose_value {value} outside {GLUCOSE_VALUE_RANGE}"})
+        elif timestamp > latest_allowed:
+            rejected.append({"index": index, "error": f"timestamp {timestamp.isoformat()} is in the future"})
+        else:
+            accepted.pop(timestamp, None)  # Re-insert so the order follows the last upload
+            accepted[timestamp] = value
+    return list(accepted.items()), rejected
+
+
+@app.route('/api/glucose/batch', methods=['POST'])
+def ingest_glucose_batch():
+    """
+    Bulk CGM upload: {"user_id": 1, "readings": [{"timestamp": "...", "glucose_value": 123}, ...]}.
+    Valid readings are loaded with COPY in one transaction; readings already stored
+    for the same (user, timestamp) are skipped. Cache invalidation, the forecast
+    and the WebSocket update happen once per batch, for the newest reading.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id, readings = data.get('user_id'), data.get('readings')
+    if not user_id or not isinstance(readings, list):
+        return jsonify({"error": "A 'user_id' and a 'readings' list are required"}), 400
+    if len(readings) > GLUCOSE_BATCH_MAX:
+        return jsonify({"error": f"At most {GLUCOSE_BATCH_MAX} readings per batch"}), 413
+
+    rows, rejected = _parse_glucose_batch(readings)
+    result = {"inserted": 0, "expired": 0, "duplicates": 0, "latest": None, "elapsed_ms": 0,
+              "rows_per_second": None}
+    if rows:
+        try:
+            result = db.bulk_insert_glucose_readings(int(user_id), rows)
+        except Exception as e:
+            print(f"--- [API] ERROR: Bulk glucose load failed for user {user_id}: {e} ---")
+            return jsonify({"error": f"Could not store the readings: {e}"}), 500
+
+    latest = result["latest"]
+    if latest is not None:
+        if latest["is_current"]:  # A backfill of older readings isn't a live update
+            broadcast_glucose_update(int(user_id), {
+                "glucose_value": latest["glucose_value"],
+                "timestamp": latest["timestamp"].isoformat()
+            })
+        broadcast_dashboard_refresh(int(user_id), "glucose_batch")
+
+    return jsonify({
+        "received": len(readings),
+        "inserted": result["inserted"],
+        # Repeated within the upload or already stored
+        "duplicates": len(readings) - len(rejected) - result["inserted"] - result["expired"],
+        # Older than the retention window (AURA_GLUCOSE_RETENTION_MONTHS)
+        "expired": result["expired"],
+        "rejected": rejected,
+        "latest": {**latest, "timestamp": latest["timestamp"].isoformat()} if latest else None,
+        "elapsed_ms": result["elapsed_ms"],
+        "rows_per_second": result["rows_per_second"]
+    }), 201 if result["inserted"] else 200
+
+
+def _glucose_csv_rows(user_id: int):
+    """CSV lines for a user's complete history, one block per history chunk"""
+    import numpy as np
+    yield "timestamp,glucose_value\n"
+    for epoch, glucose in db.iter_glucose_history(user_id, with_timestamps=True):
+        timestamps = np.datetime_as_string(
+            np.round(epoch * 1e6).astype(np.int64).astype('datetime64[us]'), unit='s', timezone='UTC'
+        )
+        values = np.char.mod('%g', glucose.astype(np.float64))
+        yield "".join(f"{timestamp},{value}\n" for timestamp, value in zip(timestamps, values))
+
+
+@app.route('/api/glucose/export', methods=['GET'])
+def export_glucose_history():
+    """
+    A user's complete glucose history as CSV (UTC timestamps), streamed from the
+    database chunk by chunk, so exporting years of readings doesn't load them all.
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    
+    return Response(
+        stream_with_context(_glucose_csv_rows(int(user_id))),
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment; filename=aura_glucose_user_{int(user_id)}.csv"}
+    )
+
+
 # ==================================================================
 # === ADVANCED ANALYTICS ENDPOINTS =================================
 # ==================================================================
 
+def _versioned_analytics(user_id, analytics_type: str, days: int, compute, version=None):
+    """
+    Memoizes compute() on the user's data version for the window (one small
+    query). The result is reused until a reading or meal is added, removed or
+    ages out of the window. Then the previous result is served while one
+    background computation catches up (see cache_service.SWR_GRACE_S).
+    compute() returns None when there's too little data; that isn't cached.
+    """
+    if version is None:
+        version = db.get_analytics_data_version(int(user_id), days=days)
+    return cache.get_or_load_versioned_analytics(int(user_id), analytics_type, days, version, compute)
+
+
 @app.route('/api/analytics/full', methods=['GET'])
 def get_advanced_analytics():
     """
@@ -254,17 +421,19 @@ def get_advanced_analytics():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
-    try:
-        # Get readings and meal logs from database
-        readings = db.get_glucose_readings_with_timestamps(int(user_id), days=days)
+    def compute():
+        # Get readings (as columns) and meal logs from database
+        frame = db.get_glucose_frame(int(user_id), days=days)
         meal_logs = db.get_meal_logs_for_analytics(int(user_id), days=days)
-        
-        if not readings:
+        if len(frame) == 0:
+            return None
+        return get_full_analytics_frame(int(user_id), frame, meal_logs, days=days)
+
+    try:
+        analytics = _versioned_analytics(user_id, "full_analytics", days, compute)
+        if analytics is None:
             return jsonify({"error": "No glucose data available for analysis"}), 404
         
-        # Generate full analytics
-        analytics = get_full_analytics(int(user_id), readings, meal_logs, days=days)
-        
         return jsonify(analytics)
     except Exception as e:
         print(f"[Analytics] Error: {e}")
@@ -283,18 +452,52 @@ def get_agp_data():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
+    def compute():
+        frame = db.get_glucose_frame(int(user_id), days=days)
+        if len(frame) < 20:
+            return None
+        return AGPCalculator.calculate_agp_frame(frame, days)
+
     try:
-        readings = db.get_glucose_readings_with_timestamps(int(user_id), days=days)
-        
-        if not readings or len(readings) < 20:
+        agp_data = _versioned_analytics(user_id, "agp", days, compute)
+        if agp_data is None:
             return jsonify({"error": "Insufficient data for AGP (need at least 20 readings)"}), 404
         
-        agp_data = AGPCalculator.calculate_agp(readings, days)
         return jsonify(agp_data)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/analytics/summary', methods=['GET'])
+def get_long_term_summary():
+    """
+    Long-window summary (default 90 days, max 365) from the hourly/daily rollups:
+    mean, GMI, CV, SD, Time in Range, percentiles and the weekly heatmap.
+    Reads a few hundred rollup rows, not the raw readings, which may already
+    have been removed by retention.
+    """
+    user_id = request.args.get('user_id')
+    days = min(int(request.args.get('days', 90)), 365)
+    
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    
+    def compute():
+        summary = db.get_glucose_rollup_summary(int(user_id), days=days)
+        if summary is None:
+            return None
+        return get_rollup_analytics(summary, db.get_glucose_stats_by_day_and_hour(int(user_id), days=days), days)
+
+    try:
+        version = db.get_rollup_data_version(int(user_id), days=days)
+        summary = _versioned_analytics(user_id, "rollup_summary", days, compute, version=version)
+        if summary is None:
+            return jsonify({"error": "No readings available for this period"}), 404
+        return jsonify(summary)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/analytics/clinical-metrics', methods=['GET'])
 def get_clinical_metrics():
     """
@@ -306,16 +509,14 @@ def get_clinical_metrics():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
-    try:
-        readings = db.get_glucose_readings_with_timestamps(int(user_id), days=days)
-        
-        if not readings:
-            return jsonify({"error": "No glucose data available"}), 404
-        
-        glucose_values = [r.get('glucose_value') for r in readings if r.get('glucose_value')]
+    def compute():
+        frame = db.get_glucose_frame(int(user_id), days=days)
+        if len(frame) == 0:
+            return None
         
         import numpy as np
-        metrics = {
+        glucose_values = frame.glucose[frame.glucose > 0].astype(np.float64)
+        return {
             "mean_glucose": round(np.mean(glucose_values), 1),
             "std_glucose": round(np.std(glucose_values), 1),
             "gmi": ClinicalMetrics.calculate_gmi(np.mean(glucose_values)),
@@ -325,6 +526,11 @@ def get_clinical_metrics():
             "total_readings": len(glucose_values),
             "days_analyzed": days
         }
+
+    try:
+        metrics = _versioned_analytics(user_id, "clinical_metrics", days, compute)
+        if metrics is None:
+            return jsonify({"error": "No glucose data available"}), 404
         
         return jsonify(metrics)
     except Exception as e:
@@ -342,23 +548,91 @@ def get_pattern_analysis():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
+    def compute():
+        frame = db.get_glucose_frame(int(user_id), days=days)
+        if len(frame) == 0:
+            return None
+        return {
+            "by_time_period": PatternAnalyzer.analyze_by_time_period_frame(frame),
+            "dawn_phenomenon": PatternAnalyzer.detect_dawn_phenomenon_frame(frame),
+            "heatmap": PatternAnalyzer.generate_pattern_heatmap_frame(frame)
+        }
+
     try:
-        readings = db.get_glucose_readings_with_timestamps(int(user_id), days=days)
-        
-        if not readings:
+        patterns = _versioned_analytics(user_id, "patterns", days, compute)
+        if patterns is None:
             return jsonify({"error": "No glucose data available"}), 404
         
-        patterns = {
-            "by_time_period": PatternAnalyzer.analyze_by_time_period(readings),
-            "dawn_phenomenon": PatternAnalyzer.detect_dawn_phenomenon(readings),
-            "heatmap": PatternAnalyzer.generate_pattern_heatmap(readings)
-        }
-        
         return jsonify(patterns)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _compute_advanced_analytics(user_id, days: int) -> dict:
+    """The /api/analytics/advanced payload; success is False when there are too few readings."""
+    # Get readings as columns (epoch, minute of day, weekday, glucose)
+    frame = db.get_glucose_frame(int(user_id), days=days)
+    
+    if len(frame) < 3:
+        return {
+            "success": False, 
+            "error": "Not enough data for advanced analytics",
+            "readings_count": len(frame)
+        }
+    
+    # Extract glucose values
+    import numpy as np
+    glucose_values = frame.glucose.astype(np.float64)
+    
+    # Calculate all metrics
+    analytics_engine = AdvancedGlucoseAnalytics()
+    
+    # AGP
+    agp = analytics_engine.calculate_agp_frame(frame)
+    
+    # GMI (Glucose Management Indicator)
+    avg_glucose = float(np.mean(glucose_values))
+    gmi = analytics_engine.calculate_gmi(avg_glucose)
+    
+    # Coefficient of Variation
+    cv = analytics_engine.calculate_coefficient_of_variation(glucose_values)
+    
+    # Time of day patterns (for heatmap)
+    time_patterns = analytics_engine.get_time_of_day_patterns_frame(frame)
+    
+    # Distribution
+    low = int(np.count_nonzero(glucose_values < 70))
+    normal = int(np.count_nonzero((glucose_values >= 70) & (glucose_values <= 180)))
+    high = int(np.count_nonzero(glucose_values > 180))
+    total = len(glucose_values)
+    
+    # Time in range
+    tir = (normal / total) * 100 if total > 0 else 0
+    
+    # Hypo events
+    hypo_events = low
+    
+    result = {
+        "success": True,
+        "user_id": user_id,
+        "days_analyzed": days,
+        "readings_count": total,
+        "average_glucose": round(avg_glucose, 1),
+        "gmi": round(gmi, 2),
+        "cv": round(cv, 2),
+        "time_in_range": round(tir, 1),
+        "hypo_events": hypo_events,
+        "agp": agp,
+        "time_of_day_patterns": time_patterns,
+        "distribution": {
+            "low": round((low / total) * 100, 1) if total > 0 else 0,
+            "normal": round((normal / total) * 100, 1) if total > 0 else 0,
+            "high": round((high / total) * 100, 1) if total > 0 else 0
+        }
+    }
+    return result
+
+
 @app.route('/api/analytics/advanced', methods=['GET'])
 def get_advanced_analytics_combined():
     """
@@ -373,74 +647,11 @@ def get_advanced_analytics_combined():
         return jsonify({"success": False, "error": "user_id is required"}), 400
     
     try:
-        # Check cache first
-        cache_key = f"advanced_analytics:{user_id}:{days}"
-        cached = cache.get(cache_key)
-        if cached:
-            return jsonify(cached)
-        
-        # Get readings with timestamps
-        readings = db.get_glucose_readings_with_timestamps(int(user_id), days=days)
-        
-        if not readings or len(readings) < 3:
-            return jsonify({
-                "success": False, 
-                "error": "Not enough data for advanced analytics",
-                "readings_count": len(readings) if readings else 0
-            }), 404
-        
-        # Extract glucose values
-        glucose_values = [r['glucose_value'] for r in readings]
-        
-        # Calculate all metrics
-        analytics_engine = AdvancedGlucoseAnalytics()
-        
-        # AGP
-        agp = analytics_engine.calculate_agp(readings)
-        
-        # GMI (Glucose Management Indicator)
-        avg_glucose = sum(glucose_values) / len(glucose_values)
-        gmi = analytics_engine.calculate_gmi(avg_glucose)
-        
-        # Coefficient of Variation
-        cv = analytics_engine.calculate_coefficient_of_variation(glucose_values)
-        
-        # Time of day patterns (for heatmap)
-        time_patterns = analytics_engine.get_time_of_day_patterns(readings)
-        
-        # Distribution
-        low = len([v for v in glucose_values if v < 70])
-        normal = len([v for v in glucose_values if 70 <= v <= 180])
-        high = len([v for v in glucose_values if v > 180])
-        total = len(glucose_values)
-        
-        # Time in range
-        tir = (normal / total) * 100 if total > 0 else 0
-        
-        # Hypo events
-        hypo_events = low
-        
-        result = {
-            "success": True,
-            "user_id": user_id,
-            "days_analyzed": days,
-            "readings_count": total,
-            "average_glucose": round(avg_glucose, 1),
-            "gmi": round(gmi, 2),
-            "cv": round(cv, 2),
-            "time_in_range": round(tir, 1),
-            "hypo_events": hypo_events,
-            "agp": agp,
-            "time_of_day_patterns": time_patterns,
-            "distribution": {
-                "low": round((low / total) * 100, 1) if total > 0 else 0,
-                "normal": round((normal / total) * 100, 1) if total > 0 else 0,
-                "high": round((high / total) * 100, 1) if total > 0 else 0
-            }
-        }
-        
-        # Cache for 5 minutes
-        cache.set(cache_key, result, ttl=300)
+        # Memoized on the data version: recomputed only when the readings change,
+        # and concurrent viewers share that one computation
+        result = _versioned_analytics(user_id, "advanced", days, lambda: _compute_advanced_analytics(user_id, days))
+        if not result.get("success"):
+            return jsonify(result), 404
         
         return jsonify(result)
         
@@ -462,14 +673,18 @@ def get_meal_impact_analysis():
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
     
-    try:
-        readings = db.get_glucose_readings_with_timestamps(int(user_id), days=days)
+    def compute():
+        frame = db.get_glucose_frame(int(user_id), days=days)
         meal_logs = db.get_meal_logs_for_analytics(int(user_id), days=days)
-        
-        if not readings or not meal_logs:
+        if len(frame) == 0 or not meal_logs:
+            return None
+        return PatternAnalyzer.analyze_meal_impact_frame(frame, meal_logs)
+
+    try:
+        impact = _versioned_analytics(user_id, "meal_impact", days, compute)
+        if impact is None:
             return jsonify({"error": "Insufficient data for meal impact analysis"}), 404
         
-        impact = PatternAnalyzer.analyze_meal_impact(readings, meal_logs)
         return jsonify(impact)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -485,6 +700,18 @@ def cache_health_check():
     return jsonify(cache.health_check())
 
 
+@app.route('/api/db/pool', methods=['GET'])
+def db_pool_stats():
+    """Database connection pool statistics: checkouts, reuse ratio, wait times."""
+    return jsonify(db.get_pool_stats())
+
+
+@app.route('/api/cache/models', methods=['GET'])
+def model_cache_stats():
+    """Model cache statistics: hits, misses, evictions and resident size."""
+    return jsonify(get_prediction_service().get_model_cache_stats())
+
+
 @app.route('/api/cache/invalidate', methods=['POST'])
 def invalidate_user_cache():
     """Manually invalidate all cache for a user."""
@@ -496,6 +723,15 @@ def invalidate_user_cache():
     return jsonify({"message": "Cache invalidated", "details": result})
 
 
+@app.route('/api/inference/stats', methods=['GET'])
+def inference_stats():
+    """Get micro-batching statistics (batch occupancy, run time) for the glucose predictor and the inference pool."""
+    stats = get_prediction_service().get_inference_stats()
+    stats["pool"] = get_pool_stats()
+    stats["precompute_pipeline"] = get_pipeline_stats()
+    return jsonify(stats)
+
+
 @app.route('/api/websocket/stats', methods=['GET'])
 def websocket_stats():
     """Get WebSocket connection statistics."""
@@ -573,5 +809,15 @@ def get_dashboard_metrics():
 
 
 if __name__ == '__main__':
+    # Load the ML models in the background; requests that arrive first load what they need on demand
+    if WARMUP_ON_START:
+        start_background_warmup()
+    # Creates upcoming glucose_readings partitions and applies the retention policy
+    db.start_glucose_partition_maintenance()
+    # Databases created before the rollup tables get them filled once from the readings
+    try:
+        db.ensure_glucose_rollups()
+    except Exception as e:
+        print(f"[Database] Could not build glucose rollups: {e}")
     # Use socketio.run instead of app.run for WebSocket support
     socketio.run(app, host='0.0.0.0', port=7860, debug=False, allow_unsafe_werkzeug=True)
\ No newline at end of file
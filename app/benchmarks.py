@@ -0,0 +1,376 @@
+# file: benchmarks.py
+# Offline benchmarks for Aura's inference backends
+#
+#   python benchmarks.py predictor [--model models/glucose_predictor.h5] [--runs 200]
+#   python benchmarks.py dqn [--runs 500]
+#   python benchmarks.py dashboard [--user-id 1] [--runs 200]   # needs DATABASE_URL
+#   python benchmarks.py serializers [--user-id 1] [--days 7]   # needs DATABASE_URL
+#
+# Reports load time, resident memory growth, per-call latency and numerical drift
+# of each backend against the reference runtime (Keras / stable_baselines3), and
+# the dashboard query latency before and after the single round-trip rewrite, and
+# the cache serializers' encode/decode time and size on real analytics payloads.
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import numpy as np
+
+from config import BASE_DIR, MODEL_PATH, DATA_PATH
+
+SCALER_PATH = os.path.join(BASE_DIR, 'models', 'scaler.gz')
+DQN_PATH = os.path.join(BASE_DIR, 'models', 'aura_dqn_agent.zip')
+LOOK_BACK = 12
+
+
+def _rss_mb() -> float:
+    import psutil
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def _load(loader) -> tuple:
+    """Runs a loader, returning (model, seconds, resident MB added)"""
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    model = loader()
+    return model, time.perf_counter() - started, _rss_mb() - rss_before
+
+
+def _latency(fn, runs: int) -> dict:
+    fn()  # warm-up call (lazy graph building, allocator)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples = np.array(samples)
+    return {
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4)
+    }
+
+
+def _print_table(title: str, results: dict):
+    print(f"\n=== {title} ===")
+    for name, result in results.items():
+        print(f"\n[{name}]")
+        for key, value in result.items():
+            print(f"  {key:<22} {value}")
+
+
+# ============================================================================
+# GLUCOSE PREDICTOR
+# ============================================================================
+
+def _predictor_windows(count: int = 512) -> tuple:
+    """Scaled look-back windows from the training data (random ones if it is missing), plus the scaler scale."""
+    import joblib
+    try:
+        from train_lstm import load_glucose_series
+        series = load_glucose_series(DATA_PATH)
+        if os.path.exists(SCALER_PATH):
+            scaler = joblib.load(SCALER_PATH)
+            scaled, scale = scaler.transform(series), float(np.ravel(scaler.scale_)[0])
+        else:
+            low, high = series.min(), series.max()
+            scaled, scale = (series - low) / (high - low), 1.0 / float(high - low)
+        starts = np.linspace(0, len(scaled) - LOOK_BACK - 1, count).astype(int)
+        windows = np.stack([scaled[s:s + LOOK_BACK] for s in starts]).astype(np.float32)
+    except Exception as e:
+        print(f"[Benchmark] Using random windows ({e})")
+        windows, scale = np.random.default_rng(0).random((count, LOOK_BACK, 1), dtype=np.float32), 1.0 / 360
+    return windows, scale
+
+
+def _predictor_loaders(model_path: str, workdir: str) -> dict:
+    from numpy_inference import NumpyLSTMModel
+    import onnx_backend
+
+    def load_onnx_int8():
+        from onnx_export import quantize_model
+        quantized_path = onnx_backend.onnx_path_for(model_path, quantized=True)
+        if not os.path.exists(quantized_path):
+            import onnx
+            float_path = os.path.join(workdir, "predictor.onnx")
+            onnx.save(onnx_backend.build_predictor_graph(NumpyLSTMModel.from_h5(model_path)), float_path)
+            quantized_path = quantize_model(float_path)
+        return onnx_backend.OnnxPredictorModel.from_file(quantized_path)
+
+    def load_keras():
+        from keras.models import load_model
+        return load_model(model_path)
+
+    return {
+        "numpy": lambda: NumpyLSTMModel.from_h5(model_path),
+        "onnx": lambda: onnx_backend.load_model(model_path),
+        "onnx-int8": load_onnx_int8,
+        "keras": load_keras,  # last: importing TensorFlow dominates resident memory
+    }
+
+
+def benchmark_predictor(model_path: str = MODEL_PATH, runs: int = 200, batch_sizes=(1, 32)) -> dict:
+    windows, scale = _predictor_windows()
+    results, outputs = {}, {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, loader in _predictor_loaders(model_path, workdir).items():
+            try:
+                model, load_s, rss_mb = _load(loader)
+            except Exception as e:
+                print(f"[Benchmark] Skipping {name}: {e}")
+                continue
+            result = {"load_s": round(load_s, 3), "resident_mb_added": round(rss_mb, 1)}
+            for batch_size in batch_sizes:
+                batch = windows[:batch_size]
+                result[f"latency_batch_{batch_size}"] = _latency(lambda: model.predict(batch, verbose=0), runs)
+            outputs[name] = np.asarray(model.predict(windows, verbose=0), dtype=np.float64)
+            results[name] = result
+
+    reference = "keras" if "keras" in outputs else "numpy"
+    for name, output in outputs.items():
+        drift = np.abs(output - outputs[reference])
+        results[name]["drift_vs"] = reference
+        results[name]["max_abs_drift_scaled"] = float(drift.max())
+        # MinMaxScaler: glucose = (scaled - min) / scale, so a scaled error maps to error / scale mg/dL
+        results[name]["max_abs_drift_mg_dl"] = round(float(drift.max()) / scale, 4)
+        results[name]["mean_abs_drift_mg_dl"] = round(float(drift.mean()) / scale, 4)
+    return results
+
+
+# ============================================================================
+# DQN POLICY
+# ============================================================================
+
+def _dqn_observations(count: int = 1000) -> np.ndarray:
+    """Observations shaped like get_insulin_recommendation's: [glucose, trend, hour, active insulin, time since meal]"""
+    rng = np.random.default_rng(0)
+    return np.stack([
+        rng.uniform(40, 400, count),
+        np.zeros(count),
+        rng.integers(0, 24, count),
+        rng.uniform(0, 4, count),
+        rng.uniform(0, 6, count)
+    ], axis=1).astype(np.float32)
+
+
+def benchmark_dqn(zip_path: str = DQN_PATH, runs: int = 500) -> dict:
+    import onnx_backend
+    from onnx_export import export_dqn_policy, quantize_model
+
+    observations = _dqn_observations()
+    results, q_values, actions = {}, {}, {}
+
+    def load_torch():
+        from stable_baselines3 import DQN
+        return DQN.load(zip_path, device="cpu")
+
+    agent, load_s, rss_mb = _load(load_torch)
+    import torch
+    with torch.no_grad():
+        q_values["torch"] = agent.policy.q_net(torch.as_tensor(observations)).numpy()
+    actions["torch"] = np.array([agent.predict(obs, deterministic=True)[0] for obs in observations]).ravel()
+    results["torch"] = {
+        "load_s": round(load_s, 3), "resident_mb_added": round(rss_mb, 1),
+        "latency_single_obs": _latency(lambda: agent.predict(observations[0], deterministic=True), runs)
+    }
+
+    float_path = onnx_backend.onnx_path_for(zip_path)
+    if not os.path.exists(float_path):
+        float_path = export_dqn_policy(zip_path)
+    quantized_path = onnx_backend.onnx_path_for(zip_path, quantized=True)
+    if not os.path.exists(quantized_path):
+        quantized_path = quantize_model(float_path)
+
+    for name, path in (("onnx", float_path), ("onnx-int8", quantized_path)):
+        policy, load_s, rss_mb = _load(lambda: onnx_backend.OnnxQPolicy(path))
+        q_values[name] = policy.q_values(observations)
+        actions[name] = policy.predict(observations)[0]
+        results[name] = {
+            "load_s": round(load_s, 3), "resident_mb_added": round(rss_mb, 1),
+            "latency_single_obs": _latency(lambda: policy.predict(observations[0]), runs)
+        }
+
+    for name in results:
+        results[name]["max_abs_q_drift"] = float(np.abs(q_values[name] - q_values["torch"]).max())
+        results[name]["action_agreement"] = round(float(np.mean(actions[name] == actions["torch"])), 4)
+    return results
+
+
+# ============================================================================
+# DASHBOARD QUERY
+# ============================================================================
+
+def _count_statements(db, fn) -> int:
+    """Runs fn() and returns how many statements it executed through db.db_cursor (its round trips)."""
+    from contextlib import contextmanager
+    original, count = db.db_cursor, [0]
+
+    @contextmanager
+    def counting_cursor(*args, **kwargs):
+        with original(*args, **kwargs) as cur:
+            execute = cur.execute
+
+            def counted(*a, **kw):
+                count[0] += 1
+                return execute(*a, **kw)
+            cur.execute = counted
+            yield cur
+
+    db.db_cursor = counting_cursor
+    try:
+        fn()
+    finally:
+        db.db_cursor = original
+    return count[0]
+
+
+def _legacy_dashboard_loader(db, user_id: int) -> dict:
+    """
+    The previous dashboard loader, the baseline for benchmark_dashboard: three
+    queries, then calculate_health_score with up to three more.
+    """
+    with db.db_cursor(dict_rows=True) as cur:
+        cur.execute("SELECT name, age, weight_kg, height_cm FROM users WHERE id = %s;", (user_id,))
+        user_profile = cur.fetchone()
+
+        cur.execute(
+            """
+            SELECT timestamp, glucose_value FROM glucose_readings 
+            WHERE user_id = %s AND timestamp > NOW() - INTERVAL '24 hours' 
+            ORDER BY timestamp ASC;
+            """, 
+            (user_id,)
+        )
+        glucose_readings = cur.fetchall()
+
+        cur.execute(
+            """
+            SELECT timestamp, meal_description, carb_count FROM meal_logs 
+            WHERE user_id = %s AND timestamp > NOW() - INTERVAL '24 hours' 
+            ORDER BY timestamp DESC LIMIT 5;
+            """, 
+            (user_id,)
+        )
+        meal_logs = cur.fetchall()
+
+    return {
+        "user_profile": user_profile,
+        "glucose_readings": glucose_readings,
+        "recent_meals": meal_logs,
+        "health_score": db.calculate_health_score(user_id)
+    }
+
+
+def benchmark_dashboard(user_id: int = 1, runs: int = 200) -> dict:
+    """The three-query + calculate_health_score dashboard vs the single CTE query, on DATABASE_URL."""
+    import database as db
+
+    loaders = {
+        "legacy (per-part queries)": lambda uid: _legacy_dashboard_loader(db, uid),
+        "single query": db.get_dashboard_data_for_user,
+    }
+    results, payloads = {}, {}
+    for name, loader in loaders.items():
+        statements = _count_statements(db, lambda: payloads.__setitem__(name, loader(user_id)))
+        results[name] = {"statements_per_call": statements, **_latency(lambda: loader(user_id), runs)}
+
+    legacy, single = payloads.values()
+    same = json.dumps(legacy, default=str, sort_keys=True) == json.dumps(single, default=str, sort_keys=True)
+    for result in results.values():
+        result["payloads_match"] = same
+    return results
+
+
+# ============================================================================
+# CACHE SERIALIZERS
+# ============================================================================
+
+def _analytics_payloads(user_id: int, days: int) -> dict:
+    """Uncached get_full_analytics output and its parts, as the cache stores them"""
+    import database as db
+    from analytics_service import get_full_analytics
+    from cache_service import cache
+
+    readings = db.get_glucose_readings_with_timestamps(user_id, days=days)
+    meal_logs = db.get_meal_logs_for_analytics(user_id, days=days)
+    if not readings:
+        raise SystemExit(f"User {user_id} has no glucose readings in the last {days} days")
+    # __wrapped__ skips the cached_analytics decorator
+    full = cache._make_serializable(get_full_analytics.__wrapped__(user_id, readings, meal_logs, days=days))
+    return {
+        "full_analytics": full,
+        "agp": full["agp"],
+        "heatmap": full["patterns"]["heatmap"],
+        "meal_impact": full["patterns"].get("meal_impact", []),
+    }
+
+
+def benchmark_serializers(user_id: int = 1, days: int = 7, runs: int = 200) -> dict:
+    from cache_serializers import COMPRESSIONS, SERIALIZERS, CacheSerializer, _available, _to_builtin
+
+    payloads = _analytics_payloads(user_id, days)
+    results = {}
+    for serializer in SERIALIZERS:
+        for compression in COMPRESSIONS:
+            if not (_available(serializer) and _available(compression)):
+                print(f"[Benchmark] Skipping {serializer}+{compression}: not installed")
+                continue
+            codec = CacheSerializer(serializer, compression, compress_min_bytes=0)
+            for payload_name, payload in payloads.items():
+                encoded = codec.dumps(payload)
+                results[f"{payload_name} {serializer}+{compression}"] = {
+                    "bytes": len(encoded),
+                    "encode_ms": _latency(lambda: codec.dumps(payload), runs)["p50_ms"],
+                    "decode_ms": _latency(lambda: codec.loads(encoded), runs)["p50_ms"],
+                }
+
+    # The untagged json.dumps/json.loads format used before (NumPy scalars in the
+    # analytics made plain json.dumps fail, so this passes the serializers' fallback)
+    for payload_name, payload in payloads.items():
+        legacy = json.dumps(payload, default=_to_builtin)
+        results[f"{payload_name} legacy json.dumps"] = {
+            "bytes": len(legacy.encode("utf-8")),
+            "encode_ms": _latency(lambda: json.dumps(payload, default=_to_builtin), runs)["p50_ms"],
+            "decode_ms": _latency(lambda: json.loads(legacy), runs)["p50_ms"],
+        }
+    return dict(sorted(results.items()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Aura inference backends")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    predictor_parser = subparsers.add_parser('predictor', help="Keras vs NumPy vs ONNX (float32 / int8) glucose predictor")
+    predictor_parser.add_argument('--model', default=MODEL_PATH)
+    predictor_parser.add_argument('--runs', type=int, default=200)
+
+    dqn_parser = subparsers.add_parser('dqn', help="stable_baselines3 vs ONNX (float32 / int8) DQN policy")
+    dqn_parser.add_argument('--model', default=DQN_PATH)
+    dqn_parser.add_argument('--runs', type=int, default=500)
+
+    dashboard_parser = subparsers.add_parser('dashboard', help="Dashboard payload: per-part queries vs one round trip")
+    dashboard_parser.add_argument('--user-id', type=int, default=1)
+    dashboard_parser.add_argument('--runs', type=int, default=200)
+
+    serializers_parser = subparsers.add_parser('serializers', help="Cache serializer/compression on real analytics payloads")
+    serializers_parser.add_argument('--user-id', type=int, default=1)
+    serializers_parser.add_argument('--days', type=int, default=7)
+    serializers_parser.add_argument('--runs', type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == 'predictor':
+        output = benchmark_predictor(args.model, args.runs)
+    elif args.command == 'dqn':
+        output = benchmark_dqn(args.model, args.runs)
+    elif args.command == 'dashboard':
+        output = benchmark_dashboard(args.user_id, args.runs)
+    else:
+        output = benchmark_serializers(args.user_id, args.days, args.runs)
+    if args.json:
+        print(json.dumps(output, indent=2))
+    else:
+        _print_table(f"{args.command} benchmark" if args.command in ('dashboard', 'serializers') else f"{args.command} backends", output)
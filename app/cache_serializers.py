@@ -0,0 +1,170 @@
+# file: cache_serializers.py
+# Pluggable encoding for cached values
+#
+# Every entry written by CacheService is framed as
+#     MAGIC | serializer tag | compression tag | body
+# so the reader never has to know how the writer was configured. Entries from
+# before this framing (plain JSON text) don't start with MAGIC and still read.
+#
+#   AURA_CACHE_SERIALIZER   auto (orjson if installed, else json) | orjson | msgpack | json
+#   AURA_CACHE_COMPRESSION  zlib | lz4 | none
+#   AURA_CACHE_COMPRESS_MIN_BYTES  bodies smaller than this are stored uncompressed
+
+import os
+import json
+import zlib
+import threading
+from datetime import date, datetime
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+CACHE_SERIALIZER = os.getenv("AURA_CACHE_SERIALIZER", "auto")
+CACHE_COMPRESSION = os.getenv("AURA_CACHE_COMPRESSION", "zlib")
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("AURA_CACHE_COMPRESS_MIN_BYTES", "1024"))
+ZLIB_LEVEL = 1  # Cache payloads are short-lived: favour speed over ratio
+
+# 0xA7 can't start a UTF-8 string, so it never collides with a legacy JSON entry
+MAGIC = b"\xa7"
+
+
+def _to_builtin(obj: Any) -> Any:
+    """Fallback for types the encoders don't handle (NumPy scalars/arrays, datetimes)"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if hasattr(obj, "tolist"):  # numpy.ndarray and numpy scalars
+        return obj.tolist()
+    raise TypeError(f"Cannot cache a value of type {type(obj).__name__}")
+
+
+# ============================================================================
+# SERIALIZERS
+# ============================================================================
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=_to_builtin, separators=(",", ":")).encode("utf-8")
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_to_builtin,
+                        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _msgpack_dumps(value: Any) -> bytes:
+    # Unlike the JSON formats, msgpack keeps non-string dict keys (e.g. heatmap hours) as they are
+    return msgpack.packb(value, default=_to_builtin, use_bin_type=True)
+
+
+def _msgpack_loads(body: bytes) -> Any:
+    return msgpack.unpackb(body, raw=False, strict_map_key=False)
+
+
+def canonical_bytes(value: Any) -> bytes:
+    """Deterministic encoding (sorted keys, no compression) for hashing values into cache keys"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_to_builtin,
+                            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, default=_to_builtin, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+# name -> (tag, dumps, loads); loads of orjson/msgpack entries need that package installed
+SERIALIZERS = {
+    "json": (b"j", _json_dumps, json.loads),
+    "orjson": (b"o", _orjson_dumps, lambda body: orjson.loads(body)),
+    "msgpack": (b"m", _msgpack_dumps, _msgpack_loads),
+}
+
+COMPRESSIONS = {
+    "none": (b"-", None, None),
+    "zlib": (b"z", lambda body: zlib.compress(body, ZLIB_LEVEL), zlib.decompress),
+    "lz4": (b"4", lambda body: lz4_frame.compress(body), lambda body: lz4_frame.decompress(body)),
+}
+
+_SERIALIZERS_BY_TAG = {tag: (name, loads) for name, (tag, _, loads) in SERIALIZERS.items()}
+_COMPRESSIONS_BY_TAG = {tag: (name, decompress) for name, (tag, _, decompress) in COMPRESSIONS.items()}
+
+
+def _available(name: str) -> bool:
+    return {"orjson": orjson, "msgpack": msgpack, "lz4": lz4_frame}.get(name, True) is not None
+
+
+class CacheSerializer:
+    """
+    Encodes cache values to tagged bytes and back.
+    Decoding follows each entry's own tags, so changing the configuration (or
+    rolling it out across instances) never makes existing entries unreadable.
+    """
+
+    def __init__(self, serializer: str = CACHE_SERIALIZER, compression: str = CACHE_COMPRESSION,
+                 compress_min_bytes: int = CACHE_COMPRESS_MIN_BYTES):
+        if serializer == "auto":
+            serializer = "orjson" if orjson is not None else "json"
+        if serializer not in SERIALIZERS or not _available(serializer):
+            print(f"[Cache] Serializer '{serializer}' is not available, using json.")
+            serializer = "json"
+        if compression not in COMPRESSIONS or not _available(compression):
+            print(f"[Cache] Compression '{compression}' is not available, using zlib.")
+            compression = "zlib"
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self._tag, self._dumps, _ = SERIALIZERS[serializer]
+        self._compression_tag, self._compress, _ = COMPRESSIONS[compression]
+        self._lock = threading.Lock()
+        self._stats = {"encoded": 0, "compressed": 0, "bytes_before_compression": 0, "bytes_stored": 0,
+                       "legacy_reads": 0}
+
+    def dumps(self, value: Any) -> bytes:
+        body = self._dumps(value)
+        raw_size = len(body)
+        compression_tag = COMPRESSIONS["none"][0]
+        if self._compress is not None and raw_size >= self.compress_min_bytes:
+            body = self._compress(body)
+            compression_tag = self._compression_tag
+        payload = MAGIC + self._tag + compression_tag + body
+        with self._lock:
+            self._stats["encoded"] += 1
+            self._stats["compressed"] += compression_tag != COMPRESSIONS["none"][0]
+            self._stats["bytes_before_compression"] += raw_size
+            self._stats["bytes_stored"] += len(payload)
+        return payload
+
+    def loads(self, payload) -> Any:
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        if payload[:1] != MAGIC:
+            # Written before entries were tagged: plain JSON text
+            with self._lock:
+                self._stats["legacy_reads"] += 1
+            return json.loads(payload)
+        try:
+            _, loads = _SERIALIZERS_BY_TAG[payload[1:2]]
+            _, decompress = _COMPRESSIONS_BY_TAG[payload[2:3]]
+        except KeyError:
+            raise ValueError(f"Unknown cache entry format {payload[:3]!r}")
+        body = payload[3:]
+        if decompress is not None:
+            body = decompress(body)
+        return loads(body)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        before = stats["bytes_before_compression"]
+        return {
+            "format": f"{self.serializer}+{self.compression}",
+            "compress_min_bytes": self.compress_min_bytes,
+            **stats,
+            "compression_ratio": round(stats["bytes_stored"] / before, 3) if before else None
+        }
@@ -2,11 +2,19 @@
 # Redis caching service for Aura - Improves prediction and dashboard performance
 
 import os
+import sys
 import json
 import hashlib
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from queue import Empty
+from datetime import datetime
 from typing import Optional, Any, Dict
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_serializers import CacheSerializer, canonical_bytes
 
 # Try to import Redis, fall back to in-memory cache if not available
 try:
@@ -18,55 +26,610 @@ except ImportError:
 
 # Configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("AURA_REDIS_MAX_CONNECTIONS", "50"))
+REDIS_TIMEOUT_S = float(os.getenv("AURA_REDIS_TIMEOUT_S", "1"))  # Connect, socket and pool-checkout timeout
+# Extra time an invalidation waits for a free pooled connection (reads and writes just miss)
+REDIS_POOL_WAIT_S = float(os.getenv("AURA_REDIS_POOL_WAIT_S", "5"))
 CACHE_DEFAULT_TTL = 300  # 5 minutes default
 PREDICTION_CACHE_TTL = 180  # 3 minutes for predictions
+LATEST_PREDICTION_TTL = 600  # 10 minutes: precomputed forecast must outlive the gap to the next CGM reading
 DASHBOARD_CACHE_TTL = 60  # 1 minute for dashboard data
 ANALYTICS_CACHE_TTL = 600  # 10 minutes for analytics (computed infrequently)
+# Data-versioned analytics stay valid until the data changes; this TTL only reclaims memory
+ANALYTICS_VERSIONED_TTL = int(os.getenv("AURA_ANALYTICS_VERSIONED_TTL_S", str(24 * 3600)))
+
+# In-memory fallback budget (edge deployments run without Redis)
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv("AURA_MEMORY_CACHE_MAX_ENTRIES", "10000"))
+MEMORY_CACHE_MAX_BYTES = int(float(os.getenv("AURA_MEMORY_CACHE_MAX_MB", "64")) * 1024 * 1024)
+MEMORY_CACHE_SWEEP_S = float(os.getenv("AURA_MEMORY_CACHE_SWEEP_S", "30"))
+
+# In-process L1 in front of Redis (only used when Redis is the backend)
+L1_ENABLED = os.getenv("AURA_CACHE_L1", "1") == "1"
+L1_TTL_S = float(os.getenv("AURA_CACHE_L1_TTL_S", "5"))
+L1_MAX_ENTRIES = int(os.getenv("AURA_CACHE_L1_MAX_ENTRIES", "2000"))
+L1_MAX_BYTES = int(float(os.getenv("AURA_CACHE_L1_MAX_MB", "16")) * 1024 * 1024)
+INVALIDATION_CHANNEL = "aura:cache:invalidations"
+
+# Stale-while-revalidate: how long after it was computed a superseded analytics value may still be served
+SWR_GRACE_S = int(os.getenv("AURA_CACHE_SWR_GRACE_S", "300"))
+SWR_REFRESH_WORKERS = int(os.getenv("AURA_CACHE_SWR_REFRESH_WORKERS", "2"))
+REFRESH_LOCK_TTL_S = 60  # Upper bound on one refresh; the lock expires even if its worker dies
+
+# Circuit breaker: consecutive Redis connection errors before failing over to the local cache
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("AURA_CACHE_BREAKER_FAILURES", "3"))
+BREAKER_PROBE_INTERVAL_S = float(os.getenv("AURA_CACHE_BREAKER_PROBE_S", "5"))
+BREAKER_REPLAY_MAX = 10000  # Invalidations remembered during an outage, to replay on recovery
+
+# Errors that mean Redis is unreachable (as opposed to e.g. a bad command)
+_REDIS_DOWN_ERRORS = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) if REDIS_AVAILABLE else ()
+
+
+class PoolExhaustedError(Exception):
+    """Every pooled Redis connection stayed busy for the whole checkout timeout: Redis is busy, not down"""
+
+
+if REDIS_AVAILABLE:
+    class _CheckoutPool(redis.BlockingConnectionPool):
+        """
+        BlockingConnectionPool that raises PoolExhaustedError when no connection
+        frees up in time. redis-py raises a plain ConnectionError for that, which
+        would count toward the circuit breaker like a socket error does.
+        """
+
+        def get_connection(self, *args, **kwargs):
+            try:
+                return super().get_connection(*args, **kwargs)
+            except redis.exceptions.ConnectionError as e:
+                if isinstance(e.__context__, Empty):
+                    raise PoolExhaustedError(str(e)) from None
+                raise
+
+
+class _MemoryEntry:
+    __slots__ = ("value", "expires_at", "nbytes")
+
+    def __init__(self, value, expires_at: Optional[float], nbytes: int):
+        self.value = value
+        self.expires_at = expires_at  # time.monotonic() deadline, None = no expiry
+        self.nbytes = nbytes
 
 
 class InMemoryCache:
-    """Fallback in-memory cache when Redis is not available"""
-    
-    def __init__(self):
-        self._cache: Dict[str, Dict[str, Any]] = {}
-        print("[Cache] In-memory cache initialized.")
+    """
+    Fallback in-memory cache when Redis is not available.
+
+    Thread-safe LRU with an entry and a byte budget. TTLs run on the monotonic
+    clock, and a background sweeper drops expired entries that are never read again.
+    """
     
+    def __init__(self, max_entries: int = MEMORY_CACHE_MAX_ENTRIES, max_bytes: int = MEMORY_CACHE_MAX_BYTES,
+                 sweep_interval: float = MEMORY_CACHE_SWEEP_S):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self._cache: "OrderedDict[str, _MemoryEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._resident_bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "sweeps": 0}
+        self._stop = threading.Event()
+        if sweep_interval > 0:
+            threading.Thread(
+                target=self._sweep_loop, args=(sweep_interval,), name="aura-cache-sweeper", daemon=True
+            ).start()
+        print(f"[Cache] In-memory cache initialized (max {self.max_entries} entries, "
+              f"{self.max_bytes / (1024 * 1024):.1f} MB).")
+
+    @staticmethod
+    def _entry_nbytes(key: str, value) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def _live_entry_locked(self, key: str) -> Optional[_MemoryEntry]:
+        """The entry for key, or None; an expired entry is dropped on the way"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._remove_locked(key)
+            self._stats["expirations"] += 1
+            return None
+        return entry
+
+    def _remove_locked(self, key: str):
+        entry = self._cache.pop(key)
+        self._resident_bytes -= entry.nbytes
+
+    def _evict_locked(self):
+        """Evict least-recently-used entries until both budgets are met"""
+        while self._cache and (len(self._cache) > self.max_entries or
+                               (self.max_bytes and self._resident_bytes > self.max_bytes)):
+            key = next(iter(self._cache))
+            self._remove_locked(key)
+            self._stats["evictions"] += 1
+
     def get(self, key: str) -> Optional[str]:
-        if key in self._cache:
-            entry = self._cache[key]
-            if entry['expires_at'] > datetime.now():
-                return entry['value']
-            else:
-                del self._cache[key]
-        return None
+        with self._lock:
+            entry = self._live_entry_locked(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry.value
     
-    def set(self, key: str, value: str, ex: int = CACHE_DEFAULT_TTL) -> bool:
-        self._cache[key] = {
-            'value': value,
-            'expires_at': datetime.now() + timedelta(seconds=ex)
-        }
-        return True
+    def set(self, key: str, value: str, ex: Optional[int] = CACHE_DEFAULT_TTL, nx: bool = False) -> bool:
+        """ex=None keeps the key until deleted or evicted; nx=True only sets a missing key (like Redis SET NX)"""
+        with self._lock:
+            if nx and self._live_entry_locked(key) is not None:
+                return False
+            self._put_locked(key, value, time.monotonic() + ex if ex is not None else None)
+            return True
+
+    def _put_locked(self, key: str, value, expires_at: Optional[float]):
+        if key in self._cache:
+            self._remove_locked(key)
+        entry = _MemoryEntry(value, expires_at, self._entry_nbytes(key, value))
+        self._cache[key] = entry
+        self._resident_bytes += entry.nbytes
+        self._evict_locked()
+
+    def incr(self, key: str) -> int:
+        """Redis INCR: a missing key counts from 0, the expiry is kept"""
+        with self._lock:
+            entry = self._live_entry_locked(key)
+            value = int(entry.value) + 1 if entry is not None else 1
+            self._put_locked(key, str(value), entry.expires_at if entry is not None else None)
+            return value
     
     def delete(self, key: str) -> bool:
-        if key in self._cache:
-            del self._cache[key]
-            return True
-        return False
+        with self._lock:
+            if key in self._cache:
+                self._remove_locked(key)
+                return True
+            return False
     
     def exists(self, key: str) -> bool:
-        return key in self._cache and self._cache[key]['expires_at'] > datetime.now()
+        with self._lock:
+            return self._live_entry_locked(key) is not None
     
     def flushdb(self):
-        self._cache.clear()
+        with self._lock:
+            self._cache.clear()
+            self._resident_bytes = 0
     
     def keys(self, pattern: str = "*") -> list:
         """Simple pattern matching for keys"""
         import fnmatch
-        return [k for k in self._cache.keys() if fnmatch.fnmatch(k, pattern)]
+        with self._lock:
+            return [k for k in self._cache.keys() if fnmatch.fnmatch(k, pattern)]
     
     def ping(self) -> bool:
         return True
 
+    def execute(self, commands: list) -> list:
+        """Same interface as FailoverClient.execute; runs the (method, args, kwargs) commands one by one"""
+        return [getattr(self, method)(*args, **kwargs) for method, args, kwargs in commands]
+
+    def sweep(self) -> int:
+        """Drops every expired entry. Returns how many were dropped."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, e in self._cache.items() if e.expires_at is not None and e.expires_at <= now]
+            for key in expired:
+                self._remove_locked(key)
+            self._stats["expirations"] += len(expired)
+            self._stats["sweeps"] += 1
+        return len(expired)
+
+    def _sweep_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[Cache] Expiry sweep failed: {e}")
+
+    def close(self):
+        """Stops the sweeper thread"""
+        self._stop.set()
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction/expiration counters and resident size"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else 0,
+                "entries": len(self._cache),
+                "resident_bytes": self._resident_bytes,
+                "resident_mb": round(self._resident_bytes / (1024 * 1024), 2),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive Redis connection errors. Closed, calls go to Redis; after
+    `failure_threshold` errors in a row it opens and calls go to the fallback right
+    away instead of each waiting out a socket timeout. FailoverClient probes Redis
+    in the background while it is open and closes it once Redis answers again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 probe_interval: float = BREAKER_PROBE_INTERVAL_S):
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._last_error = None
+        self._stats = {"trips": 0, "recoveries": 0, "probes": 0, "failed_probes": 0, "fallback_calls": 0,
+                       "pool_exhausted": 0}
+
+    @property
+    def closed(self) -> bool:
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+
+    def record_failure(self, error: Exception, trip: bool = False) -> bool:
+        """Counts a connection error; trip=True opens right away. Returns True if this call opened the breaker."""
+        with self._lock:
+            self._failures += 1
+            self._last_error = f"{type(error).__name__}: {error}"
+            if self.state == self.CLOSED and (trip or self._failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.time()
+                self._stats["trips"] += 1
+                return True
+            return False
+
+    def close(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._stats["recoveries"] += 1
+
+    def count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "probe_interval_s": self.probe_interval,
+                "open_for_s": round(time.time() - self._opened_at, 1) if self._opened_at else None,
+                "last_error": self._last_error,
+                **self._stats
+            }
+
+
+class FailoverClient:
+    """
+    Redis client (on a bounded connection pool) behind a CircuitBreaker, with the
+    same get/set/delete/incr interface as InMemoryCache. While the breaker is
+    open every call is served by a local InMemoryCache. Deletes and INCRs made
+    locally in that time are remembered and replayed to Redis on recovery, so
+    invalidations made during the outage aren't lost.
+    """
+
+    def __init__(self, redis_client, local: InMemoryCache, breaker: CircuitBreaker):
+        self.redis = redis_client
+        self.local = local
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self._missed: "OrderedDict[str, str]" = OrderedDict()  # key -> "delete" | "incr"
+        self._missed_dropped = 0
+        self._replayed = 0
+        self._probing = False
+        self._trip_callbacks = []
+
+    @property
+    def available(self) -> bool:
+        """True while calls go to Redis"""
+        return self.breaker.closed
+
+    def on_trip(self, callback):
+        """Runs callback() whenever the breaker opens"""
+        self._trip_callbacks.append(callback)
+
+    def trip(self, error: Exception):
+        """Opens the breaker now (e.g. Redis is unreachable at start-up)"""
+        self._on_failure(error, trip=True)
+
+    def _on_failure(self, error: Exception, trip: bool = False):
+        if not self.breaker.record_failure(error, trip=trip):
+            return
+        print(f"[Cache] Circuit breaker open after '{error}': serving from the in-memory cache, "
+              f"probing Redis every {self.breaker.probe_interval}s.")
+        for callback in self._trip_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Cache] Circuit breaker callback failed: {e}")
+        with self._lock:
+            if self._probing:
+                return
+            self._probing = True
+        threading.Thread(target=self._probe_loop, name="aura-cache-breaker-probe", daemon=True).start()
+
+    def _remember(self, method: str, keys):
+        if method not in ("delete", "incr"):
+            return
+        with self._lock:
+            for key in keys:
+                if key not in self._missed and len(self._missed) >= BREAKER_REPLAY_MAX:
+                    self._missed_dropped += 1
+                    continue
+                self._missed[key] = method
+
+    def _local_call(self, method: str, args: tuple, kwargs: dict):
+        self.breaker.count("fallback_calls")
+        if method == "publish":
+            return 0  # Nobody to tell: other workers' L1 is bypassed while Redis is down
+        self._remember(method, args if method == "delete" else args[:1])
+        if method == "delete":
+            return sum(bool(self.local.delete(key)) for key in args)
+        return getattr(self.local, method)(*args, **kwargs)
+
+    def _on_pool_exhausted(self, method: str, retry):
+        """
+        A pool checkout timed out. That doesn't count toward the breaker: a
+        get is a miss and a set is skipped. Invalidations (delete / incr /
+        publish) must reach Redis, so they retry for up to REDIS_POOL_WAIT_S
+        more before giving up with PoolExhaustedError.
+        """
+        self.breaker.count("pool_exhausted")
+        if method in ("get", "set", "exists"):
+            return None
+        deadline = time.monotonic() + REDIS_POOL_WAIT_S
+        while True:
+            try:
+                return retry()
+            except PoolExhaustedError:
+                if time.monotonic() >= deadline:
+                    raise
+
+    def _call(self, method: str, *args, **kwargs):
+        if self.breaker.closed:
+            try:
+                try:
+                    result = getattr(self.redis, method)(*args, **kwargs)
+                except PoolExhaustedError:
+                    return self._on_pool_exhausted(method, lambda: getattr(self.redis, method)(*args, **kwargs))
+                self.breaker.record_success()
+                return result
+            except _REDIS_DOWN_ERRORS as e:
+                self._on_failure(e)
+        return self._local_call(method, args, kwargs)
+
+    def get(self, key: str):
+        return self._call("get", key)
+
+    def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False):
+        return self._call("set", key, value, ex=ex, nx=nx)
+
+    def delete(self, *keys: str):
+        return self._call("delete", *keys)
+
+    def incr(self, key: str) -> int:
+        return self._call("incr", key)
+
+    def exists(self, key: str):
+        return self._call("exists", key)
+
+    def publish(self, channel: str, message):
+        return self._call("publish", channel, message)
+
+    def ping(self) -> bool:
+        return self._call("ping")
+
+    def pubsub(self, **kwargs):
+        return self.redis.pubsub(**kwargs)
+
+    def execute(self, commands: list) -> list:
+        """
+        Runs [(method, args, kwargs), ...] in one round trip (a non-transactional
+        pipeline) and returns their results in order.
+        """
+        if self.breaker.closed:
+            try:
+                try:
+                    results = self._pipeline(commands)
+                except PoolExhaustedError:
+                    # Pipelines carry invalidations and generation seeds: wait rather than drop them
+                    return self._on_pool_exhausted("execute", lambda: self._pipeline(commands))
+                self.breaker.record_success()
+                return results
+            except _REDIS_DOWN_ERRORS as e:
+                self._on_failure(e)
+        return [self._local_call(method, args, kwargs) for method, args, kwargs in commands]
+
+    def _pipeline(self, commands: list) -> list:
+        pipe = self.redis.pipeline(transaction=False)
+        for method, args, kwargs in commands:
+            getattr(pipe, method)(*args, **kwargs)
+        return pipe.execute()
+
+    def _replay_missed(self):
+        """Applies the invalidations made locally during the outage to Redis"""
+        with self._lock:
+            missed, self._missed = self._missed, OrderedDict()
+        if not missed:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, method in missed.items():
+                getattr(pipe, method)(key)
+                pipe.publish(INVALIDATION_CHANNEL, key)
+            pipe.execute()
+        except Exception:
+            with self._lock:
+                missed.update(self._missed)
+                self._missed = missed
+            raise
+        with self._lock:
+            self._replayed += len(missed)
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.breaker.probe_interval)
+            self.breaker.count("probes")
+            try:
+                self.redis.ping()
+                self._replay_missed()
+            except Exception:
+                self.breaker.count("failed_probes")
+                continue
+            self.breaker.close()
+            try:
+                # Calls that were already past the breaker check may have missed a few more
+                self._replay_missed()
+            except Exception as e:
+                print(f"[Cache] Could not replay invalidations to Redis: {e}")
+            # Drop what was cached locally so a later outage can't serve it after Redis has moved on
+            self.local.flushdb()
+            with self._lock:
+                self._probing = False
+            print("[Cache] Redis reachable again: circuit breaker closed.")
+            return
+
+    def stats(self) -> dict:
+        pool = self.redis.connection_pool
+        with self._lock:
+            replay = {"pending": len(self._missed), "replayed": self._replayed, "dropped": self._missed_dropped}
+        return {
+            **self.breaker.stats(),
+            "invalidation_replay": replay,
+            "pool": {"max_connections": pool.max_connections, "timeout_s": REDIS_TIMEOUT_S},
+            "fallback_entries": self.local.stats()["entries"]
+        }
+
+
+class L1Tier:
+    """
+    Short-lived in-process copy of Redis entries, kept encoded so callers never
+    share mutable objects. Invalidations are published on INVALIDATION_CHANNEL and
+    every worker's subscriber drops the key from its own L1. While the
+    subscription is down, or the circuit breaker has Redis failed over, the tier
+    is emptied and bypassed: messages missed in that time could otherwise leave
+    stale entries behind.
+    """
+
+    def __init__(self, redis_client: FailoverClient, ttl: float = L1_TTL_S, max_entries: int = L1_MAX_ENTRIES,
+                 max_bytes: int = L1_MAX_BYTES):
+        self.ttl = ttl
+        self._redis = redis_client
+        self._store = InMemoryCache(max_entries, max_bytes, sweep_interval=max(1.0, ttl))
+        self._subscribed = threading.Event()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation seen here; a fill that raced one is dropped
+        self.epoch = 0
+        self._stats = {"invalidations_received": 0, "invalidations_published": 0, "resubscribes": 0}
+        redis_client.on_trip(self._reset)
+        threading.Thread(target=self._listen, name="aura-cache-l1-invalidations", daemon=True).start()
+
+    @property
+    def active(self) -> bool:
+        return self._subscribed.is_set() and self._redis.available
+
+    def _reset(self):
+        """Empties the tier; fills that started before this are dropped"""
+        with self._lock:
+            self.epoch += 1
+        self._store.flushdb()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._store.get(key) if self.active else None
+
+    def fill(self, key: str, payload, epoch: int):
+        """Caches a value read from (or just written to) Redis, unless an invalidation arrived since `epoch`"""
+        with self._lock:
+            if self.active and epoch == self.epoch:
+                self._store.set(key, payload, ex=self.ttl)
+
+    def _drop(self, key: str):
+        with self._lock:
+            self.epoch += 1
+            self._store.delete(key)
+
+    def invalidate(self, key: str):
+        """Drops key here and, through Redis pub/sub, in every other worker's L1"""
+        self._redis.execute(self.invalidation_commands([key]))
+
+    def invalidation_commands(self, keys: list) -> list:
+        """Drops keys here and returns the PUBLISH commands for the other workers, to pipeline with a write"""
+        for key in keys:
+            self._drop(key)
+        with self._lock:
+            self._stats["invalidations_published"] += len(keys)
+        return [("publish", (INVALIDATION_CHANNEL, key), {}) for key in keys]
+
+    def _listen(self):
+        while True:
+            if not self._redis.available:
+                time.sleep(1)  # Failed over: nothing to subscribe to until the breaker closes
+                continue
+            pubsub = None
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                self._subscribed.set()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        key = message["data"]
+                        self._drop(key.decode() if isinstance(key, bytes) else key)
+                        with self._lock:
+                            self._stats["invalidations_received"] += 1
+            except Exception as e:
+                was_subscribed = self._subscribed.is_set()
+                self._subscribed.clear()
+                with self._lock:
+                    self._stats["resubscribes"] += 1
+                self._reset()
+                if was_subscribed:
+                    print(f"[Cache] L1 invalidation subscription lost ({e}); L1 bypassed until it is back.")
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def stats(self) -> dict:
+        store = self._store.stats()
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "active": self.active,
+            "ttl_s": self.ttl,
+            "entries": store["entries"],
+            "resident_mb": store["resident_mb"],
+            "evictions": store["evictions"],
+            **stats
+        }
+
+
+class _Flight:
+    """One in-progress read-through load; concurrent callers for the same key wait on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.stale = False  # invalidated while loading: hand the value out, don't cache it
+
 
 class CacheService:
     """
@@ -77,26 +640,41 @@ class CacheService:
     def __init__(self):
         self._client = None
         self._connected = False
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._read_through_stats = {"hits": 0, "loads": 0, "coalesced": 0, "errors": 0}
+        self._invalidation_stats = {"prediction": 0, "analytics": 0, "keys_scans_avoided": 0}
+        self._serializer = CacheSerializer()
+        self._tier_stats = {"l1_hits": 0, "l2_hits": 0, "l2_misses": 0}
+        self._swr_stats = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+        self._refresh_executor = ThreadPoolExecutor(max_workers=SWR_REFRESH_WORKERS,
+                                                    thread_name_prefix="aura-cache-refresh")
+        self._l1 = None
         self._init_client()
     
     def _init_client(self):
-        """Initialize Redis client or fallback to in-memory"""
+        """Initialize the pooled Redis client behind a circuit breaker, or the in-memory cache without Redis"""
         if REDIS_AVAILABLE:
+            pool = _CheckoutPool.from_url(
+                REDIS_URL,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_TIMEOUT_S,  # Bounded wait for a free connection; see FailoverClient._on_pool_exhausted
+                decode_responses=False,  # Values are tagged bytes from CacheSerializer
+                socket_connect_timeout=REDIS_TIMEOUT_S,
+                socket_timeout=REDIS_TIMEOUT_S,
+                health_check_interval=30
+            )
+            self._client = FailoverClient(redis.Redis(connection_pool=pool), InMemoryCache(), CircuitBreaker())
+            self._connected = True
             try:
-                self._client = redis.from_url(
-                    REDIS_URL,
-                    decode_responses=True,
-                    socket_connect_timeout=2,
-                    socket_timeout=2
-                )
-                # Test connection
-                self._client.ping()
-                self._connected = True
-                print(f"[Cache] Redis connected successfully: {REDIS_URL}")
+                self._client.redis.ping()
+                print(f"[Cache] Redis connected successfully: {REDIS_URL} (pool of {REDIS_MAX_CONNECTIONS})")
             except Exception as e:
-                print(f"[Cache] Redis connection failed: {e}. Using in-memory cache.")
-                self._client = InMemoryCache()
-                self._connected = True
+                print(f"[Cache] Redis connection failed: {e}. Using in-memory cache until it is reachable.")
+                self._client.trip(e)
+            if L1_ENABLED:
+                self._l1 = L1Tier(self._client)
+                print(f"[Cache] L1 in-process tier enabled (TTL {L1_TTL_S}s).")
         else:
             self._client = InMemoryCache()
             self._connected = True
@@ -111,7 +689,137 @@ class CacheService:
     def _hash_key(self, data: Any) -> str:
         """Create a hash of complex data for cache keys"""
         return hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
-    
+
+    def content_hash(self, data: Any) -> str:
+        """Digest of any cacheable value (datetimes, NumPy types included) for content-addressed keys"""
+        return hashlib.blake2b(canonical_bytes(data), digest_size=10).hexdigest()
+
+    # ============================================================================
+    # CLIENT ACCESS
+    # ============================================================================
+    # Every cached value goes through these, keyed by its full "aura:..." key.
+    # With Redis, reads check the in-process L1 first. An L1 entry can outlive its
+    # Redis copy by at most L1_TTL_S; deletes and invalidations reach every L1 at once.
+
+    def _count_tier(self, stat: str):
+        with self._lock:
+            self._tier_stats[stat] += 1
+
+    def _tier_get(self, full_key: str):
+        """Encoded value from L1, else from the backend (filling L1)"""
+        epoch = 0
+        if self._l1 is not None:
+            epoch = self._l1.epoch
+            cached = self._l1.get(full_key)
+            if cached is not None:
+                self._count_tier("l1_hits")
+                return cached
+        cached = self._client.get(full_key)
+        self._count_tier("l2_hits" if cached is not None else "l2_misses")
+        if cached is not None and self._l1 is not None:
+            self._l1.fill(full_key, cached, epoch)
+        return cached
+
+    def _raw_get(self, full_key: str) -> Optional[Any]:
+        cached = self._tier_get(full_key)
+        return self._serializer.loads(cached) if cached else None
+
+    def _raw_set(self, full_key: str, value: Any, ttl: int, broadcast: bool = False):
+        """broadcast=True also drops older copies of an overwritten key from the other workers' L1"""
+        payload = self._serializer.dumps(value)
+        epoch = self._l1.epoch if self._l1 is not None else 0
+        self._client.set(full_key, payload, ex=ttl)
+        if self._l1 is not None:
+            if broadcast:
+                self._l1.invalidate(full_key)
+                epoch = self._l1.epoch
+            self._l1.fill(full_key, payload, epoch)
+
+    def _raw_delete(self, full_key: str):
+        self._invalidate_keys([("delete", full_key)])
+
+    def _invalidate_keys(self, operations: list) -> list:
+        """
+        Applies [("delete" | "incr", key), ...] and drops those keys from every
+        worker's L1, all in one pipelined round trip. Returns the command results.
+        """
+        commands = [(method, (key,), {}) for method, key in operations]
+        if self._l1 is not None:
+            commands += self._l1.invalidation_commands([key for _, key in operations])
+        return self._client.execute(commands)[:len(operations)]
+
+    def tier_stats(self) -> dict:
+        """Hit ratio of each tier: L1 over all lookups, L2 (Redis / in-memory) over the lookups L1 missed"""
+        with self._lock:
+            stats = dict(self._tier_stats)
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["l2_misses"]
+        l2_lookups = stats["l2_hits"] + stats["l2_misses"]
+        tiers = {
+            "l2": {
+                "hits": stats["l2_hits"],
+                "misses": stats["l2_misses"],
+                "hit_ratio": round(stats["l2_hits"] / l2_lookups, 3) if l2_lookups else 0
+            },
+            "overall_hit_ratio": round((stats["l1_hits"] + stats["l2_hits"]) / lookups, 3) if lookups else 0
+        }
+        if self._l1 is not None:
+            tiers["l1"] = {
+                "hits": stats["l1_hits"],
+                "misses": l2_lookups,
+                "hit_ratio": round(stats["l1_hits"] / lookups, 3) if lookups else 0,
+                **self._l1.stats()
+            }
+        return tiers
+
+    # ============================================================================
+    # PER-USER GENERATIONS
+    # ============================================================================
+    # Prediction and analytics keys embed a per-user generation number:
+    # aura:{namespace}:{user_id}:g{generation}:... Invalidating a user's namespace
+    # is one INCR of aura:gen:{namespace}:{user_id}; the orphaned entries are never
+    # read again and expire by their TTL. No KEYS scan of the keyspace.
+
+    def _generation_key(self, namespace: str, user_id: int) -> str:
+        return f"aura:gen:{namespace}:{user_id}"
+
+    def _generation(self, namespace: str, user_id: int) -> int:
+        key = self._generation_key(namespace, user_id)
+        if self._l1 is not None:
+            # The generation is read before every keyed lookup, so L1 serves it too;
+            # _bump_generation invalidates it in every worker
+            epoch = self._l1.epoch
+            generation = self._l1.get(key)
+            if generation is not None:
+                return int(generation)
+        generation = self._client.get(key)
+        if generation is None:
+            # Seeded from the clock, not 0: should the counter ever be evicted, the
+            # new numbering can't land on a generation whose entries are still alive.
+            # SET NX and the re-read share a round trip; the re-read sees whichever seed won.
+            _, generation = self._client.execute([
+                ("set", (key, str(int(time.time() * 1000))), {"ex": None, "nx": True}),
+                ("get", (key,), {})
+            ])
+        if self._l1 is not None:
+            self._l1.fill(key, generation, epoch)
+        return int(generation)
+
+    def _user_key(self, namespace: str, user_id: int, *args) -> str:
+        return self._generate_key(namespace, user_id, f"g{self._generation(namespace, user_id)}", *args)
+
+    def _bump_generation(self, namespace: str, user_id: int) -> int:
+        return self._bump_generations([namespace], user_id)[0]
+
+    def _bump_generations(self, namespaces: list, user_id: int, delete_keys: tuple = ()) -> list:
+        """INCRs the user's generation in each namespace (and deletes delete_keys) in one round trip"""
+        results = self._invalidate_keys([("incr", self._generation_key(ns, user_id)) for ns in namespaces] +
+                                        [("delete", key) for key in delete_keys])
+        with self._lock:
+            for namespace in namespaces:
+                self._invalidation_stats[namespace] += 1
+                self._invalidation_stats["keys_scans_avoided"] += 1
+        return results[:len(namespaces)]
+
     # ============================================================================
     # GENERIC GET/SET METHODS
     # ============================================================================
@@ -119,10 +827,7 @@ class CacheService:
     def get(self, key: str) -> Optional[Any]:
         """Generic get method for any cached data"""
         try:
-            cached = self._client.get(f"aura:{key}")
-            if cached:
-                return json.loads(cached)
-            return None
+            return self._raw_get(f"aura:{key}")
         except Exception as e:
             print(f"[Cache] Error getting key {key}: {e}")
             return None
@@ -130,7 +835,7 @@ class CacheService:
     def set(self, key: str, value: Any, ttl: int = CACHE_DEFAULT_TTL) -> bool:
         """Generic set method for any data"""
         try:
-            self._client.set(f"aura:{key}", json.dumps(value), ex=ttl)
+            self._raw_set(f"aura:{key}", value, ttl)
             return True
         except Exception as e:
             print(f"[Cache] Error setting key {key}: {e}")
@@ -138,70 +843,250 @@ class CacheService:
     
     def delete(self, key: str) -> bool:
         """Delete a specific key"""
+        self._mark_flight_stale(f"aura:{key}")
         try:
-            self._client.delete(f"aura:{key}")
+            self._raw_delete(f"aura:{key}")
             return True
         except Exception as e:
             print(f"[Cache] Error deleting key {key}: {e}")
             return False
-    
+
+    # ============================================================================
+    # READ-THROUGH LOADING
+    # ============================================================================
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._read_through_stats[stat] += 1
+
+    def _mark_flight_stale(self, full_key: str):
+        """An invalidation landed while the key was loading: its result must not be cached."""
+        with self._lock:
+            flight = self._flights.get(full_key)
+            if flight is not None:
+                flight.stale = True
+
+    def _single_flight(self, full_key: str, load, store) -> Any:
+        """
+        Runs load() for full_key unless that is already running in this process,
+        in which case it waits for and returns the running load's value. The
+        loader then store()s its value - unless the key was invalidated meanwhile -
+        before waking the waiters, so callers arriving right after find it cached.
+        """
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = _Flight()
+            else:
+                self._read_through_stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = load()
+            self._count("loads")
+            if not flight.stale:
+                store(flight.value)
+        except Exception as e:
+            flight.error = e
+            self._count("errors")
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(full_key, None)
+            flight.done.set()
+        return flight.value
+
+    def get_or_load(self, key: str, loader, ttl: int = CACHE_DEFAULT_TTL) -> Any:
+        """
+        Returns the cached value for key, or calls loader() and caches its result.
+        Single-flight: while one thread loads a key, other callers for the same key
+        wait for that result instead of running loader() themselves. The value is
+        returned JSON-shaped (datetimes as ISO strings) on hits and misses alike,
+        and may be shared between callers, so don't mutate it.
+        """
+        return self._get_or_load_full(f"aura:{key}", loader, ttl)
+
+    def _get_or_load_full(self, full_key: str, loader, ttl: int, should_cache=bool) -> Any:
+        try:
+            cached = self._raw_get(full_key)
+        except Exception as e:
+            print(f"[Cache] Error getting key {full_key}: {e}")
+            cached = None
+        if cached is not None:
+            self._count("hits")
+            return cached
+
+        def store(value):
+            if should_cache(value):
+                try:
+                    self._raw_set(full_key, value, ttl)
+                except Exception as e:
+                    print(f"[Cache] Error setting key {full_key}: {e}")
+
+        return self._single_flight(full_key, lambda: self._make_serializable(loader()), store)
+
+    # ============================================================================
+    # STALE-WHILE-REVALIDATE
+    # ============================================================================
+    # Used by versioned analytics: once new data changes the version, the previous
+    # version's value is still served - for up to SWR_GRACE_S after it was
+    # computed - while one background refresh (one across all workers, via a
+    # Redis SET NX lock) computes the new one. Only callers with nothing recent
+    # enough to serve wait for the computation.
+
+    def _refresh_in_background(self, full_key: str, load, store):
+        with self._lock:
+            if full_key in self._flights:
+                return  # Already refreshing in this process
+        lock_key = f"aura:lock:{full_key[len('aura:'):]}"
+        try:
+            if not self._client.set(lock_key, b"1", ex=REFRESH_LOCK_TTL_S, nx=True):
+                return  # Another worker is refreshing it
+        except Exception as e:
+            print(f"[Cache] Could not take the refresh lock for {full_key}: {e}")
+            return
+
+        def refresh():
+            try:
+                self._single_flight(full_key, load, store)
+                self._count_swr("refreshes")
+            except Exception as e:
+                self._count_swr("refresh_errors")
+                print(f"[Cache] Background refresh of {full_key} failed: {e}")
+            finally:
+                try:
+                    self._client.delete(lock_key)
+                except Exception:
+                    pass  # It expires after REFRESH_LOCK_TTL_S anyway
+
+        self._refresh_executor.submit(refresh)
+
+    def _count_swr(self, stat: str):
+        with self._lock:
+            self._swr_stats[stat] += 1
+
+    def swr_stats(self) -> dict:
+        with self._lock:
+            return dict(self._swr_stats)
+
     # ============================================================================
     # PREDICTION CACHING
     # ============================================================================
     
-    def get_prediction(self, user_id: int, glucose_history: list) -> Optional[dict]:
+    def _prediction_key(self, user_id: int, glucose_history: list, future_events: Optional[dict]) -> str:
+        """
+        Keyed on the last 12 readings and the meal/activity events the forecast was
+        adjusted for. Empty events (no carbs, no activity) adjust nothing, so they
+        share the plain forecast's key.
+        """
+        parts = [self._hash_key(glucose_history[-12:])]
+        events = {k: v for k, v in (future_events or {}).items() if v}
+        if events:
+            parts.append(self._hash_key(events))
+        return self._user_key("prediction", user_id, *parts)
+
+    def get_prediction(self, user_id: int, glucose_history: list, future_events: dict = None) -> Optional[dict]:
         """Retrieve cached prediction if available"""
         try:
-            history_hash = self._hash_key(glucose_history[-12:])  # Use last 12 readings for hash
-            key = self._generate_key("prediction", user_id, history_hash)
-            cached = self._client.get(key)
+            cached = self._raw_get(self._prediction_key(user_id, glucose_history, future_events))
             if cached:
                 print(f"[Cache] Prediction cache HIT for user {user_id}")
-                return json.loads(cached)
+                return cached
             print(f"[Cache] Prediction cache MISS for user {user_id}")
             return None
         except Exception as e:
             print(f"[Cache] Error getting prediction: {e}")
             return None
     
-    def set_prediction(self, user_id: int, glucose_history: list, prediction: dict) -> bool:
+    def set_prediction(self, user_id: int, glucose_history: list, prediction: dict,
+                       future_events: dict = None) -> bool:
         """Cache a prediction result"""
         try:
-            history_hash = self._hash_key(glucose_history[-12:])
-            key = self._generate_key("prediction", user_id, history_hash)
-            self._client.set(key, json.dumps(prediction), ex=PREDICTION_CACHE_TTL)
+            key = self._prediction_key(user_id, glucose_history, future_events)
+            self._raw_set(key, prediction, PREDICTION_CACHE_TTL)
             print(f"[Cache] Prediction cached for user {user_id} (TTL: {PREDICTION_CACHE_TTL}s)")
             return True
         except Exception as e:
             print(f"[Cache] Error setting prediction: {e}")
             return False
     
-    def invalidate_user_predictions(self, user_id: int) -> int:
-        """Invalidate all cached predictions for a user"""
+    def get_latest_prediction(self, user_id: int) -> Optional[dict]:
+        """Forecast precomputed on ingest, with the reading it was computed from"""
+        try:
+            return self._raw_get(self._user_key("prediction", user_id, "latest"))
+        except Exception as e:
+            print(f"[Cache] Error getting latest prediction: {e}")
+            return None
+
+    def set_latest_prediction(self, user_id: int, reading: dict, prediction: dict) -> bool:
+        """
+        Stores the forecast for a user's latest reading. The key is in the user's
+        prediction generation, so the next reading invalidates it along with the rest.
+        """
+        try:
+            key = self._user_key("prediction", user_id, "latest")
+            payload = {
+                "reading": self._make_serializable(reading),
+                "prediction": self._make_serializable(prediction),
+                "computed_at": datetime.now().isoformat()
+            }
+            self._raw_set(key, payload, LATEST_PREDICTION_TTL)
+            return True
+        except Exception as e:
+            print(f"[Cache] Error setting latest prediction: {e}")
+            return False
+
+    def mark_latest_prediction_skipped(self, user_id: int, reason: str, ttl: int) -> bool:
+        """
+        Records that no forecast could be computed for the user's latest data (e.g.
+        too few readings). In the prediction generation too, so the next reading clears it.
+        """
+        try:
+            self._raw_set(self._user_key("prediction", user_id, "latest_skipped"), reason, ttl)
+            return True
+        except Exception as e:
+            print(f"[Cache] Error marking latest prediction skipped: {e}")
+            return False
+
+    def get_latest_prediction_skipped(self, user_id: int) -> Optional[str]:
+        """Why the latest forecast was skipped, or None"""
         try:
-            pattern = f"aura:prediction:{user_id}:*"
-            keys = self._client.keys(pattern)
-            if keys:
-                for key in keys:
-                    self._client.delete(key)
-                print(f"[Cache] Invalidated {len(keys)} predictions for user {user_id}")
-            return len(keys) if keys else 0
+            return self._raw_get(self._user_key("prediction", user_id, "latest_skipped"))
+        except Exception as e:
+            print(f"[Cache] Error getting latest prediction skip: {e}")
+            return None
+
+    def invalidate_user_predictions(self, user_id: int) -> bool:
+        """Invalidate all cached predictions for a user (one INCR of their prediction generation)"""
+        try:
+            generation = self._bump_generation("prediction", user_id)
+            print(f"[Cache] Predictions invalidated for user {user_id} (generation {generation})")
+            return True
         except Exception as e:
             print(f"[Cache] Error invalidating predictions: {e}")
-            return 0
+            return False
     
     # ============================================================================
     # DASHBOARD DATA CACHING
     # ============================================================================
+
+    def get_or_load_dashboard_data(self, user_id: int, loader) -> dict:
+        """Read-through dashboard cache: loader(user_id) runs once per miss, however many refreshes arrive"""
+        return self.get_or_load(f"dashboard:{user_id}", lambda: loader(user_id), ttl=DASHBOARD_CACHE_TTL)
     
     def get_dashboard_data(self, user_id: int) -> Optional[dict]:
         """Retrieve cached dashboard data"""
         try:
-            key = self._generate_key("dashboard", user_id)
-            cached = self._client.get(key)
+            cached = self._raw_get(self._generate_key("dashboard", user_id))
             if cached:
                 print(f"[Cache] Dashboard cache HIT for user {user_id}")
-                return json.loads(cached)
+                return cached
             return None
         except Exception as e:
             print(f"[Cache] Error getting dashboard: {e}")
@@ -213,7 +1098,7 @@ class CacheService:
             key = self._generate_key("dashboard", user_id)
             # Convert datetime objects to strings for JSON serialization
             serializable_data = self._make_serializable(data)
-            self._client.set(key, json.dumps(serializable_data), ex=DASHBOARD_CACHE_TTL)
+            self._raw_set(key, serializable_data, DASHBOARD_CACHE_TTL)
             print(f"[Cache] Dashboard cached for user {user_id}")
             return True
         except Exception as e:
@@ -224,7 +1109,8 @@ class CacheService:
         """Invalidate cached dashboard data for a user"""
         try:
             key = self._generate_key("dashboard", user_id)
-            self._client.delete(key)
+            self._mark_flight_stale(key)
+            self._raw_delete(key)
             print(f"[Cache] Dashboard invalidated for user {user_id}")
             return True
         except Exception as e:
@@ -238,41 +1124,88 @@ class CacheService:
     def get_analytics(self, user_id: int, analytics_type: str, days: int = 7) -> Optional[dict]:
         """Retrieve cached analytics data"""
         try:
-            key = self._generate_key("analytics", user_id, analytics_type, days)
-            cached = self._client.get(key)
+            cached = self._raw_get(self._user_key("analytics", user_id, analytics_type, days))
             if cached:
                 print(f"[Cache] Analytics cache HIT: {analytics_type} for user {user_id}")
-                return json.loads(cached)
+                return cached
             return None
         except Exception as e:
             print(f"[Cache] Error getting analytics: {e}")
             return None
     
-    def set_analytics(self, user_id: int, analytics_type: str, data: dict, days: int = 7) -> bool:
+    def set_analytics(self, user_id: int, analytics_type: str, data: dict, days: int = 7,
+                      ttl: int = ANALYTICS_CACHE_TTL) -> bool:
         """Cache analytics data"""
         try:
-            key = self._generate_key("analytics", user_id, analytics_type, days)
+            key = self._user_key("analytics", user_id, analytics_type, days)
             serializable_data = self._make_serializable(data)
-            self._client.set(key, json.dumps(serializable_data), ex=ANALYTICS_CACHE_TTL)
+            self._raw_set(key, serializable_data, ttl)
             print(f"[Cache] Analytics cached: {analytics_type} for user {user_id}")
             return True
         except Exception as e:
             print(f"[Cache] Error setting analytics: {e}")
             return False
     
-    def invalidate_user_analytics(self, user_id: int) -> int:
-        """Invalidate all analytics cache for a user"""
+    def get_or_load_versioned_analytics(self, user_id: int, analytics_type: str, days: int, version: Any,
+                                        loader, ttl: int = ANALYTICS_VERSIONED_TTL, grace: int = SWR_GRACE_S,
+                                        should_cache=bool) -> Any:
+        """
+        Analytics memoized on `version`, a description of the data they are computed
+        from (see database.get_analytics_data_version). The key is a digest of it, so
+        the entry is valid for as long as the data is unchanged and new data simply
+        misses; there's no TTL to tune. On such a miss the previous version's value
+        is returned if it was computed less than `grace` seconds ago, and loader()
+        runs once in the background; otherwise concurrent misses share one computation.
+        """
+        generation = f"g{self._generation('analytics', user_id)}"
+        digest = self.content_hash(version)
+        full_key = self._generate_key("analytics", user_id, generation, analytics_type, days, f"v{digest}")
+        # Last value stored for any version; under the generation, so invalidation drops it too
+        latest_key = self._generate_key("analytics", user_id, generation, analytics_type, days, "latest")
         try:
-            pattern = f"aura:analytics:{user_id}:*"
-            keys = self._client.keys(pattern)
-            if keys:
-                for key in keys:
-                    self._client.delete(key)
-                print(f"[Cache] Invalidated {len(keys)} analytics entries for user {user_id}")
-            return len(keys) if keys else 0
+            cached = self._raw_get(full_key)
+            latest = self._raw_get(latest_key) if cached is None else None
+        except Exception as e:
+            print(f"[Cache] Error getting key {full_key}: {e}")
+            cached = latest = None
+        if cached is not None:
+            self._count_swr("fresh_hits")
+            return cached
+
+        def load():
+            return {"value": self._make_serializable(loader()), "computed_at": time.time()}
+
+        def store(computed):
+            if not should_cache(computed["value"]):
+                return
+            try:
+                self._raw_set(full_key, computed["value"], ttl)
+                # Broadcast: other workers' L1 may still hold the entry being replaced
+                self._raw_set(latest_key, {**computed, "version": digest}, ttl, broadcast=True)
+            except Exception as e:
+                print(f"[Cache] Error setting key {full_key}: {e}")
+
+        if isinstance(latest, dict) and "computed_at" in latest:
+            if latest.get("version") == digest:
+                self._count_swr("fresh_hits")  # The versioned entry was evicted but this is the same value
+                return latest["value"]
+            if time.time() - latest["computed_at"] < grace:
+                self._count_swr("stale_hits")
+                self._refresh_in_background(full_key, load, store)
+                return latest["value"]
+
+        self._count_swr("misses")
+        return self._single_flight(full_key, load, store)["value"]
+
+    def invalidate_user_analytics(self, user_id: int) -> bool:
+        """Invalidate all analytics cache for a user (one INCR of their analytics generation)"""
+        try:
+            generation = self._bump_generation("analytics", user_id)
+            print(f"[Cache] Analytics invalidated for user {user_id} (generation {generation})")
+            return True
         except Exception as e:
             print(f"[Cache] Error invalidating analytics: {e}")
-            return 0
+            return False
     
     # ============================================================================
     # UTILITY METHODS
@@ -291,26 +1224,53 @@ class CacheService:
         return obj
     
     def invalidate_all_user_cache(self, user_id: int) -> dict:
-        """Invalidate all cached data for a user"""
-        predictions = self.invalidate_user_predictions(user_id)
-        self.invalidate_dashboard(user_id)
-        analytics = self.invalidate_user_analytics(user_id)
+        """Invalidate all cached data for a user (both generations and the dashboard in one round trip)"""
+        dashboard_key = self._generate_key("dashboard", user_id)
+        self._mark_flight_stale(dashboard_key)
+        try:
+            self._bump_generations(["prediction", "analytics"], user_id, delete_keys=(dashboard_key,))
+            print(f"[Cache] All cache invalidated for user {user_id}")
+            invalidated = True
+        except Exception as e:
+            print(f"[Cache] Error invalidating cache for user {user_id}: {e}")
+            invalidated = False
         return {
-            "predictions_invalidated": predictions,
-            "dashboard_invalidated": True,
-            "analytics_invalidated": analytics
+            "predictions_invalidated": invalidated,
+            "dashboard_invalidated": invalidated,
+            "analytics_invalidated": invalidated
         }
     
     def health_check(self) -> dict:
         """Check cache service health"""
         try:
             is_connected = self._client.ping()
-            cache_type = "Redis" if REDIS_AVAILABLE and not isinstance(self._client, InMemoryCache) else "InMemory"
-            return {
-                "status": "healthy" if is_connected else "degraded",
+            failover = isinstance(self._client, FailoverClient)
+            if not failover:
+                cache_type = "InMemory"
+            elif self._client.available:
+                cache_type = "Redis"
+            else:
+                cache_type = "InMemory (Redis circuit open)"
+            with self._lock:
+                read_through = {**self._read_through_stats, "loading": len(self._flights)}
+                invalidations = dict(self._invalidation_stats)
+            health = {
+                "status": "healthy" if is_connected and (not failover or self._client.available) else "degraded",
                 "cache_type": cache_type,
-                "connected": is_connected
+                "connected": is_connected,
+                "read_through": read_through,
+                "stale_while_revalidate": self.swr_stats(),
+                "invalidations": invalidations,
+                "serializer": self._serializer.stats(),
+                "tiers": self.tier_stats()
             }
+            if failover:
+                health["circuit_breaker"] = self._client.stats()
+                if not self._client.available:
+                    health["memory"] = self._client.local.stats()
+            else:
+                health["memory"] = self._client.stats()
+            return health
         except Exception as e:
             return {
                 "status": "unhealthy",
@@ -332,7 +1292,7 @@ def cached_prediction(ttl: int = PREDICTION_CACHE_TTL):
         @wraps(func)
         def wrapper(user_id: int, glucose_history: list, *args, **kwargs):
             # Try to get from cache
-            cached_result = cache.get_prediction(user_id, glucose_history)
+            cached_result = cache.get_prediction(user_id, glucose_history, kwargs.get("future_events"))
             if cached_result is not None:
                 return cached_result
             
@@ -341,31 +1301,26 @@ def cached_prediction(ttl: int = PREDICTION_CACHE_TTL):
             
             # Cache the result if successful
             if result and result.get("status") != "error":
-                cache.set_prediction(user_id, glucose_history, result)
+                cache.set_prediction(user_id, glucose_history, result, kwargs.get("future_events"))
             
             return result
         return wrapper
     return decorator
 
 
-def cached_analytics(analytics_type: str, ttl: int = ANALYTICS_CACHE_TTL):
-    """Decorator to automatically cache analytics results"""
+def cached_analytics(analytics_type: str, ttl: int = ANALYTICS_VERSIONED_TTL):
+    """
+    Decorator to automatically cache analytics results.
+    Content-addressed: the key is a digest of the arguments (the readings and meal
+    logs themselves), so a result is reused exactly when the inputs are identical.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(user_id: int, *args, days: int = 7, **kwargs):
-            # Try to get from cache
-            cached_result = cache.get_analytics(user_id, analytics_type, days)
-            if cached_result is not None:
-                return cached_result
-            
-            # Call the actual function
-            result = func(user_id, *args, days=days, **kwargs)
-            
-            # Cache the result
-            if result:
-                cache.set_analytics(user_id, analytics_type, result, days)
-            
-            return result
+            return cache.get_or_load_versioned_analytics(
+                user_id, analytics_type, days, [args, kwargs],
+                lambda: func(user_id, *args, days=days, **kwargs), ttl=ttl
+            )
         return wrapper
     return decorator
 
@@ -374,10 +1329,26 @@ def cached_analytics(analytics_type: str, ttl: int = ANALYTICS_CACHE_TTL):
 # EVENT HOOKS FOR CACHE INVALIDATION
 # ============================================================================
 
-def on_new_glucose_reading(user_id: int):
+# Other services (e.g. streaming inference) subscribe to new readings here,
+# so cache_service doesn't need to import them.
+_glucose_reading_listeners = []
+
+
+def register_glucose_reading_listener(callback):
+    """Register callback(user_id, glucose_value, timestamp) to run on every new reading"""
+    if callback not in _glucose_reading_listeners:
+        _glucose_reading_listeners.append(callback)
+
+
+def on_new_glucose_reading(user_id: int, glucose_value: float = None, timestamp=None):
     """Called when a new glucose reading is added"""
     cache.invalidate_user_predictions(user_id)
     cache.invalidate_dashboard(user_id)
+    for listener in _glucose_reading_listeners:
+        try:
+            listener(user_id, glucose_value, timestamp)
+        except Exception as e:
+            print(f"[Cache] Glucose reading listener {getattr(listener, '__name__', listener)} failed: {e}")
 
 
 def on_new_meal_log(user_id: int):
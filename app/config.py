@@ -7,6 +7,18 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, 'models', 'glucose_predictor.h5')
 DATA_PATH = os.path.join(BASE_DIR, 'data', '559-ws-training.xml')
 
+# Inference backend for the glucose predictor:
+#   "keras" - load .h5 files with keras.models.load_model (imports TensorFlow)
+#   "numpy" - TensorFlow-free NumPy LSTM runtime (numpy_inference.py), weights read via h5py
+#   "onnx"  - ONNX Runtime sessions built from the exported .onnx files (onnx_backend.py)
+PREDICTION_BACKEND = os.getenv("AURA_PREDICTION_BACKEND", "keras").lower()
+
+# Runtime for the DQN insulin policy: "torch" (stable_baselines3) or "onnx"
+RECOMMENDATION_BACKEND = os.getenv("AURA_RECOMMENDATION_BACKEND", "torch").lower()
+
+# With the ONNX backends, load the int8 dynamically-quantized exports (*.int8.onnx)
+ONNX_QUANTIZED = os.getenv("AURA_ONNX_QUANTIZED", "0") == "1"
+
 # --- THE FIX ---
 # This line tells Python: "Look for a Secret named DATABASE_URL first."
 # If it finds the Secret (which has port 6543), it uses it.
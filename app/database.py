@@ -1,9 +1,19 @@
+import io
+import math
 import os
+import re
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
 import psycopg2
+import psycopg2.extensions
 from config import DATABASE_URL
+from cache_service import on_new_meal_log, on_new_glucose_reading
 from psycopg2.extras import RealDictCursor
 from sqlalchemy import create_engine
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 # Create the database engine
 if "sqlite" in DATABASE_URL:
@@ -11,106 +21,701 @@ if "sqlite" in DATABASE_URL:
 else:
     engine = create_engine(DATABASE_URL)
 
-# Connection pool for better performance
+# ==================================================================
+# === CONNECTION POOL ==============================================
+# ==================================================================
+
+DB_POOL_MIN_SIZE = int(os.getenv("AURA_DB_POOL_MIN", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("AURA_DB_POOL_MAX", "10"))
+# How long a checkout waits for a free connection before giving up
+DB_POOL_TIMEOUT_S = float(os.getenv("AURA_DB_POOL_TIMEOUT_S", "10"))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_CHECK_IDLE_S = float(os.getenv("AURA_DB_POOL_CHECK_IDLE_S", "30"))
+# Connections older than this are replaced (the remote pooler drops long-lived sessions)
+DB_POOL_MAX_LIFETIME_S = float(os.getenv("AURA_DB_POOL_MAX_LIFETIME_S", "1800"))
+
+# glucose_readings partitions (monthly, see GLUCOSE READING PARTITIONS below)
+GLUCOSE_PARTITIONS_AHEAD = int(os.getenv("AURA_GLUCOSE_PARTITIONS_AHEAD", "3"))  # Months created in advance
+GLUCOSE_RETENTION_MONTHS = int(os.getenv("AURA_GLUCOSE_RETENTION_MONTHS", "0"))  # 0 keeps every reading
+GLUCOSE_RETENTION_ACTION = os.getenv("AURA_GLUCOSE_RETENTION_ACTION", "detach")  # detach | drop
+PARTITION_MAINTENANCE_INTERVAL_S = float(os.getenv("AURA_GLUCOSE_PARTITION_MAINTENANCE_H", "6")) * 3600
+# Rows per round trip when streaming readings from a server-side cursor
+GLUCOSE_FRAME_FETCH_ROWS = int(os.getenv("AURA_GLUCOSE_FRAME_FETCH_ROWS", "5000"))
+# Values per chunk yielded by iter_glucose_history (8640 = 30 days of 5-minute readings)
+GLUCOSE_HISTORY_CHUNK_ROWS = int(os.getenv("AURA_GLUCOSE_HISTORY_CHUNK_ROWS", "8640"))
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    - At most max_size connections exist; checkouts beyond that block (up to
+      timeout) instead of opening more sessions against the remote pooler.
+    - Idle connections are reused most-recently-used first and pinged with
+      SELECT 1 if they sat idle long enough to have been dropped server-side.
+    - Returned connections are rolled back if they are still in a transaction,
+      and discarded if they are broken.
+    """
+
+    def __init__(self, dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT_S):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.min_size = max(0, min(min_size, self.max_size))
+        self.timeout = timeout
+        self._idle = deque()
+        self._checked_out = {}  # id(conn) -> _PooledConnection
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0, "reused": 0, "opened": 0, "closed": 0, "timeouts": 0,
+            "failed_health_checks": 0, "wait_ms_total": 0.0, "max_wait_ms": 0.0
+        }
+        for _ in range(self.min_size):
+            try:
+                self._idle.append(self._open())
+            except psycopg2.Error as e:
+                print(f"[Database] Could not pre-open pool connection: {e}")
+                break
+
+    def _open(self) -> _PooledConnection:
+        conn = psycopg2.connect(self.dsn)
+        with self._lock:
+            self._stats["opened"] += 1
+        return _PooledConnection(conn)
+
+    def _close(self, pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats["closed"] += 1
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        if pooled.conn.closed:
+            return False
+        now = time.monotonic()
+        if now - pooled.created_at > DB_POOL_MAX_LIFETIME_S:
+            return False
+        if now - pooled.last_used < DB_POOL_CHECK_IDLE_S:
+            return True
+        try:
+            with pooled.conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            pooled.conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._lock:
+                self._stats["failed_health_checks"] += 1
+            return False
+
+    def getconn(self, timeout: float = None):
+        """Checks out a healthy connection, waiting up to `timeout` seconds for a free slot."""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout if timeout is None else timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection free within {self.timeout if timeout is None else timeout}s")
+        wait_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            pooled = None
+            while pooled is None:
+                with self._lock:
+                    candidate = self._idle.pop() if self._idle else None
+                if candidate is None:
+                    pooled = self._open()
+                elif self._is_healthy(candidate):
+                    pooled = candidate
+                    with self._lock:
+                        self._stats["reused"] += 1
+                else:
+                    self._close(candidate)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._checked_out[id(pooled.conn)] = pooled
+            self._stats["checkouts"] += 1
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        return pooled.conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Returns a connection; broken (or explicitly discarded) ones are closed instead of reused."""
+        with self._lock:
+            pooled = self._checked_out.pop(id(conn), None)
+        if pooled is None:
+            return  # Not ours (or returned twice)
+        try:
+            if not discard and not conn.closed:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                pooled.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(pooled)
+                return
+        except psycopg2.Error:
+            pass
+        finally:
+            self._slots.release()
+        self._close(pooled)
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> dict:
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            return {
+                **{k: round(v, 2) if isinstance(v, float) else v for k, v in self._stats.items()},
+                "avg_wait_ms": round(self._stats["wait_ms_total"] / checkouts, 3) if checkouts else 0,
+                "reuse_ratio": round(self._stats["reused"] / checkouts, 3) if checkouts else 0,
+                "idle": len(self._idle),
+                "in_use": len(self._checked_out),
+                "min_size": self.min_size,
+                "max_size": self.max_size
+            }
+
+
+# Created on first use so importing this module never opens a connection
 CONNECTION_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global CONNECTION_POOL
+    if CONNECTION_POOL is None:
+        with _POOL_LOCK:
+            if CONNECTION_POOL is None:
+                CONNECTION_POOL = ConnectionPool(DATABASE_URL)
+                print(f"[Database] Connection pool ready (min {CONNECTION_POOL.min_size}, max {CONNECTION_POOL.max_size}).")
+    return CONNECTION_POOL
+
+
+def get_pool_stats() -> dict:
+    return get_pool().stats() if CONNECTION_POOL is not None else {"initialized": False}
+
+
+@contextmanager
+def db_connection():
+    """
+    Pooled connection for the duration of a `with` block.
+    Commits when the block succeeds, rolls back if it raises, and always
+    returns the connection to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        pool.putconn(conn, discard=broken)
+
+
+@contextmanager
+def db_cursor(dict_rows: bool = False, name: str = None):
+    """
+    Cursor on a pooled connection (see db_connection). dict_rows=True returns
+    RealDictCursor rows; a name makes it a server-side cursor that streams
+    its rows in fetchmany() chunks instead of loading the whole result.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor(name=name, cursor_factory=RealDictCursor if dict_rows else None)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
 
 def get_db_connection():
-    """Establishes a connection to the database."""
+    """
+    Opens a dedicated, unpooled connection (the caller must close it).
+    Application code should use db_cursor()/db_connection() instead.
+    """
     conn = psycopg2.connect(DATABASE_URL)
     return conn
 
-def init_db():
-    """Initializes the database by creating all necessary tables with optimized indexes."""
-    conn = None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+# ==================================================================
+# === GLUCOSE READING PARTITIONS ===================================
+# ==================================================================
+# glucose_readings is range-partitioned by month on `timestamp` (UTC months,
+# named glucose_readings_pYYYYMM). Upcoming months are created ahead of time by
+# maintain_glucose_partitions(); a write for a month that has no partition yet
+# creates it first, in its own short transaction (prepare_glucose_partitions).
+# Partitions are created as plain tables and then ATTACHed, which only takes
+# SHARE UPDATE EXCLUSIVE on glucose_readings, so reads carry on meanwhile. Past the retention window whole partitions are
+# detached (kept as glucose_readings_archive_pYYYYMM) or dropped, instead of
+# DELETEing rows. Queries filter on timestamp bounds computed in Python, so the
+# planner prunes the months outside the window when it plans the query.
 
-        cur.execute("DROP TABLE IF EXISTS meal_logs CASCADE;")
-        cur.execute("DROP TABLE IF EXISTS insulin_doses CASCADE;")
-        cur.execute("DROP TABLE IF EXISTS glucose_readings CASCADE;")
-        cur.execute("DROP TABLE IF EXISTS activity_logs CASCADE;")
-        cur.execute("DROP TABLE IF EXISTS users CASCADE;")
-        print("Dropped existing tables.")
+_PARTITION_NAME = re.compile(r"^glucose_readings_p(\d{4})(\d{2})$")
+_known_partitions = set()  # Partitions seen to exist, so writes skip the catalog lookup
+_PARTITION_LOCK = threading.Lock()
 
-        cur.execute("""
-            CREATE TABLE users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(80) UNIQUE NOT NULL, 
-                password_hash VARCHAR(256) NOT NULL,
-                name VARCHAR(100) NOT NULL,
-                age INTEGER,
-                gender VARCHAR(50),
-                phone_number VARCHAR(20),
-                weight_kg REAL,
-                height_cm REAL,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        print("Created UPGRADED 'users' table.")
 
-        cur.execute("""
-            CREATE TABLE glucose_readings (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
-                glucose_value REAL NOT NULL
-            );
-        """)
-        # === OPTIMIZED INDEXES FOR ANALYTICS ===
-        cur.execute("CREATE INDEX idx_glucose_user_time ON glucose_readings(user_id, timestamp DESC);")
-        cur.execute("CREATE INDEX idx_glucose_timestamp ON glucose_readings(timestamp);")
-        print("Created 'glucose_readings' table with optimized indexes.")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _utc_ago(days: float = 0, hours: float = 0) -> datetime:
+    """Window start as a query parameter: unlike NOW() - INTERVAL, a constant lets the planner prune partitions"""
+    return datetime.now(timezone.utc) - timedelta(days=days, hours=hours)
+
+
+def _month_start(ts: datetime) -> datetime:
+    ts = ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _day_start(ts: datetime) -> datetime:
+    return ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"glucose_readings_p{month.year:04d}{month.month:02d}"
+
+
+def _retention_cutoff() -> datetime:
+    """Start of the oldest month still retained, or None when readings are kept forever"""
+    if GLUCOSE_RETENTION_MONTHS <= 0:
+        return None
+    return _add_months(_month_start(datetime.now(timezone.utc)), -GLUCOSE_RETENTION_MONTHS)
+
+
+def _create_glucose_readings_table(cur):
+    cur.execute("""
+        CREATE TABLE glucose_readings (
+            id BIGSERIAL,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            glucose_value REAL NOT NULL
+        ) PARTITION BY RANGE (timestamp);
+    """)
+    # Unique: a reading is identified by (user, timestamp), so re-uploaded device batches don't duplicate.
+    # It is the only index: with monthly partitions a time-range scan no longer needs its own.
+    cur.execute("CREATE UNIQUE INDEX idx_glucose_user_time ON glucose_readings(user_id, timestamp DESC);")
+
+
+def glucose_readings_partitioned(cur) -> bool:
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('glucose_readings');")
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def _partition_months(start: datetime, end: datetime) -> list:
+    """Month starts covering start..end (inclusive), none before the retention cutoff"""
+    cutoff = _retention_cutoff()
+    month = _month_start(start)
+    if cutoff is not None and month < cutoff:
+        month = cutoff
+    months = []
+    while month <= end:
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def ensure_glucose_partitions(cur, start: datetime, end: datetime) -> list:
+    """
+    Creates the monthly partitions covering start..end (inclusive) that don't
+    exist yet, on the caller's (tuple) cursor and transaction. Months before
+    the retention cutoff are never created. Returns the names created.
+    Each one is a CREATE TABLE + ATTACH PARTITION, which locks glucose_readings
+    in SHARE UPDATE EXCLUSIVE mode (not ACCESS EXCLUSIVE like PARTITION OF).
+    """
+    created = []
+    for month in _partition_months(start, end):
+        name = _partition_name(month)
+        if name in _known_partitions:
+            continue
+        # Serializes creators of the same month across connections and processes
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (name,))
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (name,))
+        if cur.fetchone()[0]:
+            with _PARTITION_LOCK:
+                _known_partitions.add(name)
+            continue
+        # Not cached yet: the transaction creating it might still roll back
+        cur.execute(f"CREATE TABLE {name} (LIKE glucose_readings INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+        cur.execute(
+            f"ALTER TABLE glucose_readings ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s);",
+            (month.isoformat(), _add_months(month, 1).isoformat())
+        )
+        created.append(name)
+    return created
+
+
+def prepare_glucose_partitions(start: datetime, end: datetime) -> list:
+    """
+    ensure_glucose_partitions in its own short, committed transaction, for
+    writers to call before they load rows. The new partition's locks are then
+    released before the (possibly long) load starts. Returns the names created.
+    """
+    if all(_partition_name(month) in _known_partitions for month in _partition_months(start, end)):
+        return []
+    with db_cursor() as cur:
+        if not glucose_readings_partitioned(cur):
+            return []
+        created = ensure_glucose_partitions(cur, start, end)
+    with _PARTITION_LOCK:
+        _known_partitions.update(created)
+    if created:
+        print(f"[Database] Created glucose partitions {created}.")
+    return created
+
+
+def _list_glucose_partitions(cur) -> list:
+    """(month start, name) of every attached monthly partition, oldest first"""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'glucose_readings'::regclass;
+    """)
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append((datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc), name))
+    return sorted(partitions)
 
-        cur.execute("""
-            CREATE TABLE insulin_doses (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
-                dose_amount REAL NOT NULL,
-                dose_type VARCHAR(50)
-            );
-        """)
-        cur.execute("CREATE INDEX idx_insulin_user_time ON insulin_doses(user_id, timestamp DESC);")
-        print("Created 'insulin_doses' table with index.")
 
+def apply_glucose_retention(cur) -> list:
+    """Detaches (or drops, per AURA_GLUCOSE_RETENTION_ACTION) partitions wholly before the retention cutoff"""
+    cutoff = _retention_cutoff()
+    if cutoff is None:
+        return []
+    expired = [name for month, name in _list_glucose_partitions(cur) if _add_months(month, 1) <= cutoff]
+    for name in expired:
+        if GLUCOSE_RETENTION_ACTION == "drop":
+            cur.execute(f"DROP TABLE {name};")
+        else:
+            cur.execute(f"ALTER TABLE glucose_readings DETACH PARTITION {name};")
+            cur.execute(f"ALTER TABLE {name} RENAME TO {name.replace('glucose_readings_p', 'glucose_readings_archive_p')};")
+        with _PARTITION_LOCK:
+            _known_partitions.discard(name)
+    return expired
+
+
+def maintain_glucose_partitions() -> dict:
+    """Creates the partitions up to AURA_GLUCOSE_PARTITIONS_AHEAD months ahead and applies the retention policy"""
+    now = datetime.now(timezone.utc)
+    with db_cursor() as cur:
+        if not glucose_readings_partitioned(cur):
+            print("[Database] glucose_readings is not partitioned; run `python database.py partition` to migrate it.")
+            return {"partitioned": False}
+        created = ensure_glucose_partitions(cur, now, _add_months(_month_start(now), GLUCOSE_PARTITIONS_AHEAD))
+        expired = apply_glucose_retention(cur)
+        partitions = [name for _, name in _list_glucose_partitions(cur)]
+    if created or expired:
+        action = "dropped" if GLUCOSE_RETENTION_ACTION == "drop" else "detached"
+        print(f"[Database] Glucose partitions: created {created or 'none'}, {action} {expired or 'none'}.")
+    return {"partitioned": True, "created": created, "expired": expired, "partitions": partitions,
+            "retention_months": GLUCOSE_RETENTION_MONTHS, "retention_action": GLUCOSE_RETENTION_ACTION}
+
+
+def _partition_maintenance_loop():
+    while True:
+        try:
+            maintain_glucose_partitions()
+        except Exception as e:
+            print(f"[Database] Glucose partition maintenance failed: {e}")
+        time.sleep(PARTITION_MAINTENANCE_INTERVAL_S)
+
+
+def start_glucose_partition_maintenance():
+    """Runs maintain_glucose_partitions now and then every AURA_GLUCOSE_PARTITION_MAINTENANCE_H hours"""
+    threading.Thread(target=_partition_maintenance_loop, name="aura-glucose-partitions", daemon=True).start()
+
+
+def partition_glucose_readings():
+    """
+    One-off migration of an existing, unpartitioned glucose_readings: the table
+    is renamed to glucose_readings_unpartitioned, recreated partitioned and its
+    rows copied over (duplicates of a (user, timestamp) collapsed). The old
+    table is kept until you drop it.
+    """
+    with db_cursor() as cur:
+        if glucose_readings_partitioned(cur):
+            print("[Database] glucose_readings is already partitioned.")
+            return
+        cur.execute("LOCK TABLE glucose_readings IN EXCLUSIVE MODE;")  # Readers carry on, writers wait
+        cur.execute("ALTER TABLE glucose_readings RENAME TO glucose_readings_unpartitioned;")
+        cur.execute("ALTER INDEX IF EXISTS idx_glucose_user_time RENAME TO idx_glucose_unpartitioned_user_time;")
+        cur.execute("ALTER INDEX IF EXISTS idx_glucose_timestamp RENAME TO idx_glucose_unpartitioned_timestamp;")
+        _create_glucose_readings_table(cur)
+        cur.execute("SELECT MIN(timestamp), MAX(timestamp), COALESCE(MAX(id), 0) FROM glucose_readings_unpartitioned;")
+        first, last, max_id = cur.fetchone()
+        now = datetime.now(timezone.utc)
+        ensure_glucose_partitions(cur, min(first or now, now), _add_months(_month_start(max(last or now, now)),
+                                                                           GLUCOSE_PARTITIONS_AHEAD))
+        cutoff = _retention_cutoff()
         cur.execute("""
-            CREATE TABLE meal_logs (
-                id SERIAL PRIMARY KEY,
+            INSERT INTO glucose_readings (id, user_id, timestamp, glucose_value)
+            SELECT DISTINCT ON (user_id, timestamp) id, user_id, timestamp, glucose_value
+            FROM glucose_readings_unpartitioned
+            WHERE timestamp >= %s
+            ORDER BY user_id, timestamp, id DESC;
+        """, (cutoff or datetime.min.replace(tzinfo=timezone.utc),))
+        copied = cur.rowcount
+        cur.execute("SELECT setval(pg_get_serial_sequence('glucose_readings', 'id'), %s, true);", (max(max_id, 1),))
+    print(f"[Database] Copied {copied} readings into the partitioned glucose_readings. "
+          "Drop glucose_readings_unpartitioned once you have checked it.")
+
+
+# ==================================================================
+# === GLUCOSE ROLLUPS ==============================================
+# ==================================================================
+# Per-user hourly and daily aggregates of glucose_readings: count, sum, sum of
+# squares, min, max, time-in-range bucket counts and a fixed-bin histogram.
+# Every column merges by addition (min/max by LEAST/GREATEST), so ingest folds
+# each batch in with an upsert, and any window's mean, SD, TIR and percentiles
+# come from a few hundred rollup rows instead of every reading. Rollups aren't
+# touched by partition retention: long-term summaries outlive the raw readings.
+
+ROLLUP_HIST_MIN = 40  # mg/dL; the first bin also holds everything below
+ROLLUP_HIST_WIDTH = 10
+ROLLUP_HIST_BINS = 36  # 40-400 mg/dL; the last bin also holds everything above
+_ROLLUP_GRAINS = {"hourly": "hour", "daily": "day"}
+_rollups_ready = False  # Set once the rollup tables are seen to exist
+
+
+def _create_glucose_rollup_tables(cur):
+    for grain in _ROLLUP_GRAINS:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS glucose_rollup_{grain} (
                 user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
-                meal_description TEXT,
-                carb_count REAL
+                bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+                n INTEGER NOT NULL,
+                total DOUBLE PRECISION NOT NULL,
+                total_sq DOUBLE PRECISION NOT NULL,
+                min_value REAL NOT NULL,
+                max_value REAL NOT NULL,
+                very_low INTEGER NOT NULL,
+                low INTEGER NOT NULL,
+                in_range INTEGER NOT NULL,
+                high INTEGER NOT NULL,
+                very_high INTEGER NOT NULL,
+                hist INTEGER[] NOT NULL,
+                PRIMARY KEY (user_id, bucket)
             );
         """)
-        cur.execute("CREATE INDEX idx_meal_user_time ON meal_logs(user_id, timestamp DESC);")
-        print("Created 'meal_logs' table with index.")
+
+
+def glucose_rollups_ready(cur) -> bool:
+    global _rollups_ready
+    if not _rollups_ready:
+        cur.execute("SELECT to_regclass('glucose_rollup_daily') IS NOT NULL;")
+        _rollups_ready = bool(cur.fetchone()[0])
+    return _rollups_ready
+
+
+def _rollup_upsert_ctes(source: str) -> str:
+    """
+    CTEs folding the (user_id, timestamp, glucose_value) rows of `source` into
+    both rollup tables. Append them to a WITH clause that defines `source`.
+    """
+    bin_expr = (f"LEAST(GREATEST(FLOOR((glucose_value - {ROLLUP_HIST_MIN}) / {ROLLUP_HIST_WIDTH})::int, 0), "
+                f"{ROLLUP_HIST_BINS - 1})")
+    ctes = []
+    for grain, unit in _ROLLUP_GRAINS.items():
+        ctes.append(f"""
+        {grain}_bins AS (
+            SELECT user_id, date_trunc('{unit}', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS bucket,
+                   {bin_expr} AS bin,
+                   COUNT(*) AS n, SUM(glucose_value::float8) AS total, SUM(glucose_value::float8 ^ 2) AS total_sq,
+                   MIN(glucose_value) AS min_value, MAX(glucose_value) AS max_value,
+                   COUNT(*) FILTER (WHERE glucose_value < 54) AS very_low,
+                   COUNT(*) FILTER (WHERE glucose_value >= 54 AND glucose_value < 70) AS low,
+                   COUNT(*) FILTER (WHERE glucose_value >= 70 AND glucose_value <= 180) AS in_range,
+                   COUNT(*) FILTER (WHERE glucose_value > 180 AND glucose_value <= 250) AS high,
+                   COUNT(*) FILTER (WHERE glucose_value > 250) AS very_high
+            FROM {source}
+            GROUP BY 1, 2, 3
+        ),
+        {grain}_rows AS (
+            SELECT user_id, bucket, SUM(n) AS n, SUM(total) AS total, SUM(total_sq) AS total_sq,
+                   MIN(min_value) AS min_value, MAX(max_value) AS max_value, SUM(very_low) AS very_low,
+                   SUM(low) AS low, SUM(in_range) AS in_range, SUM(high) AS high, SUM(very_high) AS very_high,
+                   jsonb_object_agg(bin, n) AS bins
+            FROM {grain}_bins
+            GROUP BY 1, 2
+        ),
+        {grain}_upsert AS (
+            INSERT INTO glucose_rollup_{grain} AS r
+                (user_id, bucket, n, total, total_sq, min_value, max_value,
+                 very_low, low, in_range, high, very_high, hist)
+            SELECT user_id, bucket, n, total, total_sq, min_value, max_value,
+                   very_low, low, in_range, high, very_high,
+                   ARRAY(SELECT COALESCE((bins ->> i::text)::int, 0)
+                         FROM generate_series(0, {ROLLUP_HIST_BINS - 1}) AS i ORDER BY i)
+            FROM {grain}_rows
+            ON CONFLICT (user_id, bucket) DO UPDATE SET
+                n = r.n + EXCLUDED.n,
+                total = r.total + EXCLUDED.total,
+                total_sq = r.total_sq + EXCLUDED.total_sq,
+                min_value = LEAST(r.min_value, EXCLUDED.min_value),
+                max_value = GREATEST(r.max_value, EXCLUDED.max_value),
+                very_low = r.very_low + EXCLUDED.very_low,
+                low = r.low + EXCLUDED.low,
+                in_range = r.in_range + EXCLUDED.in_range,
+                high = r.high + EXCLUDED.high,
+                very_high = r.very_high + EXCLUDED.very_high,
+                hist = ARRAY(SELECT a + b FROM unnest(r.hist, EXCLUDED.hist) WITH ORDINALITY AS t(a, b, i)
+                             ORDER BY i)
+            RETURNING 1
+        )""")
+    return ",".join(ctes)
+
+
+def rebuild_glucose_rollups(user_id: int = None) -> dict:
+    """
+    Recomputes the rollups from glucose_readings for one user (or everyone).
+    Only days that still have raw readings are rebuilt, so rollups of days
+    removed by retention are kept.
+    """
+    with db_cursor() as cur:
+        _create_glucose_rollup_tables(cur)
+        params = {"user_id": user_id}
+        user_filter = "user_id = %(user_id)s" if user_id is not None else "TRUE"
+        cur.execute(f"SELECT MIN(timestamp) FROM glucose_readings WHERE {user_filter};", params)
+        first = cur.fetchone()[0]
+        if first is None:
+            return {"readings": 0, "hourly_rows": 0, "daily_rows": 0}
+        params["start"] = _day_start(first)
+        for grain in _ROLLUP_GRAINS:
+            cur.execute(f"DELETE FROM glucose_rollup_{grain} WHERE {user_filter} AND bucket >= %(start)s;", params)
+        cur.execute(f"""
+            WITH source AS (
+                SELECT user_id, timestamp, glucose_value FROM glucose_readings
+                WHERE {user_filter} AND timestamp >= %(start)s
+            ),{_rollup_upsert_ctes("source")}
+            SELECT (SELECT COUNT(*) FROM source), (SELECT COUNT(*) FROM hourly_upsert),
+                   (SELECT COUNT(*) FROM daily_upsert);
+        """, params)
+        readings, hourly_rows, daily_rows = cur.fetchone()
+    print(f"[Database] Rebuilt glucose rollups from {readings} readings "
+          f"({hourly_rows} hourly, {daily_rows} daily rows).")
+    return {"readings": readings, "hourly_rows": hourly_rows, "daily_rows": daily_rows}
+
+
+def ensure_glucose_rollups():
+    """Creates the rollup tables on a database that predates them, and fills them from the readings"""
+    with db_cursor() as cur:
+        if glucose_rollups_ready(cur):
+            return
+    rebuild_glucose_rollups()
+
+
+def init_db():
+    """Initializes the database by creating all necessary tables with optimized indexes."""
+    try:
+        with db_cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS meal_logs CASCADE;")
+            cur.execute("DROP TABLE IF EXISTS insulin_doses CASCADE;")
+            cur.execute("DROP TABLE IF EXISTS glucose_readings CASCADE;")
+            cur.execute("DROP TABLE IF EXISTS glucose_rollup_hourly CASCADE;")
+            cur.execute("DROP TABLE IF EXISTS glucose_rollup_daily CASCADE;")
+            cur.execute("DROP TABLE IF EXISTS activity_logs CASCADE;")
+            cur.execute("DROP TABLE IF EXISTS users CASCADE;")
+            print("Dropped existing tables.")
+
+            cur.execute("""
+                CREATE TABLE users (
+                    id SERIAL PRIMARY KEY,
+                    username VARCHAR(80) UNIQUE NOT NULL, 
+                    password_hash VARCHAR(256) NOT NULL,
+                    name VARCHAR(100) NOT NULL,
+                    age INTEGER,
+                    gender VARCHAR(50),
+                    phone_number VARCHAR(20),
+                    weight_kg REAL,
+                    height_cm REAL,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            print("Created UPGRADED 'users' table.")
+
+            _create_glucose_readings_table(cur)
+            now = datetime.now(timezone.utc)
+            ensure_glucose_partitions(cur, now, _add_months(_month_start(now), GLUCOSE_PARTITIONS_AHEAD))
+            print("Created 'glucose_readings' table, partitioned by month.")
+            _create_glucose_rollup_tables(cur)
+            print("Created hourly and daily glucose rollup tables.")
+
+            cur.execute("""
+                CREATE TABLE insulin_doses (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+                    dose_amount REAL NOT NULL,
+                    dose_type VARCHAR(50)
+                );
+            """)
+            cur.execute("CREATE INDEX idx_insulin_user_time ON insulin_doses(user_id, timestamp DESC);")
+            print("Created 'insulin_doses' table with index.")
+
+            cur.execute("""
+                CREATE TABLE meal_logs (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+                    meal_description TEXT,
+                    carb_count REAL
+                );
+            """)
+            cur.execute("CREATE INDEX idx_meal_user_time ON meal_logs(user_id, timestamp DESC);")
+            print("Created 'meal_logs' table with index.")
         
-        # === NEW: Activity logs table ===
-        cur.execute("""
-            CREATE TABLE activity_logs (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
-                activity_type VARCHAR(100),
-                duration_minutes INTEGER,
-                intensity VARCHAR(50),
-                notes TEXT
-            );
-        """)
-        cur.execute("CREATE INDEX idx_activity_user_time ON activity_logs(user_id, timestamp DESC);")
-        print("Created 'activity_logs' table with index.")
+            # === NEW: Activity logs table ===
+            cur.execute("""
+                CREATE TABLE activity_logs (
+                    id SERIAL PRIMARY KEY,
+                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+                    activity_type VARCHAR(100),
+                    duration_minutes INTEGER,
+                    intensity VARCHAR(50),
+                    notes TEXT
+                );
+            """)
+            cur.execute("CREATE INDEX idx_activity_user_time ON activity_logs(user_id, timestamp DESC);")
+            print("Created 'activity_logs' table with index.")
 
-        conn.commit()
+        # Committed when the db_cursor block exits
         print("Database initialized successfully with optimized indexes!")
 
     except Exception as e:
+        # db_cursor already rolled the transaction back
         print(f"An error occurred: {e}")
-        if conn: conn.rollback()
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 
 # ==================================================================
@@ -127,27 +732,20 @@ def get_glucose_readings_with_timestamps(user_id: int, days: int = 7, hours: int
         days: Number of days of data (default 7)
         hours: If specified, overrides days and gets last N hours
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    if hours:
-        interval = f"{hours} hours"
-    else:
-        interval = f"{days} days"
+    since = _utc_ago(hours=hours) if hours else _utc_ago(days=days)
     
     # Optimized query with index hint ordering
-    cur.execute(
-        """
-        SELECT timestamp, glucose_value 
-        FROM glucose_readings
-        WHERE user_id = %s AND timestamp >= NOW() - INTERVAL %s
-        ORDER BY timestamp ASC;
-        """,
-        (user_id, interval)
-    )
-    readings = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute(
+            """
+            SELECT timestamp, glucose_value 
+            FROM glucose_readings
+            WHERE user_id = %s AND timestamp >= %s
+            ORDER BY timestamp ASC;
+            """,
+            (user_id, since)
+        )
+        readings = cur.fetchall()
     
     # Convert to serializable format
     return [
@@ -159,25 +757,115 @@ def get_glucose_readings_with_timestamps(user_id: int, days: int = 7, hours: int
     ]
 
 
+class GlucoseFrame:
+    """
+    A user's glucose readings as columns (NumPy arrays), oldest first:
+
+        epoch          float64  Unix seconds
+        minute_of_day  int16    0-1439, wall clock of the database session's time
+                                zone (what the ISO strings of
+                                get_glucose_readings_with_timestamps carry)
+        weekday        int8     0 = Monday
+        glucose        float32  mg/dL
+
+    The analytics' *_frame entry points take this instead of a list of dicts,
+    so no timestamp is formatted or parsed on the way.
+    """
+    __slots__ = ("epoch", "minute_of_day", "weekday", "glucose")
+
+    def __init__(self, epoch: np.ndarray, minute_of_day: np.ndarray, weekday: np.ndarray, glucose: np.ndarray):
+        self.epoch = epoch
+        self.minute_of_day = minute_of_day
+        self.weekday = weekday
+        self.glucose = glucose
+
+    def __len__(self) -> int:
+        return len(self.glucose)
+
+    @property
+    def hour(self) -> np.ndarray:
+        return self.minute_of_day // 60
+
+
+def get_glucose_frame(user_id: int, days: int = 7, hours: int = None) -> GlucoseFrame:
+    """
+    Same window as get_glucose_readings_with_timestamps, as a GlucoseFrame.
+    Epoch, minute of day and weekday are computed by PostgreSQL and the rows
+    streamed from a server-side cursor in GLUCOSE_FRAME_FETCH_ROWS chunks, each
+    turned into arrays right away.
+    """
+    since = _utc_ago(hours=hours) if hours else _utc_ago(days=days)
+    chunks = []
+    with db_cursor(name="glucose_frame") as cur:
+        cur.itersize = GLUCOSE_FRAME_FETCH_ROWS
+        cur.execute(
+            """
+            SELECT EXTRACT(EPOCH FROM timestamp)::float8,
+                   (EXTRACT(HOUR FROM timestamp) * 60 + EXTRACT(MINUTE FROM timestamp))::int2,
+                   (EXTRACT(ISODOW FROM timestamp) - 1)::int2,
+                   glucose_value
+            FROM glucose_readings
+            WHERE user_id = %s AND timestamp >= %s
+            ORDER BY timestamp ASC;
+            """,
+            (user_id, since)
+        )
+        while True:
+            rows = cur.fetchmany(GLUCOSE_FRAME_FETCH_ROWS)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.float64))
+    data = np.concatenate(chunks) if chunks else np.empty((0, 4))
+    return GlucoseFrame(
+        epoch=data[:, 0],
+        minute_of_day=data[:, 1].astype(np.int16),
+        weekday=data[:, 2].astype(np.int8),
+        glucose=data[:, 3].astype(np.float32)
+    )
+
+
+def get_analytics_data_version(user_id: int, days: int = 7) -> dict:
+    """
+    What the analytics over the last `days` are computed from, in one cheap indexed
+    query: count, first and last glucose timestamps and the meal count and last
+    timestamp in the window. Any new, deleted or aged-out row changes it, so it
+    keys analytics results that stay valid exactly as long as their data does.
+    """
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute(
+            """
+            SELECT g.readings, g.first_reading, g.last_reading, m.meals, m.last_meal
+            FROM (
+                SELECT COUNT(*) AS readings, MIN(timestamp) AS first_reading, MAX(timestamp) AS last_reading
+                FROM glucose_readings
+                WHERE user_id = %(user_id)s AND timestamp >= %(since)s
+            ) AS g, (
+                SELECT COUNT(*) AS meals, MAX(timestamp) AS last_meal
+                FROM meal_logs
+                WHERE user_id = %(user_id)s AND timestamp >= %(since)s
+            ) AS m;
+            """,
+            {"user_id": user_id, "since": _utc_ago(days=days)}
+        )
+        version = cur.fetchone()
+    return dict(version)
+
+
 def get_meal_logs_for_analytics(user_id: int, days: int = 7) -> list:
     """
     Get meal logs with timestamps for meal impact analysis.
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute(
-        """
-        SELECT timestamp, meal_description, carb_count
-        FROM meal_logs
-        WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '%s days'
-        ORDER BY timestamp ASC;
-        """,
-        (user_id, days)
-    )
-    logs = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute(
+            """
+            SELECT timestamp, meal_description, carb_count
+            FROM meal_logs
+            WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '%s days'
+            ORDER BY timestamp ASC;
+            """,
+            (user_id, days)
+        )
+        logs = cur.fetchall()
     
     return [
         {
@@ -193,26 +881,21 @@ def get_activity_logs(user_id: int, days: int = 7) -> list:
     """
     Get activity logs for analytics.
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
     try:
-        cur.execute(
-            """
-            SELECT timestamp, activity_type, duration_minutes, intensity, notes
-            FROM activity_logs
-            WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '%s days'
-            ORDER BY timestamp DESC;
-            """,
-            (user_id, days)
-        )
-        logs = cur.fetchall()
+        with db_cursor(dict_rows=True) as cur:
+            cur.execute(
+                """
+                SELECT timestamp, activity_type, duration_minutes, intensity, notes
+                FROM activity_logs
+                WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '%s days'
+                ORDER BY timestamp DESC;
+                """,
+                (user_id, days)
+            )
+            logs = cur.fetchall()
     except Exception:
         # Table might not exist in older schemas
         logs = []
-    finally:
-        cur.close()
-        conn.close()
     
     return [
         {
@@ -228,275 +911,544 @@ def get_activity_logs(user_id: int, days: int = 7) -> list:
 
 def add_activity_log(user_id: int, activity_type: str, duration_minutes: int, intensity: str = None, notes: str = None):
     """Add an activity log entry."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     try:
-        cur.execute(
-            """
-            INSERT INTO activity_logs (user_id, timestamp, activity_type, duration_minutes, intensity, notes)
-            VALUES (%s, NOW(), %s, %s, %s, %s)
-            """,
-            (user_id, activity_type, duration_minutes, intensity, notes)
-        )
-        conn.commit()
+        with db_cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO activity_logs (user_id, timestamp, activity_type, duration_minutes, intensity, notes)
+                VALUES (%s, NOW(), %s, %s, %s, %s)
+                """,
+                (user_id, activity_type, duration_minutes, intensity, notes)
+            )
         print(f"[Database] Activity logged for user {user_id}: {activity_type}")
     except Exception as e:
         print(f"[Database] Error logging activity: {e}")
-        conn.rollback()
-    finally:
-        cur.close()
-        conn.close()
+
+
+def histogram_percentile(hist: list, q: float, min_value: float, max_value: float) -> float:
+    """
+    q-th percentile (0-100) estimated from a rollup histogram, interpolating
+    linearly inside the bin it falls in. The open-ended first and last bins are
+    bounded by the observed min and max.
+    """
+    total = sum(hist)
+    if not total:
+        return None
+    rank = q / 100 * total
+    seen = 0
+    for i, count in enumerate(hist):
+        if count and seen + count >= rank:
+            low = ROLLUP_HIST_MIN + i * ROLLUP_HIST_WIDTH
+            high = low + ROLLUP_HIST_WIDTH
+            low = min_value if i == 0 else max(low, min_value)
+            high = max_value if i == len(hist) - 1 else min(high, max_value)
+            return low + (high - low) * (rank - seen) / count
+        seen += count
+    return max_value
+
+
+def _merge_hists(hists) -> list:
+    merged = [0] * ROLLUP_HIST_BINS
+    for hist in hists:
+        merged = [a + b for a, b in zip(merged, hist)]
+    return merged
+
+
+def _rollup_stats(n: int, total: float, total_sq: float) -> tuple:
+    """(mean, population SD, sample SD) from the summed columns"""
+    mean = total / n
+    variance = max(total_sq / n - mean * mean, 0.0)
+    sample_sd = math.sqrt(variance * n / (n - 1)) if n > 1 else None
+    return mean, math.sqrt(variance), sample_sd
 
 
 def get_glucose_stats_by_hour(user_id: int, days: int = 7) -> dict:
     """
     Get aggregated glucose statistics by hour of day.
     Useful for pattern analysis and AGP.
+    Read from the hourly rollups (at most 24 rows a day); the median is estimated from their histograms.
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute(
-        """
-        SELECT 
-            EXTRACT(HOUR FROM timestamp) as hour,
-            AVG(glucose_value) as avg_glucose,
-            MIN(glucose_value) as min_glucose,
-            MAX(glucose_value) as max_glucose,
-            STDDEV(glucose_value) as std_glucose,
-            COUNT(*) as reading_count,
-            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY glucose_value) as median_glucose
-        FROM glucose_readings
-        WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '%s days'
-        GROUP BY EXTRACT(HOUR FROM timestamp)
-        ORDER BY hour;
-        """,
-        (user_id, days)
-    )
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute(
+            """
+            SELECT 
+                EXTRACT(HOUR FROM bucket) as hour,
+                SUM(n) as n, SUM(total) as total, SUM(total_sq) as total_sq,
+                MIN(min_value) as min_glucose,
+                MAX(max_value) as max_glucose,
+                array_agg(hist) as hists
+            FROM glucose_rollup_hourly
+            WHERE user_id = %s AND bucket >= date_trunc('hour', %s::timestamptz)
+            GROUP BY EXTRACT(HOUR FROM bucket)
+            ORDER BY hour;
+            """,
+            (user_id, _utc_ago(days=days))
+        )
+        results = cur.fetchall()
     
-    # Convert to dictionary keyed by hour
-    return {int(r['hour']): {
-        'avg': round(r['avg_glucose'], 1) if r['avg_glucose'] else None,
-        'min': round(r['min_glucose'], 1) if r['min_glucose'] else None,
-        'max': round(r['max_glucose'], 1) if r['max_glucose'] else None,
-        'std': round(r['std_glucose'], 1) if r['std_glucose'] else None,
-        'median': round(r['median_glucose'], 1) if r['median_glucose'] else None,
-        'count': r['reading_count']
-    } for r in results}
+    stats = {}
+    for r in results:
+        mean, _, sample_sd = _rollup_stats(int(r['n']), r['total'], r['total_sq'])
+        median = histogram_percentile(_merge_hists(r['hists']), 50, r['min_glucose'], r['max_glucose'])
+        stats[int(r['hour'])] = {
+            'avg': round(mean, 1),
+            'min': round(r['min_glucose'], 1),
+            'max': round(r['max_glucose'], 1),
+            'std': round(sample_sd, 1) if sample_sd else None,
+            'median': round(median, 1),
+            'count': int(r['n'])
+        }
+    return stats
 
 
 def get_glucose_stats_by_day_and_hour(user_id: int, days: int = 7) -> list:
     """
     Get aggregated glucose statistics by day of week and hour.
-    Used for generating heatmap data.
+    Used for generating heatmap data. Read from the hourly rollups.
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cur.execute(
-        """
-        SELECT 
-            EXTRACT(DOW FROM timestamp) as day_of_week,
-            EXTRACT(HOUR FROM timestamp) as hour,
-            AVG(glucose_value) as avg_glucose,
-            COUNT(*) as reading_count
-        FROM glucose_readings
-        WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '%s days'
-        GROUP BY EXTRACT(DOW FROM timestamp), EXTRACT(HOUR FROM timestamp)
-        ORDER BY day_of_week, hour;
-        """,
-        (user_id, days)
-    )
-    results = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute(
+            """
+            SELECT 
+                EXTRACT(DOW FROM bucket) as day_of_week,
+                EXTRACT(HOUR FROM bucket) as hour,
+                SUM(total) / SUM(n) as avg_glucose,
+                SUM(n) as reading_count
+            FROM glucose_rollup_hourly
+            WHERE user_id = %s AND bucket >= date_trunc('hour', %s::timestamptz)
+            GROUP BY EXTRACT(DOW FROM bucket), EXTRACT(HOUR FROM bucket)
+            ORDER BY day_of_week, hour;
+            """,
+            (user_id, _utc_ago(days=days))
+        )
+        results = cur.fetchall()
     
     return [
         {
             'day_of_week': int(r['day_of_week']),
             'hour': int(r['hour']),
             'avg_glucose': round(r['avg_glucose'], 1) if r['avg_glucose'] else None,
-            'count': r['reading_count']
+            'count': int(r['reading_count'])
         }
         for r in results
     ]
 
 
-def calculate_health_score(user_id: int) -> dict:
+def get_rollup_data_version(user_id: int, days: int = 90) -> dict:
+    """Like get_analytics_data_version, for results computed from the rollups"""
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute(
+            """
+            SELECT COUNT(*) AS days, COALESCE(SUM(n), 0) AS readings, MIN(bucket) AS first_day,
+                   MAX(bucket) AS last_day, MAX(max_value) AS max_value, MIN(min_value) AS min_value
+            FROM glucose_rollup_daily
+            WHERE user_id = %s AND bucket >= %s;
+            """,
+            (user_id, _day_start(_utc_ago(days=days - 1)))
+        )
+        return dict(cur.fetchone())
+
+
+def get_glucose_rollup_summary(user_id: int, days: int = 90) -> dict:
     """
-    Calculates a daily 'Health Score' based on glucose data.
-    First tries last 24 hours, then falls back to last 7 days, then all available data.
+    Summary of the last `days` whole UTC days from the daily rollups (one row
+    per day with data): reading count, mean, SD, min/max, time-in-range bucket
+    counts and histogram percentiles. None when there are no readings.
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # Try last 24 hours first
-    cur.execute(
-        """
-        SELECT glucose_value FROM glucose_readings
-        WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '24 hours';
-        """,
-        (user_id,)
-    )
-    readings = cur.fetchall()
-    
-    # If not enough, try last 7 days
-    if not readings or len(readings) < 5:
+    with db_cursor(dict_rows=True) as cur:
         cur.execute(
             """
-            SELECT glucose_value FROM glucose_readings
-            WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '7 days';
+            SELECT bucket, n, total, total_sq, min_value, max_value,
+                   very_low, low, in_range, high, very_high, hist
+            FROM glucose_rollup_daily
+            WHERE user_id = %s AND bucket >= %s
+            ORDER BY bucket;
             """,
-            (user_id,)
+            (user_id, _day_start(_utc_ago(days=days - 1)))
         )
-        readings = cur.fetchall()
-    
-    # If still not enough, get all readings
-    if not readings or len(readings) < 5:
+        rows = cur.fetchall()
+    if not rows:
+        return None
+
+    n = sum(r['n'] for r in rows)
+    min_value = min(r['min_value'] for r in rows)
+    max_value = max(r['max_value'] for r in rows)
+    mean, sd, _ = _rollup_stats(n, sum(r['total'] for r in rows), sum(r['total_sq'] for r in rows))
+    hist = _merge_hists(r['hist'] for r in rows)
+    return {
+        "readings": n,
+        "mean": mean,
+        "sd": sd,
+        "min": min_value,
+        "max": max_value,
+        "range_counts": {key: sum(r[key] for r in rows) for key in ("very_low", "low", "in_range", "high", "very_high")},
+        "percentiles": {f"p{q}": histogram_percentile(hist, q, min_value, max_value) for q in (5, 25, 50, 75, 95)},
+        "days_with_data": len(rows),
+        "first_day": rows[0]['bucket'],
+        "last_day": rows[-1]['bucket']
+    }
+
+
+def calculate_health_score(user_id: int) -> dict:
+    """
+    Calculates a daily 'Health Score' based on glucose data.
+    First tries last 24 hours, then falls back to last 7 days, then all available data.
+    """
+    with db_cursor(dict_rows=True) as cur:
+        # Try last 24 hours first
         cur.execute(
             """
             SELECT glucose_value FROM glucose_readings
-            WHERE user_id = %s ORDER BY timestamp DESC LIMIT 100;
+            WHERE user_id = %s AND timestamp >= %s;
             """,
-            (user_id,)
+            (user_id, _utc_ago(hours=24))
         )
         readings = cur.fetchall()
-    
-    cur.close()
-    conn.close()
-    
-    if not readings or len(readings) < 3:  # Require at least 3 readings
-        return { "score": 0, "time_in_range_percent": 0, "hypo_events_count": 0, "message": "Not enough glucose data to calculate score." }
         
-    values = [r['glucose_value'] for r in readings]
-    total_readings = len(values)
+        # If not enough, try last 7 days
+        if not readings or len(readings) < 5:
+            cur.execute(
+                """
+                SELECT glucose_value FROM glucose_readings
+                WHERE user_id = %s AND timestamp >= %s;
+                """,
+                (user_id, _utc_ago(days=7))
+            )
+            readings = cur.fetchall()
+        
+        # If still not enough, get all readings
+        if not readings or len(readings) < 5:
+            cur.execute(
+                """
+                SELECT glucose_value FROM glucose_readings
+                WHERE user_id = %s ORDER BY timestamp DESC LIMIT 100;
+                """,
+                (user_id,)
+            )
+            readings = cur.fetchall()
     
+    values = [r['glucose_value'] for r in readings]
+    return _health_score_from_counts(
+        total=len(values),
+        in_range=sum(1 for v in values if 70 <= v <= 180),
+        hypo=sum(1 for v in values if v < 70),
+        severe_hypo=sum(1 for v in values if v < 54),
+        very_high=sum(1 for v in values if v > 250)
+    )
+
+
+def _health_score_from_counts(total: int, in_range: int, hypo: int, severe_hypo: int, very_high: int) -> dict:
+    """
+    The Health Score from reading counts: total, in range (70-180), hypo (< 70),
+    severe hypo (< 54) and very high (> 250). Shared by calculate_health_score
+    and the single-query dashboard, which counts in SQL.
+    """
+    if not total or total < 3:  # Require at least 3 readings
+        return { "score": 0, "time_in_range_percent": 0, "hypo_events_count": 0, "message": "Not enough glucose data to calculate score." }
+
     # Scoring Logic - Based on percentages, not raw counts
     score = 100.0
-    in_range_count = sum(1 for v in values if 70 <= v <= 180)
-    time_in_range_percent = (in_range_count / total_readings) * 100
-    
+    time_in_range_percent = (in_range / total) * 100
+
     # Main scoring: Time in range is the primary factor (max 50 points penalty)
     score -= (100 - time_in_range_percent) * 0.5
-    
+
     # Hypo penalty based on percentage (max ~25 points penalty)
-    hypo_events = sum(1 for v in values if v < 70)
-    hypo_percent = (hypo_events / total_readings) * 100
+    hypo_percent = (hypo / total) * 100
     score -= hypo_percent * 0.5  # 0.5 points per percent of readings that are hypo
-    
+
     # Severe hypo penalty (< 54 mg/dL) - additional penalty
-    severe_hypo = sum(1 for v in values if v < 54)
-    severe_hypo_percent = (severe_hypo / total_readings) * 100
+    severe_hypo_percent = (severe_hypo / total) * 100
     score -= severe_hypo_percent * 0.3  # Additional penalty for severe hypos
-    
+
     # Very high penalty based on percentage
-    very_high_events = sum(1 for v in values if v > 250)
-    very_high_percent = (very_high_events / total_readings) * 100
+    very_high_percent = (very_high / total) * 100
     score -= very_high_percent * 0.2  # Smaller penalty for very highs
-    
+
     final_score = max(0, min(100, int(round(score))))  # Clamp between 0-100
-    
+
     return {
         "score": final_score,
         "time_in_range_percent": round(time_in_range_percent, 1),
-        "hypo_events_count": hypo_events,
+        "hypo_events_count": hypo,
     }
+
+
 def find_user_by_username(username: str):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT * FROM users WHERE username = %s;", (username,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute("SELECT * FROM users WHERE username = %s;", (username,))
+        user = cur.fetchone()
     return user
 
 def get_recent_glucose_readings(user_id: int, limit: int = 100):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute("SELECT glucose_value FROM glucose_readings WHERE user_id = %s ORDER BY timestamp DESC LIMIT %s;", (user_id, limit))
-    readings = cur.fetchall()
-    cur.close()
-    conn.close()
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute("SELECT glucose_value FROM glucose_readings WHERE user_id = %s ORDER BY timestamp DESC LIMIT %s;", (user_id, limit))
+        readings = cur.fetchall()
     if not readings: return []
     return [r['glucose_value'] for r in reversed(readings)]
 
-def get_dashboard_data_for_user(user_id: int):
+
+def iter_glucose_history(user_id: int, since: datetime = None, with_timestamps: bool = False,
+                         chunk_rows: int = GLUCOSE_HISTORY_CHUNK_ROWS):
     """
-    Fetches all necessary data for the user's dashboard,
-    now INCLUDING the Health Score.
+    A user's complete glucose history (or the part from `since`), oldest first,
+    as contiguous float32 arrays of up to chunk_rows values. with_timestamps=True
+    yields (epoch seconds as float64, glucose as float32) pairs instead.
+    Each chunk is its own short query, paged by timestamp (keyset) on the
+    (user_id, timestamp) index, and the connection goes back to the pool before
+    the chunk is yielded. However slowly the consumer (a training run, an HTTP
+    download) works, it holds no connection, transaction or table lock.
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # --- Part 1: Fetch core data (your existing code is perfect) ---
-    
-    # Fetch user profile info
-    cur.execute("SELECT name, age, weight_kg, height_cm FROM users WHERE id = %s;", (user_id,))
-    user_profile = cur.fetchone()
-
-    # Fetch glucose readings for the chart
-    cur.execute(
-        """
-        SELECT timestamp, glucose_value FROM glucose_readings 
-        WHERE user_id = %s AND timestamp > NOW() - INTERVAL '24 hours' 
-        ORDER BY timestamp ASC;
-        """, 
-        (user_id,)
+    # Integer microseconds: exact, so the next page starts right after the last row
+    after = since - timedelta(microseconds=1) if since is not None else datetime.min.replace(tzinfo=timezone.utc)
+    while True:
+        with db_cursor() as cur:
+            cur.execute(
+                """
+                SELECT (EXTRACT(EPOCH FROM timestamp) * 1000000)::int8, glucose_value
+                FROM glucose_readings
+                WHERE user_id = %s AND timestamp > %s
+                ORDER BY timestamp ASC
+                LIMIT %s;
+                """,
+                (user_id, after, chunk_rows)
+            )
+            rows = cur.fetchall()
+        if not rows:
+            return
+        epoch_us = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        glucose = np.fromiter((row[1] for row in rows), dtype=np.float32, count=len(rows))
+        after = _EPOCH + timedelta(microseconds=int(epoch_us[-1]))
+        yield (epoch_us / 1e6, glucose) if with_timestamps else glucose
+        if len(rows) < chunk_rows:
+            return
+
+
+# Health Score counts over the readings of a window, one FILTER aggregate per bucket
+_HEALTH_SCORE_BUCKETS = (
+    ("total", "TRUE"),
+    ("in_range", "glucose_value BETWEEN 70 AND 180"),
+    ("hypo", "glucose_value < 70"),
+    ("severe_hypo", "glucose_value < 54"),
+    ("very_high", "glucose_value > 250"),
+)
+
+
+def _health_score_aggregates(prefix: str, window: str = "TRUE") -> str:
+    return ",\n".join(
+        f"COUNT(*) FILTER (WHERE {window} AND {condition}) AS {prefix}_{bucket}"
+        for bucket, condition in _HEALTH_SCORE_BUCKETS
     )
-    glucose_readings = cur.fetchall()
-    
-    # Fetch recent meals for the log
-    cur.execute(
-        """
-        SELECT timestamp, meal_description, carb_count FROM meal_logs 
-        WHERE user_id = %s AND timestamp > NOW() - INTERVAL '24 hours' 
-        ORDER BY timestamp DESC LIMIT 5;
-        """, 
-        (user_id,)
+
+
+# Everything the dashboard shows, in one round trip. The 24h, 7 day and last-100
+# Health Score windows are all counted so Python can apply calculate_health_score's
+# fallback order without going back to the database.
+_DASHBOARD_QUERY = f"""
+    WITH chart AS (
+        SELECT timestamp, glucose_value FROM glucose_readings
+        WHERE user_id = %(user_id)s AND timestamp > %(since_day)s
+    ),
+    meals AS (
+        SELECT timestamp, meal_description, carb_count FROM meal_logs
+        WHERE user_id = %(user_id)s AND timestamp > NOW() - INTERVAL '24 hours'
+        ORDER BY timestamp DESC LIMIT 5
+    ),
+    week_counts AS (
+        SELECT {_health_score_aggregates("day", "timestamp >= %(since_day)s")},
+               {_health_score_aggregates("week")}
+        FROM glucose_readings
+        WHERE user_id = %(user_id)s AND timestamp >= %(since_week)s
+    ),
+    latest_counts AS (
+        SELECT {_health_score_aggregates("latest")}
+        FROM (
+            SELECT glucose_value FROM glucose_readings
+            WHERE user_id = %(user_id)s ORDER BY timestamp DESC LIMIT 100
+        ) AS latest
     )
-    meal_logs = cur.fetchall()
-    
-    # --- Part 2: Clean up the database connection ---
-    cur.close()
-    conn.close()
-    
-    # --- Part 3: (THE NEW PART) Call the health score function ---
-    # We do this after closing the main connection to keep things clean.
-    # The calculate_health_score function opens and closes its own connection.
-    health_score_data = calculate_health_score(user_id)
-    
-    # --- Part 4: Assemble the complete response ---
-    # We now add the 'health_score' key to the dictionary we return.
+    SELECT
+        u.id IS NOT NULL AS user_found, u.name, u.age, u.weight_kg, u.height_cm,
+        (SELECT array_agg(timestamp ORDER BY timestamp) FROM chart) AS chart_timestamps,
+        (SELECT array_agg(glucose_value ORDER BY timestamp) FROM chart) AS chart_values,
+        (SELECT array_agg(timestamp ORDER BY timestamp DESC) FROM meals) AS meal_timestamps,
+        (SELECT array_agg(meal_description ORDER BY timestamp DESC) FROM meals) AS meal_descriptions,
+        (SELECT array_agg(carb_count ORDER BY timestamp DESC) FROM meals) AS meal_carbs,
+        week_counts.*, latest_counts.*
+    FROM (SELECT 1) AS one
+    LEFT JOIN users u ON u.id = %(user_id)s
+    CROSS JOIN week_counts
+    CROSS JOIN latest_counts;
+"""
+
+
+def _window_counts(row: dict, prefix: str) -> dict:
+    return {bucket: row[f"{prefix}_{bucket}"] for bucket, _ in _HEALTH_SCORE_BUCKETS}
+
+
+def get_dashboard_data_for_user(user_id: int):
+    """
+    Fetches all necessary data for the user's dashboard,
+    now INCLUDING the Health Score - all of it in a single query.
+    """
+    with db_cursor(dict_rows=True) as cur:
+        cur.execute(_DASHBOARD_QUERY, {"user_id": user_id, "since_day": _utc_ago(hours=24),
+                                       "since_week": _utc_ago(days=7)})
+        row = cur.fetchone()
+
+    user_profile = None
+    if row['user_found']:
+        user_profile = {key: row[key] for key in ('name', 'age', 'weight_kg', 'height_cm')}
+
+    glucose_readings = [
+        {"timestamp": ts, "glucose_value": value}
+        for ts, value in zip(row['chart_timestamps'] or [], row['chart_values'] or [])
+    ]
+    meal_logs = [
+        {"timestamp": ts, "meal_description": description, "carb_count": carbs}
+        for ts, description, carbs in zip(row['meal_timestamps'] or [], row['meal_descriptions'] or [],
+                                          row['meal_carbs'] or [])
+    ]
+
+    # Same fallback as calculate_health_score: 24 hours, then 7 days, then the last 100 readings
+    counts = _window_counts(row, "day")
+    if counts["total"] < 5:
+        counts = _window_counts(row, "week")
+    if counts["total"] < 5:
+        counts = _window_counts(row, "latest")
+
     return {
         "user_profile": user_profile,
         "glucose_readings": glucose_readings,
         "recent_meals": meal_logs,
-        "health_score": health_score_data # <-- THIS IS THE NEWLY ADDED PIECE
+        "health_score": _health_score_from_counts(**counts)
     }
 
+
 def add_log_entry(user_id: int, log_type: str, description: str, value: float):
     """Adds a new log entry to the appropriate table."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    if log_type == 'meal':
-        sql = "INSERT INTO meal_logs (user_id, timestamp, meal_description, carb_count) VALUES (%s, NOW(), %s, %s)"
-        cur.execute(sql, (user_id, description, value))
-    elif log_type == 'insulin':
-        sql = "INSERT INTO insulin_doses (user_id, timestamp, dose_amount, dose_type) VALUES (%s, NOW(), %s, %s)"
-        # 'description' would be 'bolus' or 'basal' in this case
-        cur.execute(sql, (user_id, value, description))
-    # Add other log types here (e.g., 'activity')
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        if log_type == 'meal':
+            sql = "INSERT INTO meal_logs (user_id, timestamp, meal_description, carb_count) VALUES (%s, NOW(), %s, %s)"
+            cur.execute(sql, (user_id, description, value))
+        elif log_type == 'insulin':
+            sql = "INSERT INTO insulin_doses (user_id, timestamp, dose_amount, dose_type) VALUES (%s, NOW(), %s, %s)"
+            # 'description' would be 'bolus' or 'basal' in this case
+            cur.execute(sql, (user_id, value, description))
+        # Add other log types here (e.g., 'activity')
     print(f"--- [Database] Saved '{log_type}' log for user {user_id}. ---")
+    if log_type == 'meal':
+        on_new_meal_log(int(user_id))
+
+
+# ==================================================================
+# === BULK GLUCOSE INGESTION =======================================
+# ==================================================================
+
+def copy_glucose_readings(cur, user_id: int, readings: list) -> dict:
+    """
+    Loads (timestamp, glucose_value) pairs for a user on an open cursor: COPY into
+    a temporary staging table, then one INSERT ... SELECT of the rows not
+    stored yet. (user_id, timestamp) pairs already in glucose_readings are skipped,
+    as are later duplicates within `readings`, and readings older than the
+    retention window (counted as expired). Any monthly partition the batch
+    needs is created and committed first, on another pooled connection (see
+    prepare_glucose_partitions). The inserted rows are folded into the rollups.
+    Doesn't commit or fire hooks. Returns the inserted and expired counts and the newest inserted
+    reading.
+    """
+    cutoff = _retention_cutoff()
+    expired = 0
+    if cutoff is not None:
+        kept = [r for r in readings if r[0] >= cutoff]
+        expired, readings = len(readings) - len(kept), kept
+    if not readings:
+        return {"inserted": 0, "expired": expired, "latest": None}
+    first = min(timestamp for timestamp, _ in readings)
+    last = max(timestamp for timestamp, _ in readings)
+    prepare_glucose_partitions(first, last)
+
+    cur.execute("""
+        CREATE TEMP TABLE _glucose_batch (
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            glucose_value REAL NOT NULL
+        );
+    """)
+    buf = io.StringIO()
+    for timestamp, glucose_value in readings:
+        buf.write(f"{timestamp.isoformat()}\t{glucose_value}\n")
+    buf.seek(0)
+    cur.copy_expert("COPY _glucose_batch (timestamp, glucose_value) FROM STDIN", buf)
+    # NOT EXISTS skips stored readings even where the unique index predates this code path;
+    # ON CONFLICT covers a concurrent batch inserting the same reading first.
+    # The inserted rows are folded into the hourly/daily rollups in the same statement.
+    rollups = "," + _rollup_upsert_ctes("inserted") if glucose_rollups_ready(cur) else ""
+    cur.execute(f"""
+        WITH inserted AS (
+            INSERT INTO glucose_readings (user_id, timestamp, glucose_value)
+            SELECT DISTINCT ON (b.timestamp) %(user_id)s, b.timestamp, b.glucose_value
+            FROM _glucose_batch b
+            WHERE NOT EXISTS (
+                SELECT 1 FROM glucose_readings g
+                WHERE g.user_id = %(user_id)s AND g.timestamp = b.timestamp
+                  -- Redundant bounds, so only the batch's months are probed
+                  AND g.timestamp BETWEEN %(first)s AND %(last)s
+            )
+            ORDER BY b.timestamp
+            ON CONFLICT DO NOTHING
+            RETURNING user_id, timestamp, glucose_value
+        ){rollups}
+        SELECT COUNT(*), MAX(timestamp), (ARRAY_AGG(glucose_value ORDER BY timestamp DESC))[1],
+               -- The subquery doesn't see the rows inserted above: it is the previous newest reading
+               MAX(timestamp) > COALESCE((SELECT MAX(timestamp) FROM glucose_readings
+                                          WHERE user_id = %(user_id)s), '-infinity')
+        FROM inserted;
+    """, {"user_id": user_id, "first": first, "last": last})
+    inserted, latest_time, latest_value, is_current = cur.fetchone()
+    cur.execute("DROP TABLE _glucose_batch;")
+    return {
+        "inserted": inserted,
+        "expired": expired,
+        # is_current: newer than anything stored before, i.e. not a backfill of older data
+        "latest": {"timestamp": latest_time, "glucose_value": latest_value, "is_current": is_current}
+        if inserted else None
+    }
+
+
+def bulk_insert_glucose_readings(user_id: int, readings: list) -> dict:
+    """
+    Inserts a batch of (timestamp, glucose_value) readings for a user in one
+    transaction (see copy_glucose_readings) and fires the new-reading hook once,
+    for the newest inserted reading. Returns inserted/duplicates counts, the
+    newest reading and the load rate.
+    """
+    start = time.perf_counter()
+    with db_cursor() as cur:
+        result = copy_glucose_readings(cur, user_id, readings)
+    elapsed = time.perf_counter() - start
+    print(f"--- [Database] Bulk-loaded {result['inserted']} of {len(readings)} glucose readings "
+          f"for user {user_id} in {elapsed * 1000:.1f} ms. ---")
+    if result["latest"] is not None:
+        on_new_glucose_reading(int(user_id), result["latest"]["glucose_value"], result["latest"]["timestamp"])
+    return {
+        **result,
+        "duplicates": len(readings) - result["inserted"] - result["expired"],
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_second": round(len(readings) / elapsed) if elapsed > 0 else None
+    }
+
 
 if __name__ == '__main__':
-    print("Initializing database...")
-    init_db()
\ No newline at end of file
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "init"
+    if command == "partition":
+        # Existing database: move glucose_readings onto monthly partitions without losing data
+        partition_glucose_readings()
+    elif command == "maintain":
+        print(maintain_glucose_partitions())
+    elif command == "rollups":
+        # Recompute the hourly/daily rollups from the raw readings
+        print(rebuild_glucose_rollups())
+    else:
+        print("Initializing database...")
+        init_db()
\ No newline at end of file
@@ -0,0 +1,226 @@
+# file: inference_pool.py
+# Inference worker processes, kept off the Flask request threads
+#
+# Flask-SocketIO runs in threading mode, so glucose predictions and DQN calls
+# on request threads compete for the GIL with JSON encoding and DB I/O. With
+# AURA_INFERENCE_POOL_WORKERS > 0 they run in a pool of worker processes that
+# preload the models at start-up. Submissions are bounded: when the queue is
+# full callers get InferencePoolFull right away (the API answers 503 with
+# Retry-After) instead of piling up behind a backlog.
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from startup import LazyComponent
+
+# 0 runs inference inline on the calling thread (the previous behaviour)
+POOL_WORKERS = int(os.getenv("AURA_INFERENCE_POOL_WORKERS", "0"))
+# Max jobs queued or running across all workers before submissions are rejected
+POOL_MAX_QUEUE = int(os.getenv("AURA_INFERENCE_POOL_MAX_QUEUE", str(max(1, POOL_WORKERS) * 8)))
+REQUEST_TIMEOUT_S = float(os.getenv("AURA_INFERENCE_TIMEOUT_S", "10"))
+RETRY_AFTER_S = int(os.getenv("AURA_INFERENCE_RETRY_AFTER_S", "2"))
+
+
+class InferencePoolFull(Exception):
+    """The submission queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int = RETRY_AFTER_S):
+        super().__init__(f"Inference queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceTimeout(Exception):
+    """A job did not finish within its timeout."""
+
+
+# ============================================================================
+# WORKER SIDE
+# ============================================================================
+
+def _init_worker():
+    """Preloads the default predictor and the RL agent so the first job doesn't pay for it."""
+    import prediction_service
+    import recommendation_service
+    try:
+        prediction_service.get_model_for_user(0)
+    except Exception as e:
+        print(f"[InferencePool] Worker {os.getpid()} could not preload the predictor: {e}")
+    recommendation_service.get_rl_model()
+    print(f"[InferencePool] Worker {os.getpid()} ready.")
+
+
+def _predict_task(user_id: int, recent_glucose_history: list, future_events: dict = None) -> dict:
+    from prediction_service import generate_hybrid_prediction
+    return generate_hybrid_prediction(
+        user_id=user_id, recent_glucose_history=recent_glucose_history, future_events=future_events
+    )
+
+
+def _recommend_task(kwargs: dict) -> dict:
+    from recommendation_service import get_insulin_recommendation
+    return get_insulin_recommendation(**kwargs)
+
+
+# ============================================================================
+# SUBMISSION SIDE
+# ============================================================================
+
+class InferenceJob:
+    """Handle for a submitted job; `result()` waits at most the job's timeout."""
+
+    def __init__(self, future: Future, timeout: float, pool: "InferencePool"):
+        self.future = future
+        self.timeout = timeout
+        self._pool = pool
+
+    def result(self):
+        try:
+            return self.future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.future.cancel()  # Only helps if it hasn't started; a running job keeps its slot until done
+            self._pool._count("timeouts")
+            raise InferenceTimeout(f"Inference did not finish within {self.timeout}s")
+
+
+class InferencePool:
+    """
+    Bounded front end over a spawn-context ProcessPoolExecutor.
+    A slot is taken per submitted job and released when the job finishes,
+    so a slow or stuck worker also applies backpressure.
+    """
+
+    def __init__(self, workers: int = POOL_WORKERS, max_queue: int = POOL_MAX_QUEUE,
+                 timeout: float = REQUEST_TIMEOUT_S):
+        self.workers = max(0, workers)
+        self.max_queue = max(1, max_queue)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "errors": 0, "restarts": 0}
+
+    @property
+    def inline(self) -> bool:
+        return self.workers == 0
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                print(f"[InferencePool] Starting {self.workers} inference workers (queue limit {self.max_queue}).")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _restart_executor(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                print("[InferencePool] A worker died; restarting the pool.")
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self._stats["restarts"] += 1
+
+    def start(self):
+        """Starts the workers now (they preload their models) instead of on the first job."""
+        if not self.inline:
+            executor = self._get_executor()
+            # Submitting no-op jobs makes the executor spawn and initialize its workers
+            for _ in range(self.workers):
+                executor.submit(os.getpid)
+        return self
+
+    def submit(self, fn, *args, timeout: float = None) -> InferenceJob:
+        """Queues fn(*args). Raises InferencePoolFull when max_queue jobs are already pending (pool mode only)."""
+        timeout = self.timeout if timeout is None else timeout
+        if self.inline:
+            # No queue to bound: the job runs right here on the caller's thread
+            self._count("submitted")
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+                self._count("completed")
+            except Exception as e:
+                future.set_exception(e)
+                self._count("errors")
+            return InferenceJob(future, timeout, self)
+
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise InferencePoolFull()
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._in_flight += 1
+
+        executor = self._get_executor()
+        try:
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._restart_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+        except Exception:
+            self._release_slot()
+            raise
+        future.add_done_callback(lambda f: self._on_done(f, executor))
+        return InferenceJob(future, timeout, self)
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _on_done(self, future: Future, executor):
+        self._release_slot()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self._count("completed")
+        else:
+            self._count("errors")
+            if isinstance(error, BrokenProcessPool):
+                self._restart_executor(executor)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = self._in_flight
+        return {
+            **stats,
+            "mode": "inline" if self.inline else "process_pool",
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "timeout_s": self.timeout
+        }
+
+
+INFERENCE_POOL = InferencePool()
+
+# Lets the startup warmup thread spawn the workers (and their model preloads) early
+_POOL_STARTUP = LazyComponent("inference_pool", INFERENCE_POOL.start, kind="warmup")
+
+
+def submit_prediction(user_id: int, recent_glucose_history: list, future_events: dict = None) -> InferenceJob:
+    """generate_hybrid_prediction on an inference worker"""
+    return INFERENCE_POOL.submit(_predict_task, user_id, list(recent_glucose_history), future_events)
+
+
+def submit_recommendation(**kwargs) -> InferenceJob:
+    """get_insulin_recommendation on an inference worker"""
+    return INFERENCE_POOL.submit(_recommend_task, kwargs)
+
+
+def get_pool_stats() -> dict:
+    return INFERENCE_POOL.stats()
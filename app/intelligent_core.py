@@ -1,15 +1,21 @@
-from natural_language_processor import EnhancedNLPProcessor
-# --- We now import your NEW master prediction function ---
-from prediction_service import generate_hybrid_prediction
-from recommendation_service import get_insulin_recommendation
+import importlib
+from natural_language_processor import get_nlp_processor
+from startup import LazyComponent
+from inference_pool import submit_prediction, submit_recommendation
 import database as db
 
-# --- Initialize the AI components ---
-# We create one instance of your NLP processor to use everywhere.
-# This is efficient as it builds the lookup maps only once.
-print("Initializing Enhanced NLP Processor...")
-NLP_PROCESSOR = EnhancedNLPProcessor()
-print("NLP Processor ready.")
+# --- AI components are initialized lazily ---
+# prediction_service pulls in the Keras predictor and recommendation_service
+# pulls in torch/stable_baselines3, so both are imported on first use (or by
+# the startup warmup thread) instead of when the web app starts.
+_PREDICTION_SERVICE = LazyComponent("prediction_service", lambda: importlib.import_module("prediction_service"))
+_RECOMMENDATION_SERVICE = LazyComponent("recommendation_service", lambda: importlib.import_module("recommendation_service"))
+
+def get_prediction_service():
+    return _PREDICTION_SERVICE.get()
+
+def get_recommendation_service():
+    return _RECOMMENDATION_SERVICE.get()
 
 def process_user_intent(user_id: int, user_text: str, glucose_history: list) -> dict:
     # Note: The function now accepts user_id as its first argument
@@ -17,13 +23,16 @@ def process_user_intent(user_id: int, user_text: str, glucose_history: list) ->
     print(f"--- [AI Core] Processing intent for user {user_id}: '{user_text}' ---")
     
     # ... (NLP, Recommendation, and Advice logic is the same)
-    parsed_entities = NLP_PROCESSOR.parse_user_text(user_text)
+    nlp_processor = get_nlp_processor()
+    parsed_entities = nlp_processor.parse_user_text(user_text)
     carbs = parsed_entities.get("carbs", 0)
     activity_info = parsed_entities.get("activities_detected", [])
     activity_detected = len(activity_info) > 0
     
     current_glucose = glucose_history[-1] if glucose_history else 120
-    dose_recommendation = get_insulin_recommendation(
+    # Model inference goes through the inference pool (worker processes, or inline when disabled).
+    # Both jobs are submitted before waiting so the workers can run them in parallel.
+    dose_job = submit_recommendation(
         glucose=current_glucose,
         carbs=carbs,
         exercise_recent=activity_detected
@@ -37,13 +46,15 @@ def process_user_intent(user_id: int, user_text: str, glucose_history: list) ->
     }
     
     # <<< THE CHANGE IS HERE: We now pass the user_id >>>
-    hybrid_prediction = generate_hybrid_prediction(
+    prediction_job = submit_prediction(
         user_id=user_id, # Pass the user_id to the prediction service
         recent_glucose_history=glucose_history,
         future_events=future_events
     )
+    dose_recommendation = dose_job.result()
+    hybrid_prediction = prediction_job.result()
     
-    contextual_advice = NLP_PROCESSOR.get_insulin_adjustment_suggestion(parsed_entities)
+    contextual_advice = nlp_processor.get_insulin_adjustment_suggestion(parsed_entities)
     
     # ... (Assemble the response as before)
     response = {
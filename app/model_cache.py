@@ -0,0 +1,186 @@
+# file: model_cache.py
+# Memory-bounded LRU cache for loaded predictor models and scalers
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Rough fixed cost of a Keras model object (graph, layers, optimizer slots)
+# on top of its weight arrays. NumPy models only cost their weights.
+KERAS_MODEL_OVERHEAD_BYTES = 2 * 1024 * 1024
+
+
+def estimate_nbytes(obj: Any) -> int:
+    """
+    Best-effort resident size of a cached object.
+    Handles NumPy models (nbytes), Keras models (get_weights), sklearn
+    scalers (array attributes) and tuples of those.
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_nbytes(item) for item in obj)
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if hasattr(obj, "get_weights"):
+        try:
+            return sum(int(w.nbytes) for w in obj.get_weights()) + KERAS_MODEL_OVERHEAD_BYTES
+        except Exception:
+            return KERAS_MODEL_OVERHEAD_BYTES
+    if hasattr(obj, "__dict__"):
+        return sum(int(v.nbytes) for v in vars(obj).values() if hasattr(v, "nbytes"))
+    return 0
+
+
+class _Entry:
+    __slots__ = ("value", "nbytes", "pinned", "version", "loaded_at")
+
+    def __init__(self, value: Any, nbytes: int, pinned: bool, version: Any = None):
+        self.value = value
+        self.nbytes = nbytes
+        self.pinned = pinned
+        self.version = version
+        self.loaded_at = time.time()
+
+
+class _InFlightLoad:
+    __slots__ = ("event", "error", "stale")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+        self.stale = False  # Invalidated while loading: the result must not be cached
+
+
+class ModelCache:
+    """
+    Thread-safe LRU cache with an entry and a byte budget.
+
+    - Pinned entries (the default model) are never evicted.
+    - Concurrent misses for the same key share one load: the first caller runs
+      the loader, the others wait for it instead of reading the file again.
+    - An entry cached with a different `version` (e.g. the file's mtime) is
+      reloaded, so files rewritten by another process are picked up.
+    """
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._loading: Dict[str, _InFlightLoad] = {}
+        self._lock = threading.Lock()
+        self._resident_bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "load_errors": 0, "shared_loads": 0,
+                       "version_reloads": 0}
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], pin: bool = False, version: Any = None) -> Any:
+        """Return the cached value for key, loading it with `loader()` on a miss or a version change."""
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.version != version:
+                    del self._entries[key]
+                    self._resident_bytes -= entry.nbytes
+                    self._stats["version_reloads"] += 1
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    if pin:
+                        entry.pinned = True
+                    return entry.value
+
+                in_flight = self._loading.get(key)
+                if in_flight is None:
+                    in_flight = _InFlightLoad()
+                    self._loading[key] = in_flight
+                    self._stats["misses"] += 1
+                    is_loader = True
+                else:
+                    self._stats["shared_loads"] += 1
+                    is_loader = False
+
+            if not is_loader:
+                in_flight.event.wait()
+                if in_flight.error is not None:
+                    raise in_flight.error
+                continue  # The value is in the cache now (unless evicted immediately or stale)
+
+            try:
+                value = loader()
+            except Exception as e:
+                with self._lock:
+                    self._stats["load_errors"] += 1
+                    in_flight.error = e
+                    if self._loading.get(key) is in_flight:
+                        del self._loading[key]
+                in_flight.event.set()
+                raise
+
+            with self._lock:
+                # A stale load read the files before an invalidate(): hand the value to this
+                # caller only, so the next lookup loads the re-trained model
+                if not in_flight.stale:
+                    entry = _Entry(value, estimate_nbytes(value), pin, version)
+                    self._entries[key] = entry
+                    self._resident_bytes += entry.nbytes
+                    self._evict_locked(keep=key)
+                if self._loading.get(key) is in_flight:
+                    del self._loading[key]
+            in_flight.event.set()
+            return value
+
+    def _evict_locked(self, keep: Optional[str] = None):
+        """Evict least-recently-used unpinned entries until both budgets are met."""
+        def over_budget():
+            return len(self._entries) > self.max_entries or (
+                self.max_bytes and self._resident_bytes > self.max_bytes
+            )
+
+        for key in list(self._entries.keys()):
+            if not over_budget():
+                break
+            entry = self._entries[key]
+            if entry.pinned or key == keep:
+                continue
+            del self._entries[key]
+            self._resident_bytes -= entry.nbytes
+            self._stats["evictions"] += 1
+            print(f"[ModelCache] Evicted {key} ({entry.nbytes / 1024:.0f} KB)")
+
+    def invalidate(self, key: str) -> bool:
+        """
+        Drop a key (e.g. after a model file was re-trained). Pinned entries are dropped too.
+        A load of the key already in flight is marked stale: its result isn't cached,
+        and lookups from now on start a new load.
+        """
+        with self._lock:
+            in_flight = self._loading.pop(key, None)
+            if in_flight is not None:
+                in_flight.stale = True
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._resident_bytes -= entry.nbytes
+            return True
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and resident size"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else 0,
+                "entries": len(self._entries),
+                "pinned": sum(1 for e in self._entries.values() if e.pinned),
+                "resident_bytes": self._resident_bytes,
+                "resident_mb": round(self._resident_bytes / (1024 * 1024), 2),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "keys": list(self._entries.keys())
+            }
@@ -1,13 +1,26 @@
 # file: model_trainer.py
 
-import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MinMaxScaler
-from keras.models import Sequential
-from keras.layers import LSTM, Dense
 import joblib
 import os
+from datetime import datetime, timedelta, timezone
+from numpy.lib.stride_tricks import sliding_window_view
 import database as db
+from config import BASE_DIR
+from personalization_store import PERSONALIZATION_STORE, PERSONALIZATION_STORE_ENABLED
+
+LOOK_BACK = 12
+FORECAST_HORIZON = 12  # 12 x 5-minute steps, matches prediction_service.PREDICTION_STEPS
+
+# New models emit the whole horizon in one forward pass; set to 0 to train legacy one-step models
+MULTI_HORIZON_TRAINING = os.getenv("AURA_MULTI_HORIZON_TRAINING", "1") == "1"
+# Days of history a calibration trains on; 0 uses the complete history
+TRAINING_HISTORY_DAYS = int(os.getenv("AURA_TRAINING_HISTORY_DAYS", "0"))
+TRAINING_EPOCHS = 5
+MIN_TRAINING_READINGS = 200
+# Windows per model.fit call: bounds the tensors Keras copies, not the history size
+TRAINING_SLAB_WINDOWS = 8640
 
 def create_sequences(dataset, look_back=12):
     dataX, dataY = [], []
@@ -17,45 +30,96 @@ def create_sequences(dataset, look_back=12):
         dataY.append(dataset[i + look_back, 0])
     return np.array(dataX), np.array(dataY)
 
-def fine_tune_model_for_user(user_id: int):
+def create_multi_horizon_sequences(dataset, look_back=12, horizon=FORECAST_HORIZON):
+    """Like create_sequences, but each target is the next `horizon` values instead of one."""
+    dataX, dataY = [], []
+    for i in range(len(dataset) - look_back - horizon + 1):
+        dataX.append(dataset[i:(i + look_back), 0])
+        dataY.append(dataset[(i + look_back):(i + look_back + horizon), 0])
+    return np.array(dataX), np.array(dataY)
+
+def load_user_glucose_series(user_id: int, since=None) -> np.ndarray:
+    """A user's glucose history as one float32 array (about 400 KB per year of 5-minute readings)"""
+    chunks = list(db.iter_glucose_history(user_id, since=since))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype='float32')
+
+def iter_training_windows(series: np.ndarray, span: int, slab_windows: int = TRAINING_SLAB_WINDOWS):
+    """
+    Sliding windows of `span` consecutive values over a scaled series, in
+    (n, span) slabs of up to slab_windows. They are views into the series: no
+    window is copied until Keras converts a slab.
+    """
+    if len(series) < span:
+        return
+    windows = sliding_window_view(series, span)
+    for start in range(0, len(windows), slab_windows):
+        yield windows[start:start + slab_windows]
+
+def build_model(look_back=LOOK_BACK, horizon=1):
+    """LSTM(16) -> Dense(horizon). horizon=1 is the legacy recursive model."""
+    # Imported here so the web app does not load TensorFlow until a calibration actually runs
+    from keras.models import Sequential
+    from keras.layers import LSTM, Dense
+    model = Sequential()
+    model.add(LSTM(16, input_shape=(look_back, 1)))
+    model.add(Dense(horizon))
+    model.compile(loss='mean_squared_error', optimizer='adam')
+    return model
+
+def fine_tune_model_for_user(user_id: int, multi_horizon: bool = MULTI_HORIZON_TRAINING):
     """
-    Fetches a user's entire glucose history and fine-tunes a new
-    prediction model specifically for them.
+    Fetches a user's entire glucose history (AURA_TRAINING_HISTORY_DAYS to cap
+    it) and fine-tunes a new prediction model specifically for them. The
+    history is read once into a float32 array; training windows are views into
+    it, fitted a slab at a time.
+    With multi_horizon=True the model predicts all FORECAST_HORIZON steps at once.
     """
     print(f"--- [Trainer] Starting fine-tuning for user {user_id}... ---")
+    since = datetime.now(timezone.utc) - timedelta(days=TRAINING_HISTORY_DAYS) if TRAINING_HISTORY_DAYS else None
     
-    # 1. Fetch all data for the user
-    glucose_history = db.get_recent_glucose_readings(user_id, limit=9999) # Get all data
+    # 1. Fetch all data for the user (paged; no connection is held while training)
+    glucose_history = load_user_glucose_series(user_id, since=since)
     
-    if len(glucose_history) < 200: # Need a minimum amount of data to train
+    if len(glucose_history) < MIN_TRAINING_READINGS: # Need a minimum amount of data to train
         print(f"--- [Trainer] User {user_id} has insufficient data ({len(glucose_history)} readings). Aborting. ---")
         return
 
     print(f"--- [Trainer] Fetched {len(glucose_history)} readings from database. ---")
     
-    # 2. Preprocess the data (similar to Colab)
-    dataset = np.array(glucose_history).reshape(-1, 1).astype('float32')
+    # Scaled once; the raw array is dropped so only one copy lives through training
     scaler = MinMaxScaler(feature_range=(0, 1))
-    dataset = scaler.fit_transform(dataset)
+    dataset = scaler.fit_transform(glucose_history.reshape(-1, 1)).ravel().astype('float32')
+    del glucose_history
     
-    trainX, trainY = create_sequences(dataset)
-    trainX = np.reshape(trainX, (trainX.shape[0], trainX.shape[1], 1))
-
-    # 3. Build and train a new model
-    model = Sequential()
-    model.add(LSTM(16, input_shape=(trainX.shape[1], trainX.shape[2])))
-    model.add(Dense(1))
-    model.compile(loss='mean_squared_error', optimizer='adam')
+    # 2. Build a new model; each window is LOOK_BACK inputs followed by the target(s)
+    horizon = FORECAST_HORIZON if multi_horizon else 1
+    model = build_model(LOOK_BACK, horizon)
     
-    print(f"--- [Trainer] Training new model on user data... ---")
-    # In a real app, this might be more epochs, but 5 is fast for a demo.
-    model.fit(trainX, trainY, epochs=5, batch_size=32, verbose=0)
+    # 3. Each epoch fits the windows one slab at a time
+    print(f"--- [Trainer] Training new {'multi-horizon' if multi_horizon else 'single-step'} model on user data... ---")
+    for _ in range(TRAINING_EPOCHS):
+        for windows in iter_training_windows(dataset, LOOK_BACK + horizon):
+            trainX = windows[:, :LOOK_BACK, np.newaxis]
+            trainY = windows[:, LOOK_BACK:] if multi_horizon else windows[:, LOOK_BACK]
+            model.fit(trainX, trainY, epochs=1, batch_size=32, verbose=0)
     
     # 4. Save the personalized model and scaler
-    user_model_path = f'glucose_predictor_user_{user_id}.h5'
-    user_scaler_path = f'scaler_user_{user_id}.gz'
+    if PERSONALIZATION_STORE_ENABLED:
+        # Compact weights + scaler row in the shared-graph store (a few KB per user)
+        PERSONALIZATION_STORE.put(user_id, model.get_weights(), scaler)
+        saved_to = f"personalization store ({PERSONALIZATION_STORE.directory})"
+    else:
+        # (Saved next to the default model, where prediction_service.get_model_for_user looks for them)
+        user_model_path = os.path.join(BASE_DIR, 'models', f'glucose_predictor_user_{user_id}.h5')
+        user_scaler_path = os.path.join(BASE_DIR, 'models', f'scaler_user_{user_id}.gz')
+        model.save(user_model_path)
+        joblib.dump(scaler, user_scaler_path)
+        saved_to = user_model_path
     
-    model.save(user_model_path)
-    joblib.dump(scaler, user_scaler_path)
+    # 5. Drop the stale model from the in-process cache and any cached predictions
+    from prediction_service import evict_user_model
+    from cache_service import on_model_calibration
+    evict_user_model(user_id)
+    on_model_calibration(user_id)
     
-    print(f"--- [Trainer] SUCCESS: Saved personalized model to {user_model_path} ---")
\ No newline at end of file
+    print(f"--- [Trainer] SUCCESS: Saved personalized model to {saved_to} ---")
\ No newline at end of file
@@ -3,6 +3,8 @@
 import re
 from typing import Dict, List, Tuple, Optional
 
+from startup import LazyComponent
+
 # ============================================================================
 # COMPREHENSIVE FOOD DATABASE - Indian & International Foods
 # ============================================================================
@@ -625,11 +627,14 @@ class EnhancedNLPProcessor:
         return suggestions
 
 
-# Global instance
-nlp_processor = EnhancedNLPProcessor()
+# Shared instance, built on first use (building the lookup maps is not free)
+_NLP_PROCESSOR = LazyComponent("nlp_processor", EnhancedNLPProcessor, kind="model_load")
+
+def get_nlp_processor() -> EnhancedNLPProcessor:
+    return _NLP_PROCESSOR.get()
 
 def parse_text(text: str) -> Dict:
-    return nlp_processor.parse_user_text(text)
+    return get_nlp_processor().parse_user_text(text)
 
 def get_suggestions(entities: Dict) -> Dict:
-    return nlp_processor.get_insulin_adjustment_suggestion(entities)
+    return get_nlp_processor().get_insulin_adjustment_suggestion(entities)
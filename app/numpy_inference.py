@@ -0,0 +1,287 @@
+# file: numpy_inference.py
+# TensorFlow-free inference runtime for Aura's glucose predictor (LSTM -> Dense)
+#
+# Loads weights straight from Keras .h5 files with h5py and runs the LSTM cell
+# math vectorized over a batch, so workers don't need to import keras/TensorFlow.
+
+import json
+import numpy as np
+import h5py
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _hard_sigmoid(x: np.ndarray) -> np.ndarray:
+    # Keras 3 definition: relu6(x + 3) / 6
+    return np.clip(x / 6.0 + 0.5, 0.0, 1.0)
+
+
+def _hard_sigmoid_keras2(x: np.ndarray) -> np.ndarray:
+    # Keras 2 definition: clip(0.2 * x + 0.5, 0, 1)
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+def _linear(x: np.ndarray) -> np.ndarray:
+    return x
+
+
+ACTIVATIONS = {
+    "sigmoid": _sigmoid,
+    "hard_sigmoid": _hard_sigmoid,
+    "hard_sigmoid_keras2": _hard_sigmoid_keras2,
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "linear": _linear,
+    None: _linear,
+}
+
+
+class NumpyLSTMModel:
+    """
+    NumPy implementation of the Sequential LSTM(units) -> Dense(horizon) predictor.
+
+    Exposes the same `predict(x, verbose=0)` and `output_shape` surface that
+    prediction_service uses on Keras models, so both backends are interchangeable.
+    Gate order follows Keras: input, forget, cell, output.
+    """
+
+    def __init__(self, kernel, recurrent_kernel, bias, dense_kernel, dense_bias,
+                 activation: str = "tanh", recurrent_activation: str = "sigmoid",
+                 dense_activation: str = "linear"):
+        self.kernel = np.asarray(kernel, dtype=np.float32)                    # (features, 4 * units)
+        self.recurrent_kernel = np.asarray(recurrent_kernel, dtype=np.float32)  # (units, 4 * units)
+        self.bias = np.asarray(bias, dtype=np.float32)                        # (4 * units,)
+        self.dense_kernel = np.asarray(dense_kernel, dtype=np.float32)        # (units, horizon)
+        self.dense_bias = np.asarray(dense_bias, dtype=np.float32)            # (horizon,)
+        self.units = self.recurrent_kernel.shape[0]
+        self.activation_name = activation
+        self.recurrent_activation_name = recurrent_activation
+        self.dense_activation_name = dense_activation
+        self._activation = ACTIVATIONS[activation]
+        self._recurrent_activation = ACTIVATIONS[recurrent_activation]
+        self._dense_activation = ACTIVATIONS[dense_activation]
+
+    @property
+    def output_shape(self) -> tuple:
+        return (None, self.dense_kernel.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size of the weight arrays"""
+        return sum(w.nbytes for w in self.get_weights())
+
+    def get_weights(self) -> list:
+        """Weights in Keras order: [kernel, recurrent_kernel, bias, dense_kernel, dense_bias]"""
+        return [self.kernel, self.recurrent_kernel, self.bias, self.dense_kernel, self.dense_bias]
+
+    def initial_state(self, batch_size: int) -> tuple:
+        zeros = np.zeros((batch_size, self.units), dtype=np.float32)
+        return zeros, zeros.copy()
+
+    def step(self, x_t: np.ndarray, h: np.ndarray, c: np.ndarray) -> tuple:
+        """
+        Advances the LSTM by one timestep.
+
+        Args:
+            x_t: Inputs of shape (batch, features)
+            h, c: Hidden and cell state of shape (batch, units)
+
+        Returns:
+            The new (h, c)
+        """
+        z = x_t @ self.kernel + h @ self.recurrent_kernel + self.bias
+        u = self.units
+        i = self._recurrent_activation(z[:, :u])
+        f = self._recurrent_activation(z[:, u:2 * u])
+        g = self._activation(z[:, 2 * u:3 * u])
+        o = self._recurrent_activation(z[:, 3 * u:])
+        c = f * c + i * g
+        h = o * self._activation(c)
+        return h, c
+
+    def encode(self, x: np.ndarray) -> tuple:
+        """Runs the LSTM over a (batch, timesteps, features) tensor and returns the final (h, c)."""
+        x = np.asarray(x, dtype=np.float32)
+        h, c = self.initial_state(x.shape[0])
+        for t in range(x.shape[1]):
+            h, c = self.step(x[:, t, :], h, c)
+        return h, c
+
+    def head(self, h: np.ndarray) -> np.ndarray:
+        """Dense output layer applied to a hidden state"""
+        return self._dense_activation(h @ self.dense_kernel + self.dense_bias)
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        h, _ = self.encode(x)
+        return self.head(h)
+
+    @classmethod
+    def from_h5(cls, path: str) -> "NumpyLSTMModel":
+        """
+        Loads a Keras-saved .h5 model (Keras 2 and Keras 3 legacy H5 layouts).
+        Only the LSTM -> Dense architecture used by Aura is supported.
+        """
+        with h5py.File(path, "r") as f:
+            keras_version = f.attrs.get("keras_version", b"")
+            keras_version = keras_version.decode("utf-8") if isinstance(keras_version, bytes) else str(keras_version)
+            layer_configs = {}
+            if "model_config" in f.attrs:
+                raw = f.attrs["model_config"]
+                config = json.loads(raw.decode("utf-8") if isinstance(raw, bytes) else raw)
+                for layer in config.get("config", {}).get("layers", []):
+                    layer_configs[layer["config"].get("name")] = layer
+
+            weights_group = f["model_weights"] if "model_weights" in f else f
+            weights_by_type = {}
+            for layer_name in weights_group.attrs["layer_names"]:
+                layer_name = layer_name.decode("utf-8") if isinstance(layer_name, bytes) else layer_name
+                group = weights_group[layer_name]
+                weight_names = [n.decode("utf-8") if isinstance(n, bytes) else n for n in group.attrs["weight_names"]]
+                if not weight_names:
+                    continue
+                layer_config = layer_configs.get(layer_name, {})
+                layer_type = layer_config.get("class_name") or ("LSTM" if len(weight_names) == 3 else "Dense")
+                if layer_type in weights_by_type:
+                    raise ValueError(f"Unsupported architecture in {path}: more than one {layer_type} layer")
+                weights_by_type[layer_type] = (
+                    [np.array(group[name]) for name in weight_names],
+                    layer_config.get("config", {})
+                )
+
+        if set(weights_by_type) != {"LSTM", "Dense"}:
+            raise ValueError(f"Unsupported architecture in {path}: expected LSTM -> Dense, found {sorted(weights_by_type)}")
+
+        (kernel, recurrent_kernel, bias), lstm_config = weights_by_type["LSTM"]
+        (dense_kernel, dense_bias), dense_config = weights_by_type["Dense"]
+        recurrent_activation = lstm_config.get("recurrent_activation", "sigmoid")
+        if recurrent_activation == "hard_sigmoid" and keras_version.startswith("2."):
+            recurrent_activation = "hard_sigmoid_keras2"
+        return cls(
+            kernel, recurrent_kernel, bias, dense_kernel, dense_bias,
+            activation=lstm_config.get("activation", "tanh"),
+            recurrent_activation=recurrent_activation,
+            dense_activation=dense_config.get("activation", "linear")
+        )
+
+
+class StreamingLSTMState:
+    """
+    Incremental encoder state for one user's stream of CGM readings.
+
+    A sliding-window model can't simply carry one (h, c) forward, because the
+    window must forget its oldest reading. Instead we keep `look_back`
+    staggered slots: slot states have consumed 1..look_back of the most recent
+    readings, so the "full" slot is exactly the encoding a fresh pass over the
+    window would produce. Each new reading costs one batched cell step over the
+    slots instead of `look_back` sequential steps, and recursive forecasts reuse
+    the partially filled slots instead of re-encoding every shifted window.
+    """
+
+    def __init__(self, model: NumpyLSTMModel, scaled_window: np.ndarray):
+        self.model = model
+        self.look_back = len(scaled_window)
+        self.rebuild(scaled_window)
+
+    def rebuild(self, scaled_window: np.ndarray):
+        """Full-window recompute: slot j starts at reading j, so it ends with look_back - j readings."""
+        window = np.asarray(scaled_window, dtype=np.float32).reshape(-1)
+        self.h, self.c = self.model.initial_state(self.look_back)
+        self.counts = np.zeros(self.look_back, dtype=np.int32)
+        for j, value in enumerate(window):
+            self._advance(np.arange(j + 1), value)
+
+    def _advance(self, slots: np.ndarray, value: float):
+        x_t = np.full((len(slots), 1), value, dtype=np.float32)
+        self.h[slots], self.c[slots] = self.model.step(x_t, self.h[slots], self.c[slots])
+        self.counts[slots] += 1
+
+    def push(self, scaled_value: float):
+        """Ingest one new reading: recycle the slot that is now too old, then advance every slot."""
+        full = self.counts >= self.look_back
+        self.h[full] = 0.0
+        self.c[full] = 0.0
+        self.counts[full] = 0
+        self._advance(np.arange(self.look_back), scaled_value)
+
+    def forecast(self, steps: int) -> np.ndarray:
+        """Scaled forecast for the current window, identical to running the model on it from scratch."""
+        order = np.argsort(-self.counts)  # Full slot first, then look_back - 1, ...
+        h_full = self.h[order[:1]]
+        outputs = self.model.head(h_full)[0]
+        if outputs.shape[0] >= steps:
+            return outputs[:steps]
+        if steps > self.look_back:
+            raise ValueError(f"Streaming recursive forecast supports at most {self.look_back} steps")
+
+        # Recursive model: step k reuses the slot holding the last look_back - k readings
+        h = self.h[order].copy()
+        c = self.c[order].copy()
+        predictions = np.empty(steps, dtype=np.float32)
+        predictions[0] = outputs[0]
+        for k in range(1, steps):
+            x_t = np.full((self.look_back - k, 1), predictions[k - 1], dtype=np.float32)
+            h[k:], c[k:] = self.model.step(x_t, h[k:], c[k:])
+            predictions[k] = self.model.head(h[k:k + 1])[0, 0]
+        return predictions
+
+
+def load_model(path: str) -> NumpyLSTMModel:
+    """Drop-in replacement for keras.models.load_model for Aura predictor files"""
+    return NumpyLSTMModel.from_h5(path)
+
+
+# ============================================================================
+# PARITY CHECK AGAINST KERAS
+# ============================================================================
+
+def check_parity(model_path: str = None, scaler_path: str = None, data_path: str = None,
+                 max_windows: int = 2000, tolerance: float = 1e-4) -> dict:
+    """
+    Compares NumPy and Keras outputs on LOOK_BACK windows of the 559-ws-training.xml
+    series. Requires keras to be installed (it is only imported here).
+
+    Returns a dict with the max absolute error in scaled and mg/dL units.
+    """
+    import os
+    import xml.etree.ElementTree as ET
+    import joblib
+    from keras.models import load_model as keras_load_model
+    from config import BASE_DIR, MODEL_PATH, DATA_PATH
+
+    model_path = model_path or MODEL_PATH
+    scaler_path = scaler_path or os.path.join(BASE_DIR, 'models', 'scaler.gz')
+    data_path = data_path or DATA_PATH
+    look_back = 12
+
+    root = ET.parse(data_path).getroot()
+    series = np.array([float(e.get('value')) for e in root.findall('./glucose_level/event')], dtype=np.float32)
+    scaler = joblib.load(scaler_path)
+    scaled = scaler.transform(series.reshape(-1, 1)).ravel().astype(np.float32)
+
+    count = min(max_windows, len(scaled) - look_back)
+    windows = np.stack([scaled[i:i + look_back] for i in range(count)]).reshape(count, look_back, 1)
+
+    keras_out = np.asarray(keras_load_model(model_path).predict(windows, verbose=0))
+    numpy_out = load_model(model_path).predict(windows)
+
+    max_abs_error = float(np.max(np.abs(keras_out - numpy_out)))
+    max_mgdl_error = float(np.max(np.abs(
+        scaler.inverse_transform(keras_out.reshape(-1, 1)) - scaler.inverse_transform(numpy_out.reshape(-1, 1))
+    )))
+    return {
+        "windows": count,
+        "max_abs_error_scaled": max_abs_error,
+        "max_abs_error_mg_dl": max_mgdl_error,
+        "within_tolerance": max_abs_error <= tolerance
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    result = check_parity(*sys.argv[1:3])
+    print(f"[NumPy LSTM] Parity over {result['windows']} windows: "
+          f"max |diff| = {result['max_abs_error_scaled']:.2e} (scaled), "
+          f"{result['max_abs_error_mg_dl']:.4f} mg/dL")
+    sys.exit(0 if result["within_tolerance"] else 1)
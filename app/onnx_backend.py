@@ -0,0 +1,256 @@
+# file: onnx_backend.py
+# ONNX Runtime (CPU) backend for the glucose predictor and the DQN insulin policy
+#
+# Both networks are tiny, so most of the Keras/torch cost per call is framework
+# overhead. ONNX Runtime runs them as a handful of fused CPU kernels and needs
+# neither TensorFlow nor torch at serving time. Export with onnx_export.py.
+
+import os
+import threading
+import numpy as np
+
+from config import ONNX_QUANTIZED
+
+ONNX_INTRA_OP_THREADS = int(os.getenv("AURA_ONNX_THREADS", "1"))
+
+# Keras LSTM activation name -> (ONNX activation, alpha, beta)
+_ONNX_ACTIVATIONS = {
+    "sigmoid": ("Sigmoid", None, None),
+    "hard_sigmoid": ("HardSigmoid", 1.0 / 6.0, 0.5),   # Keras 3: relu6(x + 3) / 6
+    "hard_sigmoid_keras2": ("HardSigmoid", 0.2, 0.5),  # Keras 2: clip(0.2 * x + 0.5, 0, 1)
+    "tanh": ("Tanh", None, None),
+    "relu": ("Relu", None, None),
+}
+
+OPSET = 13
+
+
+def onnx_path_for(path: str, quantized: bool = False) -> str:
+    """glucose_predictor.h5 -> glucose_predictor.onnx (or .int8.onnx); same for the DQN .zip"""
+    base, _ = os.path.splitext(path)
+    return base + (".int8.onnx" if quantized else ".onnx")
+
+
+def _session(model):
+    """CPU InferenceSession from a file path or serialized model bytes"""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(model, options, providers=["CPUExecutionProvider"])
+
+
+# ============================================================================
+# LSTM -> DENSE GRAPH
+# ============================================================================
+
+def _keras_to_onnx_gates(array: np.ndarray, axis: int = -1) -> np.ndarray:
+    # Keras packs gates as input, forget, cell, output; ONNX LSTM expects input, output, forget, cell
+    i, f, c, o = np.split(array, 4, axis=axis)
+    return np.concatenate([i, o, f, c], axis=axis)
+
+
+def predictor_weight_arrays(weights: list) -> dict:
+    """
+    Keras-order predictor weights -> the ONNX tensors of build_predictor_graph:
+    W (1, 4U, F), R (1, 4U, U), B (1, 8U), dense_kernel (U, H), dense_bias (H,)
+    """
+    kernel, recurrent_kernel, bias, dense_kernel, dense_bias = [np.asarray(w, dtype=np.float32) for w in weights]
+    return {
+        "W": np.ascontiguousarray(_keras_to_onnx_gates(kernel, axis=1).T[np.newaxis]),
+        "R": np.ascontiguousarray(_keras_to_onnx_gates(recurrent_kernel, axis=1).T[np.newaxis]),
+        # ONNX splits the bias into input and recurrent halves; Keras has a single bias
+        "B": np.concatenate([_keras_to_onnx_gates(bias), np.zeros_like(bias)])[np.newaxis],
+        "dense_kernel": np.ascontiguousarray(dense_kernel),
+        "dense_bias": np.ascontiguousarray(dense_bias),
+    }
+
+
+def build_predictor_graph(model, weights_as_inputs: bool = False):
+    """
+    ONNX graph for a NumpyLSTMModel: Transpose -> LSTM -> Squeeze -> MatMul -> Add.
+
+    With weights_as_inputs the weights are graph inputs instead of initializers,
+    so one session can serve every personalized user of the same shape.
+    Input "window" is (batch, time, features), output "forecast" is (batch, horizon).
+    """
+    from onnx import TensorProto, helper, numpy_helper
+
+    units = model.units
+    n_features = model.kernel.shape[0]
+    horizon = model.dense_kernel.shape[1]
+    arrays = predictor_weight_arrays(model.get_weights())
+
+    try:
+        recurrent = _ONNX_ACTIVATIONS[model.recurrent_activation_name]
+        activation = _ONNX_ACTIVATIONS[model.activation_name]
+    except KeyError as e:
+        raise ValueError(f"Activation {e} has no ONNX LSTM equivalent")
+    alphas = [a for _, a, _ in (recurrent, activation, activation) if a is not None]
+    betas = [b for _, _, b in (recurrent, activation, activation) if b is not None]
+
+    lstm_attrs = {
+        "hidden_size": units,
+        "activations": [recurrent[0], activation[0], activation[0]],
+    }
+    if alphas:
+        lstm_attrs["activation_alpha"] = alphas
+        lstm_attrs["activation_beta"] = betas
+
+    nodes = [
+        helper.make_node("Transpose", ["window"], ["window_tm"], perm=[1, 0, 2]),
+        helper.make_node("LSTM", ["window_tm", "W", "R", "B"], ["", "h_n"], **lstm_attrs),
+        helper.make_node("Squeeze", ["h_n", "squeeze_axes"], ["h_last"]),
+        helper.make_node("MatMul", ["h_last", "dense_kernel"], ["dense_out"]),
+    ]
+    dense_activation = getattr(model, "dense_activation_name", "linear")
+    if dense_activation in (None, "linear"):
+        nodes.append(helper.make_node("Add", ["dense_out", "dense_bias"], ["forecast"]))
+    elif dense_activation == "relu":
+        nodes.append(helper.make_node("Add", ["dense_out", "dense_bias"], ["dense_pre"]))
+        nodes.append(helper.make_node("Relu", ["dense_pre"], ["forecast"]))
+    else:
+        raise ValueError(f"Dense activation '{dense_activation}' is not supported by the ONNX export")
+
+    initializers = [numpy_helper.from_array(np.array([0], dtype=np.int64), "squeeze_axes")]
+    inputs = [helper.make_tensor_value_info("window", TensorProto.FLOAT, ["batch", "time", n_features])]
+    for name, array in arrays.items():
+        if weights_as_inputs:
+            inputs.append(helper.make_tensor_value_info(name, TensorProto.FLOAT, list(array.shape)))
+        else:
+            initializers.append(numpy_helper.from_array(array, name))
+
+    graph = helper.make_graph(
+        nodes, "aura_glucose_predictor", inputs,
+        [helper.make_tensor_value_info("forecast", TensorProto.FLOAT, ["batch", horizon])],
+        initializer=initializers
+    )
+    onnx_model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", OPSET)])
+    onnx_model.ir_version = 8  # readable by older onnxruntime releases too
+    return onnx_model
+
+
+class OnnxPredictorModel:
+    """
+    Keras-compatible predictor (`predict`, `output_shape`) over an ONNX Runtime session.
+    InferenceSession.run is thread-safe, so one instance serves all request threads.
+    """
+
+    def __init__(self, session, source: str, nbytes: int = 0):
+        self._session = session
+        self.source = source
+        self._nbytes = nbytes
+        self._input_name = session.get_inputs()[0].name
+        self._horizon = session.get_outputs()[0].shape[-1]
+
+    @classmethod
+    def from_file(cls, path: str) -> "OnnxPredictorModel":
+        return cls(_session(path), path, os.path.getsize(path))
+
+    @classmethod
+    def from_numpy_model(cls, model, source: str = "<memory>") -> "OnnxPredictorModel":
+        serialized = build_predictor_graph(model).SerializeToString()
+        return cls(_session(serialized), source, len(serialized))
+
+    @property
+    def output_shape(self) -> tuple:
+        return (None, self._horizon)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[..., np.newaxis]
+        return self._session.run(None, {self._input_name: x})[0]
+
+
+def load_model(model_path: str) -> OnnxPredictorModel:
+    """
+    Drop-in replacement for keras.models.load_model: given the .h5 path, loads the
+    exported .onnx next to it (the .int8.onnx one when AURA_ONNX_QUANTIZED=1).
+    Without an export the graph is built in memory from the .h5 weights.
+    """
+    onnx_path = onnx_path_for(model_path, ONNX_QUANTIZED)
+    if os.path.exists(onnx_path):
+        return OnnxPredictorModel.from_file(onnx_path)
+    if ONNX_QUANTIZED and os.path.exists(onnx_path_for(model_path)):
+        print(f"[ONNX] No quantized export for {model_path}, using the float32 one.")
+        return OnnxPredictorModel.from_file(onnx_path_for(model_path))
+
+    from numpy_inference import NumpyLSTMModel
+    print(f"[ONNX] No export for {model_path}, converting the .h5 weights in memory.")
+    return OnnxPredictorModel.from_numpy_model(NumpyLSTMModel.from_h5(model_path), source=model_path)
+
+
+class SharedOnnxGraph:
+    """
+    One ONNX session per (horizon, activations) with the weights as inputs,
+    shared by every personalized user - the ONNX counterpart of SharedKerasGraph.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session_for(self, model):
+        key = (model.dense_kernel.shape[1], model.activation_name, model.recurrent_activation_name)
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = _session(build_predictor_graph(model, weights_as_inputs=True).SerializeToString())
+                    self._sessions[key] = session
+        return session
+
+    def predict(self, model, feeds: dict, x: np.ndarray) -> np.ndarray:
+        """`model` supplies the graph shape, `feeds` are its predictor_weight_arrays()."""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[..., np.newaxis]
+        return self._session_for(model).run(None, {"window": x, **feeds})[0]
+
+
+SHARED_ONNX_GRAPH = SharedOnnxGraph()
+
+
+# ============================================================================
+# DQN POLICY
+# ============================================================================
+
+class OnnxQPolicy:
+    """
+    Greedy policy over the exported DQN Q-network.
+    `predict` mirrors stable_baselines3's DQN.predict(obs, deterministic=True).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._session = _session(path)
+        self._input_name = self._session.get_inputs()[0].name
+
+    def q_values(self, observation: np.ndarray) -> np.ndarray:
+        obs = np.asarray(observation, dtype=np.float32)
+        if obs.ndim == 1:
+            obs = obs[np.newaxis, :]
+        return self._session.run(None, {self._input_name: obs})[0]
+
+    def predict(self, observation: np.ndarray, deterministic: bool = True) -> tuple:
+        single = np.asarray(observation).ndim == 1
+        actions = np.argmax(self.q_values(observation), axis=1)
+        return (actions[0] if single else actions), None
+
+
+def load_dqn_policy(zip_path: str) -> OnnxQPolicy:
+    """Loads the ONNX export of a stable_baselines3 DQN agent saved at zip_path."""
+    onnx_path = onnx_path_for(zip_path, ONNX_QUANTIZED)
+    if not os.path.exists(onnx_path) and ONNX_QUANTIZED:
+        print(f"[ONNX] No quantized export for {zip_path}, using the float32 one.")
+        onnx_path = onnx_path_for(zip_path)
+    if not os.path.exists(onnx_path):
+        raise FileNotFoundError(f"{onnx_path} not found. Run: python onnx_export.py --dqn")
+    return OnnxQPolicy(onnx_path)
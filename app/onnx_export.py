@@ -0,0 +1,101 @@
+# file: onnx_export.py
+# Exports Aura's networks to ONNX for the onnx_backend runtime
+#
+#   python onnx_export.py             # default + per-user predictors and the DQN policy
+#   python onnx_export.py --quantize  # also write int8 dynamically-quantized copies
+#
+# The predictors are converted from their .h5 weights (via numpy_inference, no
+# TensorFlow needed). The DQN Q-network is traced with torch.onnx.export.
+
+import argparse
+import os
+import re
+
+from config import BASE_DIR, MODEL_PATH
+from onnx_backend import OPSET, build_predictor_graph, onnx_path_for
+
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+DQN_PATH = os.path.join(MODELS_DIR, 'aura_dqn_agent.zip')
+
+
+def quantize_model(onnx_path: str) -> str:
+    """Writes an int8 dynamically-quantized copy (weights int8, activations quantized at run time)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    base = onnx_path[:-len(".onnx")] if onnx_path.endswith(".onnx") else onnx_path
+    quantized_path = base + ".int8.onnx"
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+    print(f"[Export] {quantized_path} ({os.path.getsize(quantized_path)} bytes)")
+    return quantized_path
+
+
+def export_predictor(h5_path: str, quantize: bool = False) -> str:
+    """glucose_predictor*.h5 -> .onnx next to it (and .int8.onnx with quantize)."""
+    import onnx
+    from numpy_inference import NumpyLSTMModel
+
+    onnx_path = onnx_path_for(h5_path)
+    onnx_model = build_predictor_graph(NumpyLSTMModel.from_h5(h5_path))
+    onnx.checker.check_model(onnx_model)
+    onnx.save(onnx_model, onnx_path)
+    print(f"[Export] {onnx_path} ({os.path.getsize(onnx_path)} bytes)")
+    if quantize:
+        quantize_model(onnx_path)
+    return onnx_path
+
+
+def export_dqn_policy(zip_path: str = DQN_PATH, quantize: bool = False) -> str:
+    """Exports the DQN agent's Q-network: observation (batch, 5) -> q_values (batch, n_actions)."""
+    import torch
+    from stable_baselines3 import DQN
+
+    agent = DQN.load(zip_path, device="cpu")
+    q_net = agent.policy.q_net.eval()
+    dummy = torch.zeros((1,) + agent.observation_space.shape, dtype=torch.float32)
+
+    onnx_path = onnx_path_for(zip_path)
+    with torch.no_grad():
+        torch.onnx.export(
+            q_net, dummy, onnx_path,
+            input_names=["observation"], output_names=["q_values"],
+            dynamic_axes={"observation": {0: "batch"}, "q_values": {0: "batch"}},
+            opset_version=OPSET
+        )
+    print(f"[Export] {onnx_path} ({os.path.getsize(onnx_path)} bytes)")
+    if quantize:
+        quantize_model(onnx_path)
+    return onnx_path
+
+
+def export_all(quantize: bool = False, predictors: bool = True, dqn: bool = True) -> list:
+    """
+    Exports the default predictor, every glucose_predictor_user_<id>.h5 and the DQN agent.
+    Users in the personalization store need no export: they run on one shared ONNX graph.
+    """
+    exported = []
+    if predictors:
+        paths = [MODEL_PATH] + [
+            os.path.join(MODELS_DIR, name) for name in sorted(os.listdir(MODELS_DIR))
+            if re.match(r"glucose_predictor_user_\d+\.h5$", name)
+        ]
+        for path in paths:
+            try:
+                exported.append(export_predictor(path, quantize))
+            except Exception as e:
+                print(f"[Export] Skipping {path}: {e}")
+    if dqn:
+        try:
+            exported.append(export_dqn_policy(DQN_PATH, quantize))
+        except Exception as e:
+            print(f"[Export] Skipping {DQN_PATH}: {e}")
+    return exported
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export Aura models to ONNX")
+    parser.add_argument('--quantize', action='store_true', help="Also write int8 dynamically-quantized models")
+    parser.add_argument('--predictors', action='store_true', help="Only export the glucose predictors")
+    parser.add_argument('--dqn', action='store_true', help="Only export the DQN policy")
+    args = parser.parse_args()
+    both = not (args.predictors or args.dqn)
+    export_all(args.quantize, predictors=both or args.predictors, dqn=both or args.dqn)
@@ -0,0 +1,352 @@
+# file: personalization_store.py
+# Compact per-user weight store for personalized glucose predictors
+#
+# Every personalized model has the same LSTM(16) -> Dense(horizon) architecture,
+# so instead of one Keras model object per user we keep each user's weights and
+# MinMaxScaler min/scale as a single float32 row in a memory-mapped shard file.
+# Inference runs through one shared graph with the user's weights swapped in.
+
+import os
+import json
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows: the per-process lock is all there is
+    fcntl = None
+
+from config import BASE_DIR, PREDICTION_BACKEND
+
+STORE_DIR = os.getenv("AURA_PERSONALIZATION_DIR", os.path.join(BASE_DIR, 'models', 'personalized'))
+STORE_SHARDS = int(os.getenv("AURA_PERSONALIZATION_SHARDS", "16"))
+PERSONALIZATION_STORE_ENABLED = os.getenv("AURA_PERSONALIZATION_STORE", "1") == "1"
+
+# Base architecture shared by all personalized models
+LSTM_UNITS = 16
+N_FEATURES = 1
+MAX_HORIZON = 12
+
+
+_ROW_SHAPES = [
+    ("kernel", (N_FEATURES, 4 * LSTM_UNITS)),
+    ("recurrent_kernel", (LSTM_UNITS, 4 * LSTM_UNITS)),
+    ("bias", (4 * LSTM_UNITS,)),
+    ("dense_kernel", (LSTM_UNITS, MAX_HORIZON)),
+    ("dense_bias", (MAX_HORIZON,)),
+    ("scaler_min", (1,)),
+    ("scaler_scale", (1,)),
+]
+
+
+def _row_offsets() -> tuple:
+    offsets = {}
+    cursor = 1  # column 0 holds the horizon
+    for name, shape in _ROW_SHAPES:
+        size = int(np.prod(shape))
+        offsets[name] = (cursor, cursor + size, shape)
+        cursor += size
+    return offsets, cursor
+
+
+class WeightLayout:
+    """
+    Column layout of one row:
+    [horizon | kernel | recurrent_kernel | bias | dense_kernel (padded to MAX_HORIZON) | dense_bias (padded) | scaler_min | scaler_scale]
+    """
+    OFFSETS, WIDTH = _row_offsets()
+
+    @classmethod
+    def pack(cls, weights: list, scaler_min: float, scaler_scale: float) -> np.ndarray:
+        kernel, recurrent_kernel, bias, dense_kernel, dense_bias = [np.asarray(w, dtype=np.float32) for w in weights]
+        horizon = dense_kernel.shape[1]
+        if recurrent_kernel.shape != (LSTM_UNITS, 4 * LSTM_UNITS) or horizon > MAX_HORIZON:
+            raise ValueError(
+                f"Weights do not match the shared LSTM({LSTM_UNITS}) -> Dense(<= {MAX_HORIZON}) architecture"
+            )
+        padded_kernel = np.zeros((LSTM_UNITS, MAX_HORIZON), dtype=np.float32)
+        padded_kernel[:, :horizon] = dense_kernel
+        padded_bias = np.zeros((MAX_HORIZON,), dtype=np.float32)
+        padded_bias[:horizon] = dense_bias
+
+        row = np.empty((cls.WIDTH,), dtype=np.float32)
+        row[0] = horizon
+        values = {
+            "kernel": kernel, "recurrent_kernel": recurrent_kernel, "bias": bias,
+            "dense_kernel": padded_kernel, "dense_bias": padded_bias,
+            "scaler_min": np.float32(scaler_min), "scaler_scale": np.float32(scaler_scale)
+        }
+        for name, (start, end, _shape) in cls.OFFSETS.items():
+            row[start:end] = np.ravel(values[name])
+        return row
+
+    @classmethod
+    def unpack(cls, row: np.ndarray) -> tuple:
+        """Returns (weights in Keras order, scaler_min, scaler_scale); arrays are views into the row."""
+        horizon = int(row[0])
+        parts = {name: row[start:end].reshape(shape) for name, (start, end, shape) in cls.OFFSETS.items()}
+        weights = [
+            parts["kernel"], parts["recurrent_kernel"], parts["bias"],
+            parts["dense_kernel"][:, :horizon], parts["dense_bias"][:horizon]
+        ]
+        return weights, float(parts["scaler_min"][0]), float(parts["scaler_scale"][0])
+
+
+class ArrayScaler:
+    """Minimal MinMaxScaler replacement rebuilt from the stored min_/scale_ arrays."""
+
+    def __init__(self, min_: float, scale_: float):
+        self.min_ = np.array([min_], dtype=np.float64)
+        self.scale_ = np.array([scale_], dtype=np.float64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.min_.nbytes + self.scale_.nbytes
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.min_) / self.scale_
+
+
+class PersonalizationStore:
+    """
+    Sharded, memory-mapped store of personalized weights.
+    Shard k holds users with user_id % STORE_SHARDS == k as rows of shard_k.npy,
+    with shard_k.json mapping user_id -> row. Writes replace the shard file
+    atomically, so readers (including other worker processes) keep a valid mapping.
+    """
+
+    def __init__(self, directory: str = STORE_DIR, shards: int = STORE_SHARDS):
+        self.directory = directory
+        self.shards = max(1, shards)
+        self._lock = threading.Lock()
+        self._open = {}  # shard -> (mtime, memmap array, index dict)
+
+    def _paths(self, shard: int) -> tuple:
+        base = os.path.join(self.directory, f"shard_{shard:03d}")
+        return base + ".npy", base + ".json"
+
+    @contextmanager
+    def _shard_lock(self, shard: int, exclusive: bool):
+        """
+        flock on the shard's lock file, so processes sharing the directory never
+        see (or write) a data file and an index from different versions.
+        """
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"shard_{shard:03d}")
+        with open(base + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load_shard(self, shard: int, locked: bool = False) -> tuple:
+        """
+        Returns (memmap, index) for a shard, re-opening it if another process rewrote it.
+        locked=True when the caller already holds the shard's file lock.
+        """
+        data_path, index_path = self._paths(shard)
+        if not os.path.exists(index_path):
+            return None, {}
+        mtime = os.stat(index_path).st_mtime_ns
+        cached = self._open.get(shard)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+        if not locked:
+            with self._shard_lock(shard, exclusive=False):
+                return self._load_shard(shard, locked=True)
+        mtime = os.stat(index_path).st_mtime_ns
+        with open(index_path) as f:
+            index = {int(k): v for k, v in json.load(f).items()}
+        array = np.load(data_path, mmap_mode='r')
+        self._open[shard] = (mtime, array, index)
+        return array, index
+
+    def _write_temp(self, suffix: str, write) -> str:
+        """Writes a uniquely named temp file in the store directory and returns its path"""
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=suffix, delete=False) as f:
+            write(f)
+        return f.name
+
+    def has(self, user_id: int) -> bool:
+        with self._lock:
+            _, index = self._load_shard(int(user_id) % self.shards)
+            return int(user_id) in index
+
+    def version(self, user_id: int):
+        """
+        Modification stamp of the user's shard index, or None if they have no
+        personalized weights. Changes whenever any process rewrites the shard.
+        """
+        with self._lock:
+            shard = int(user_id) % self.shards
+            _, index = self._load_shard(shard)
+            if int(user_id) not in index:
+                return None
+            return self._open[shard][0]
+
+    def get(self, user_id: int):
+        """Returns (weights, ArrayScaler) for a user, or None if they have no personalized weights."""
+        with self._lock:
+            array, index = self._load_shard(int(user_id) % self.shards)
+            row = index.get(int(user_id))
+            if array is None or row is None:
+                return None
+            weights, scaler_min, scaler_scale = WeightLayout.unpack(array[row])
+        return weights, ArrayScaler(scaler_min, scaler_scale)
+
+    def put(self, user_id: int, weights: list, scaler) -> None:
+        """Stores (or replaces) a user's weights and fitted MinMaxScaler."""
+        row = WeightLayout.pack(weights, float(np.ravel(scaler.min_)[0]), float(np.ravel(scaler.scale_)[0]))
+        shard = int(user_id) % self.shards
+        data_path, index_path = self._paths(shard)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # The file lock makes the read-modify-replace atomic across processes, so
+        # writers of the same shard can't drop each other's rows
+        with self._lock, self._shard_lock(shard, exclusive=True):
+            self._open.pop(shard, None)
+            array, index = self._load_shard(shard, locked=True)
+            index = dict(index)
+            rows = np.array(array) if array is not None else np.empty((0, WeightLayout.WIDTH), dtype=np.float32)
+            if int(user_id) in index:
+                rows[index[int(user_id)]] = row
+            else:
+                index[int(user_id)] = len(rows)
+                rows = np.vstack([rows, row[np.newaxis, :]])
+
+            # Write to temp files then swap them in atomically
+            data_tmp = self._write_temp(".npy", lambda f: np.save(f, rows))
+            index_tmp = self._write_temp(".json", lambda f: f.write(
+                json.dumps({str(k): v for k, v in index.items()}).encode("utf-8")
+            ))
+            os.replace(data_tmp, data_path)
+            os.replace(index_tmp, index_path)
+            self._open.pop(shard, None)
+        print(f"[Personalization] Stored weights for user {user_id} in shard {shard} ({row.nbytes} bytes)")
+
+    def stats(self) -> dict:
+        users = 0
+        size = 0
+        with self._lock:
+            for shard in range(self.shards):
+                array, index = self._load_shard(shard)
+                users += len(index)
+                size += array.nbytes if array is not None else 0
+        return {"users": users, "shards": self.shards, "bytes_on_disk": size, "bytes_per_user": WeightLayout.WIDTH * 4}
+
+
+# ============================================================================
+# SHARED GRAPH INFERENCE
+# ============================================================================
+
+class SharedKerasGraph:
+    """
+    One Keras LSTM -> Dense graph per horizon, shared by every personalized user.
+    A user's weights are swapped in right before their forward pass.
+    """
+
+    def __init__(self):
+        self._graphs = {}
+        self._lock = threading.Lock()
+
+    def _graph_for(self, horizon: int):
+        graph = self._graphs.get(horizon)
+        if graph is None:
+            from keras.models import Sequential
+            from keras.layers import LSTM, Dense, Input
+            graph = Sequential([Input((None, N_FEATURES)), LSTM(LSTM_UNITS), Dense(horizon)])
+            self._graphs[horizon] = graph
+        return graph
+
+    def predict(self, weights: list, x: np.ndarray) -> np.ndarray:
+        horizon = weights[3].shape[1]
+        with self._lock:
+            graph = self._graph_for(horizon)
+            graph.set_weights(weights)
+            return np.asarray(graph.predict(x, verbose=0))
+
+
+SHARED_KERAS_GRAPH = SharedKerasGraph()
+
+
+class PersonalizedModel:
+    """
+    Keras-compatible predictor view over a user's stored weights.
+    Costs only the weight views (a few KB); the graph itself is shared.
+    """
+
+    def __init__(self, weights: list):
+        self.weights = weights
+        self._numpy_model = None
+        self._onnx_feeds = None
+        if PREDICTION_BACKEND in ("numpy", "onnx"):
+            from numpy_inference import NumpyLSTMModel
+            self._numpy_model = NumpyLSTMModel(*weights)
+        if PREDICTION_BACKEND == "onnx":
+            from onnx_backend import predictor_weight_arrays
+            self._onnx_feeds = predictor_weight_arrays(weights)
+
+    @property
+    def output_shape(self) -> tuple:
+        return (None, self.weights[3].shape[1])
+
+    @property
+    def numpy_model(self):
+        """The NumPy runtime over these weights (None with the Keras backend; also used for streaming with ONNX)"""
+        return self._numpy_model
+
+    @property
+    def nbytes(self) -> int:
+        feeds = sum(a.nbytes for a in self._onnx_feeds.values()) if self._onnx_feeds else 0
+        return sum(w.nbytes for w in self.weights) + feeds
+
+    def get_weights(self) -> list:
+        return list(self.weights)
+
+    def predict(self, x: np.ndarray, verbose: int = 0) -> np.ndarray:
+        if self._onnx_feeds is not None:
+            from onnx_backend import SHARED_ONNX_GRAPH
+            return SHARED_ONNX_GRAPH.predict(self._numpy_model, self._onnx_feeds, x)
+        if self._numpy_model is not None:
+            return self._numpy_model.predict(x)
+        return SHARED_KERAS_GRAPH.predict(self.weights, x)
+
+
+PERSONALIZATION_STORE = PersonalizationStore()
+
+
+def import_h5_models(models_dir: str = os.path.join(BASE_DIR, 'models')) -> int:
+    """Migrates existing glucose_predictor_user_<id>.h5 / scaler_user_<id>.gz pairs into the store."""
+    import re
+    import joblib
+    from numpy_inference import NumpyLSTMModel
+
+    imported = 0
+    for filename in sorted(os.listdir(models_dir)):
+        match = re.match(r"glucose_predictor_user_(\d+)\.h5$", filename)
+        if not match:
+            continue
+        user_id = int(match.group(1))
+        scaler_path = os.path.join(models_dir, f"scaler_user_{user_id}.gz")
+        if not os.path.exists(scaler_path):
+            continue
+        try:
+            model = NumpyLSTMModel.from_h5(os.path.join(models_dir, filename))
+            PERSONALIZATION_STORE.put(user_id, model.get_weights(), joblib.load(scaler_path))
+            imported += 1
+        except Exception as e:
+            print(f"[Personalization] Skipping {filename}: {e}")
+    return imported
+
+
+if __name__ == '__main__':
+    print(f"Imported {import_h5_models()} personalized models into {STORE_DIR}")
@@ -0,0 +1,142 @@
+# file: prediction_pipeline.py
+# Ingest-driven forecast precomputation
+#
+# When a glucose reading lands (cache_service.on_new_glucose_reading), the next
+# hour is forecast in the background: the result is cached against that reading,
+# proactive alerts are checked and the forecast is pushed over WebSocket. Chat
+# and dashboard reads then find the forecast in the cache instead of running
+# the model on the request thread.
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database as db
+from cache_service import cache, register_glucose_reading_listener
+
+PIPELINE_ENABLED = os.getenv("AURA_PREDICTION_PIPELINE", "1") == "1"
+PIPELINE_WORKERS = int(os.getenv("AURA_PREDICTION_PIPELINE_WORKERS", "2"))
+# Readings older than this are not used as forecast input
+HISTORY_HOURS = int(os.getenv("AURA_PREDICTION_PIPELINE_HISTORY_HOURS", "3"))
+# How long a skipped forecast (too few readings) stops cache misses from rescheduling it.
+# The next reading clears it sooner.
+SKIP_TTL_S = int(os.getenv("AURA_PREDICTION_PIPELINE_SKIP_TTL_S", "300"))
+LOOK_BACK = 12
+
+# Per-user job states
+_QUEUED = "queued"
+_RUNNING = "running"
+_RERUN = "rerun"  # running, and another reading arrived meanwhile
+
+
+class PredictionPipeline:
+    """
+    Background forecast jobs, coalesced per user: a burst of readings for one
+    user results in at most one queued job plus one follow-up run that sees
+    the newest reading, never one job per reading.
+    """
+
+    def __init__(self, workers: int = PIPELINE_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="aura-precompute")
+        self._lock = threading.Lock()
+        self._jobs = {}  # user_id -> job state
+        self._stats = {"requests": 0, "coalesced": 0, "runs": 0, "skipped": 0, "skip_cached": 0, "errors": 0,
+                       "published": 0}
+
+    def schedule(self, user_id: int) -> bool:
+        """Queues a forecast for user_id. Returns False if it was folded into a pending job."""
+        user_id = int(user_id)
+        with self._lock:
+            self._stats["requests"] += 1
+            state = self._jobs.get(user_id)
+            if state in (_QUEUED, _RERUN):
+                self._stats["coalesced"] += 1
+                return False
+            if state == _RUNNING:
+                self._jobs[user_id] = _RERUN
+                self._stats["coalesced"] += 1
+                return False
+            self._jobs[user_id] = _QUEUED
+        self._executor.submit(self._run, user_id)
+        return True
+
+    def _run(self, user_id: int):
+        while True:
+            with self._lock:
+                self._jobs[user_id] = _RUNNING
+                self._stats["runs"] += 1
+            try:
+                self.precompute(user_id)
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                print(f"[Pipeline] Forecast for user {user_id} failed: {e}")
+            with self._lock:
+                if self._jobs.get(user_id) != _RERUN:
+                    self._jobs.pop(user_id, None)
+                    return
+
+    def precompute(self, user_id: int):
+        """Forecasts from the latest readings, caches, checks alerts and broadcasts."""
+        from inference_pool import submit_prediction
+        from websocket_service import broadcast_prediction_update, check_and_send_proactive_alerts
+
+        readings = db.get_glucose_readings_with_timestamps(user_id, hours=HISTORY_HOURS)
+        if len(readings) < LOOK_BACK:
+            with self._lock:
+                self._stats["skipped"] += 1
+            cache.mark_latest_prediction_skipped(user_id, f"only {len(readings)} recent readings", SKIP_TTL_S)
+            print(f"[Pipeline] Only {len(readings)} recent readings for user {user_id}, skipping forecast.")
+            return
+
+        history = [r['glucose_value'] for r in readings[-LOOK_BACK:]]
+        latest = readings[-1]
+        prediction = submit_prediction(user_id, history).result()
+        if prediction.get("status") == "error":
+            raise RuntimeError(prediction.get("error_message", "prediction failed"))
+
+        cache.set_latest_prediction(user_id, latest, prediction)
+        check_and_send_proactive_alerts(user_id, prediction, history[-1])
+        broadcast_prediction_update(user_id, prediction)
+        with self._lock:
+            self._stats["published"] += 1
+        print(f"[Pipeline] Precomputed forecast for user {user_id} from reading at {latest['timestamp']}")
+
+    def count_skip_cached(self):
+        with self._lock:
+            self._stats["skip_cached"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "pending_users": len(self._jobs), "workers": self.workers}
+
+
+PREDICTION_PIPELINE = PredictionPipeline()
+
+
+def _on_glucose_reading(user_id: int, glucose_value: float = None, timestamp=None):
+    PREDICTION_PIPELINE.schedule(user_id)
+
+
+if PIPELINE_ENABLED:
+    register_glucose_reading_listener(_on_glucose_reading)
+
+
+def get_latest_prediction(user_id: int) -> dict:
+    """
+    The precomputed forecast for a user, or None. Schedules a computation on a
+    miss (e.g. the cache expired, or the pipeline started after the last reading),
+    unless the last run was skipped and no reading has arrived since.
+    """
+    cached = cache.get_latest_prediction(user_id)
+    if cached is None and PIPELINE_ENABLED:
+        if cache.get_latest_prediction_skipped(user_id) is not None:
+            PREDICTION_PIPELINE.count_skip_cached()
+        else:
+            PREDICTION_PIPELINE.schedule(user_id)
+    return cached
+
+
+def get_pipeline_stats() -> dict:
+    return {"enabled": PIPELINE_ENABLED, **PREDICTION_PIPELINE.stats()}
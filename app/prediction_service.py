@@ -1,21 +1,27 @@
 # file: prediction_service.py (Upgraded for Personalization + Caching + Circadian Awareness)
 
 import os
+import sys
+import time
+import threading
 import numpy as np
 import joblib
-from keras.models import load_model
 from scipy import stats
 import warnings
+from collections import OrderedDict
 from datetime import datetime
 
 warnings.filterwarnings('ignore', category=UserWarning, module='keras')
 warnings.filterwarnings('ignore', category=FutureWarning, module='keras')
 
-from config import BASE_DIR
+from config import BASE_DIR, PREDICTION_BACKEND
+from model_cache import ModelCache
+from startup import LazyComponent, timed
+from personalization_store import PERSONALIZATION_STORE, PERSONALIZATION_STORE_ENABLED, PersonalizedModel
 
 # Import caching and analytics services
 try:
-    from cache_service import cache, cached_prediction
+    from cache_service import cache, cached_prediction, register_glucose_reading_listener
     CACHING_ENABLED = True
     print("[Predictor] Redis caching enabled.")
 except ImportError:
@@ -32,13 +38,38 @@ except ImportError:
 
 # --- UPGRADED DYNAMIC MODEL LOADING & CACHING SYSTEM ---
 # We no longer load one model. We create a cache to hold multiple models.
-MODEL_CACHE = {}
-SCALER_CACHE = {}
+# The cache is LRU-bounded by entry count and resident size; the default model is pinned.
+MODEL_CACHE_MAX_ENTRIES = int(os.getenv("AURA_MODEL_CACHE_MAX_ENTRIES", "32"))
+MODEL_CACHE_MAX_MB = float(os.getenv("AURA_MODEL_CACHE_MAX_MB", "512"))
+MODEL_CACHE = ModelCache(max_entries=MODEL_CACHE_MAX_ENTRIES, max_bytes=int(MODEL_CACHE_MAX_MB * 1024 * 1024))
 DEFAULT_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'glucose_predictor.h5')
 DEFAULT_SCALER_PATH = os.path.join(BASE_DIR, 'models', 'scaler.gz')
 
 # This is a global variable to match the training configuration
 LOOK_BACK = 12
+PREDICTION_STEPS = 12  # 12 x 5-minute intervals = 1 hour horizon
+
+# Micro-batching configuration (requests sharing a model are stacked into one forward pass)
+INFERENCE_BATCHING_ENABLED = os.getenv("AURA_INFERENCE_BATCHING", "1") == "1"
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("AURA_INFERENCE_MAX_BATCH_SIZE", "32"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("AURA_INFERENCE_MAX_WAIT_MS", "5"))
+
+def load_model(model_path: str):
+    """
+    Loads a predictor file with the configured backend (config.PREDICTION_BACKEND).
+    Keras/TensorFlow is only imported when the Keras backend is selected.
+    """
+    if PREDICTION_BACKEND == "numpy":
+        from numpy_inference import load_model as load_numpy_model
+        return load_numpy_model(model_path)
+    if PREDICTION_BACKEND == "onnx":
+        from onnx_backend import load_model as load_onnx_model
+        return load_onnx_model(model_path)
+    if "keras.models" not in sys.modules:
+        with timed("keras"):
+            import keras.models
+    from keras.models import load_model as load_keras_model
+    return load_keras_model(model_path)
 
 def get_model_for_user(user_id: int):
     """
@@ -46,6 +77,16 @@ def get_model_for_user(user_id: int):
     If a personalized model doesn't exist, it loads and caches the default model.
     This is the core of the fine-tuning feature.
     """
+    # Personalized weights in the shared-graph store take priority over per-user .h5 files.
+    # Entries are versioned by what they were loaded from: calibration only evicts the
+    # Flask process's cache, and inference workers must see the new weights too.
+    if PERSONALIZATION_STORE_ENABLED:
+        store_version = PERSONALIZATION_STORE.version(user_id)
+        if store_version is not None:
+            return MODEL_CACHE.get_or_load(
+                f"store:{user_id}", lambda: _load_personalized(user_id), version=store_version
+            )
+
     user_model_path = os.path.join(BASE_DIR, 'models', f'glucose_predictor_user_{user_id}.h5')
     user_scaler_path = os.path.join(BASE_DIR, 'models', f'scaler_user_{user_id}.gz')
     
@@ -60,30 +101,427 @@ def get_model_for_user(user_id: int):
         model_path_to_load = DEFAULT_MODEL_PATH
         scaler_path_to_load = DEFAULT_SCALER_PATH
         
-    # Check our cache first to avoid slow disk reads on every request
-    if model_path_to_load in MODEL_CACHE:
-        # The model is already in memory, just return it.
-        return MODEL_CACHE[model_path_to_load], SCALER_CACHE[scaler_path_to_load]
-    else:
-        # Model is not in memory, so we load it from the disk.
-        print(f"--- [Predictor] Loading model into cache: {model_path_to_load} ---")
-        try:
+    # Check our cache first to avoid slow disk reads on every request.
+    # Concurrent misses for the same file share a single load.
+    def _load_pair():
+        print(f"--- [Predictor] Loading model into cache ({PREDICTION_BACKEND} backend): {model_path_to_load} ---")
+        with timed(f"predictor {os.path.basename(model_path_to_load)}", kind="model_load"):
             model = load_model(model_path_to_load)
             scaler = joblib.load(scaler_path_to_load)
-            
-            # Store the loaded models in our cache for next time
-            MODEL_CACHE[model_path_to_load] = model
-            SCALER_CACHE[scaler_path_to_load] = scaler
-            
-            return model, scaler
+        
+        # Multi-horizon models emit the whole forecast in one pass; legacy .h5 files emit one step
+        if is_direct_forecast_model(model):
+            print(f"--- [Predictor] Model emits a {get_forecast_horizon(model)}-step horizon (direct forecasting). ---")
+        else:
+            print(f"--- [Predictor] Single-output model, using recursive forecasting. ---")
+        return model, scaler
+
+    try:
+        file_version = (os.stat(model_path_to_load).st_mtime_ns, os.stat(scaler_path_to_load).st_mtime_ns)
+        return MODEL_CACHE.get_or_load(
+            model_path_to_load, _load_pair, pin=(model_path_to_load == DEFAULT_MODEL_PATH), version=file_version
+        )
+    except Exception as e:
+        print(f"--- [Predictor] FATAL ERROR: Could not load model file {model_path_to_load}. Error: {e} ---")
+        # If the default model fails to load, the system can't make predictions.
+        if model_path_to_load == DEFAULT_MODEL_PATH:
+             raise IOError(f"Default model '{DEFAULT_MODEL_PATH}' is missing or corrupted.")
+        # If a user model fails, fall back to default
+        else:
+             return get_model_for_user(0) # Use a generic ID to get the default model
+
+def _load_personalized(user_id: int):
+    """Builds a lightweight model view (weights only, shared graph) from the personalization store."""
+    print(f"--- [Predictor] Loading personalized weights for user {user_id} from the store. ---")
+    weights, scaler = PERSONALIZATION_STORE.get(user_id)
+    return PersonalizedModel(weights), scaler
+
+# Lets the startup warmup thread load (and pin) the default model before the first request needs it
+DEFAULT_MODEL_WARMUP = LazyComponent("default glucose predictor", lambda: get_model_for_user(0), kind="warmup")
+
+def evict_user_model(user_id: int) -> bool:
+    """Drops a user's personalized model from the cache so the next request loads the new weights."""
+    user_model_path = os.path.join(BASE_DIR, 'models', f'glucose_predictor_user_{user_id}.h5')
+    evicted_file = MODEL_CACHE.invalidate(user_model_path)
+    evicted_store = MODEL_CACHE.invalidate(f"store:{user_id}")
+    drop_streaming_state(user_id)
+    return evicted_file or evicted_store
+
+def get_model_cache_stats() -> dict:
+    """Hit/miss/eviction counts and resident size of the model cache"""
+    stats = MODEL_CACHE.stats()
+    if PERSONALIZATION_STORE_ENABLED:
+        stats["personalization_store"] = PERSONALIZATION_STORE.stats()
+    return stats
+
+# --- MICRO-BATCHED INFERENCE ENGINE ---
+# Concurrent /api/chat requests used to run their own batch-of-1 forward pass each.
+# The engine collects requests that share a model for a few milliseconds, stacks
+# their LOOK_BACK windows into one tensor and runs a single forward pass per step
+# (or a single pass in total for multi-horizon models).
+
+def get_forecast_horizon(model) -> int:
+    """Number of future steps a model emits per forward pass (1 for legacy recursive models)."""
+    try:
+        return int(model.output_shape[-1] or 1)
+    except Exception:
+        return 1
+
+
+def is_direct_forecast_model(model, steps: int = PREDICTION_STEPS) -> bool:
+    """True if the model was trained in multi-horizon mode and covers the full forecast horizon."""
+    return get_forecast_horizon(model) >= steps
+
+
+def run_forecast(model, scaled_windows: np.ndarray, steps: int = PREDICTION_STEPS) -> np.ndarray:
+    """
+    Forecasts `steps` values for a batch of scaled windows, picking the
+    single-shot path for multi-horizon models and the recursive loop otherwise.
+    """
+    if is_direct_forecast_model(model, steps):
+        windows = np.asarray(scaled_windows, dtype=np.float32)
+        outputs = np.asarray(model.predict(windows, verbose=0)).reshape(windows.shape[0], -1)
+        return outputs[:, :steps]
+    return run_recursive_forecast(model, scaled_windows, steps)
+
+
+def run_recursive_forecast(model, scaled_windows: np.ndarray, steps: int = PREDICTION_STEPS) -> np.ndarray:
+    """
+    Runs the autoregressive forecast for a whole batch of scaled windows.
+
+    Args:
+        model: Any model exposing a Keras-style `predict(x, verbose=0)`
+        scaled_windows: Array of shape (batch, LOOK_BACK, 1) in scaler space
+        steps: Number of 5-minute steps to forecast
+
+    Returns:
+        Array of shape (batch, steps) with scaled predictions
+    """
+    current_sequence = np.asarray(scaled_windows, dtype=np.float32)
+    batch_size = current_sequence.shape[0]
+    predictions = np.empty((batch_size, steps), dtype=np.float32)
+
+    for step in range(steps):
+        pred_scaled = np.asarray(model.predict(current_sequence, verbose=0)).reshape(batch_size, -1)[:, 0]
+        predictions[:, step] = pred_scaled
+        # Shift every window left by one and append this step's prediction
+        current_sequence = np.concatenate(
+            [current_sequence[:, 1:, :], pred_scaled.reshape(batch_size, 1, 1)], axis=1
+        )
+
+    return predictions
+
+
+class _PendingForecast:
+    """A single caller waiting for its slice of a batched forecast"""
+    __slots__ = ("window", "event", "result", "error", "lead")
+
+    def __init__(self, window: np.ndarray):
+        self.window = window
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.lead = False
+
+
+class BatchInferenceEngine:
+    """
+    Leader/follower micro-batcher for glucose forecasts.
+
+    The first request for a model becomes the batch leader: it waits up to
+    `max_wait_ms` (or until `max_batch_size` requests are queued), runs the
+    stacked forward passes and scatters the results back to the followers.
+    If more requests queued up meanwhile, leadership is handed to the oldest one.
+    """
+
+    OCCUPANCY_HISTORY = 256  # Number of recent batch sizes kept for tuning
+
+    def __init__(self, max_batch_size: int = INFERENCE_MAX_BATCH_SIZE, max_wait_ms: float = INFERENCE_MAX_WAIT_MS):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._cond = threading.Condition()
+        self._queues = {}   # (model id, steps) -> list of _PendingForecast
+        self._models = {}   # (model id, steps) -> model (keeps a reference while queued)
+        self._leading = set()
+        self._stats = {
+            "batches": 0,
+            "requests": 0,
+            "errors": 0,
+            "total_run_ms": 0.0,
+            "recent_batch_sizes": []
+        }
+
+    def forecast(self, model, scaled_window: np.ndarray, steps: int = PREDICTION_STEPS) -> np.ndarray:
+        """Submit one scaled (LOOK_BACK, 1) window and block until its forecast is ready."""
+        key = (id(model), steps)
+        pending = _PendingForecast(np.asarray(scaled_window, dtype=np.float32).reshape(LOOK_BACK, 1))
+
+        with self._cond:
+            queue = self._queues.setdefault(key, [])
+            queue.append(pending)
+            self._models[key] = model
+            if key not in self._leading:
+                self._leading.add(key)
+                pending.lead = True
+            elif len(queue) >= self.max_batch_size:
+                self._cond.notify_all()
+
+        while True:
+            if pending.lead:
+                pending.lead = False
+                self._lead_batch(key, steps)
+            pending.event.wait()
+            if pending.lead:
+                # We were promoted to leader for the next batch, not given a result
+                pending.event.clear()
+                continue
+            break
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _lead_batch(self, key, steps: int):
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            queue = self._queues[key]
+            while len(queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = queue[:self.max_batch_size]
+            del queue[:self.max_batch_size]
+            model = self._models[key]
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            results = run_forecast(model, np.stack([p.window for p in batch]), steps)
+            for i, p in enumerate(batch):
+                p.result = results[i]
         except Exception as e:
-            print(f"--- [Predictor] FATAL ERROR: Could not load model file {model_path_to_load}. Error: {e} ---")
-            # If the default model fails to load, the system can't make predictions.
-            if model_path_to_load == DEFAULT_MODEL_PATH:
-                 raise IOError(f"Default model '{DEFAULT_MODEL_PATH}' is missing or corrupted.")
-            # If a user model fails, fall back to default
+            failed = True
+            for p in batch:
+                p.error = e
+        run_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            self._record_batch(len(batch), run_ms, failed)
+            if queue:
+                # Hand leadership to the oldest waiting request
+                queue[0].lead = True
+                queue[0].event.set()
             else:
-                 return get_model_for_user(0) # Use a generic ID to get the default model
+                self._leading.discard(key)
+                self._queues.pop(key, None)
+                self._models.pop(key, None)
+
+        for p in batch:
+            p.event.set()
+
+    def _record_batch(self, size: int, run_ms: float, failed: bool = False):
+        self._stats["batches"] += 1
+        if failed:
+            self._stats["errors"] += 1
+        self._stats["requests"] += size
+        self._stats["total_run_ms"] += run_ms
+        recent = self._stats["recent_batch_sizes"]
+        recent.append(size)
+        if len(recent) > self.OCCUPANCY_HISTORY:
+            del recent[0]
+
+    def get_stats(self) -> dict:
+        """Per-batch occupancy statistics for tuning max batch size / max wait"""
+        with self._cond:
+            batches = self._stats["batches"]
+            requests = self._stats["requests"]
+            recent = list(self._stats["recent_batch_sizes"])
+            return {
+                "enabled": INFERENCE_BATCHING_ENABLED,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "requests": requests,
+                "errors": self._stats["errors"],
+                "avg_batch_size": round(requests / batches, 2) if batches else 0,
+                "avg_occupancy": round(requests / (batches * self.max_batch_size), 3) if batches else 0,
+                "avg_batch_run_ms": round(self._stats["total_run_ms"] / batches, 2) if batches else 0,
+                "recent_batch_sizes": recent
+            }
+
+
+INFERENCE_ENGINE = BatchInferenceEngine()
+
+
+# --- STATEFUL STREAMING INFERENCE ---
+# With the NumPy runtime we keep each user's LSTM state between readings
+# (see numpy_inference.StreamingLSTMState). A new CGM reading advances it by one
+# step - via the ingest listener, or when a forecast's window has moved on by one
+# reading (inference workers get no ingest events); predictions reuse it as long
+# as it still matches the requested window.
+STREAMING_INFERENCE_ENABLED = os.getenv("AURA_STREAMING_INFERENCE", "1") == "1"
+STREAMING_MAX_GAP_SECONDS = float(os.getenv("AURA_STREAMING_MAX_GAP_SECONDS", "450"))  # 1.5 x the 5-min CGM interval
+# Each stream holds its model, so streams are LRU-bounded and dropped when idle, or they'd keep
+# models evicted from MODEL_CACHE alive. An idle stream would be dropped by its next reading's gap anyway.
+STREAMING_MAX_USERS = int(os.getenv("AURA_STREAMING_MAX_USERS", "1024"))
+STREAMING_IDLE_SECONDS = float(os.getenv("AURA_STREAMING_IDLE_SECONDS", str(STREAMING_MAX_GAP_SECONDS)))
+
+class _UserStream:
+    """Streaming state for one user plus what it was built from"""
+    __slots__ = ("model", "scaler", "state", "values", "last_ts", "last_used", "lock")
+
+    def __init__(self, model, scaler, state, values: list):
+        self.model = model
+        self.scaler = scaler
+        self.state = state
+        self.values = values      # Raw mg/dL readings currently in the window
+        self.last_ts = None       # Epoch seconds of the last ingested reading
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+STREAMING_STATES = OrderedDict()  # user_id -> _UserStream, least recently used first
+_STREAMING_LOCK = threading.Lock()
+_STREAMING_STATS = {"incremental_forecasts": 0, "full_recomputes": 0, "readings_ingested": 0, "invalidations": 0,
+                    "evictions": 0}
+
+
+def _prune_streams_locked():
+    """Drops idle streams, then the least recently used ones beyond STREAMING_MAX_USERS"""
+    now = time.monotonic()
+    while STREAMING_STATES:
+        user_id, stream = next(iter(STREAMING_STATES.items()))
+        if len(STREAMING_STATES) <= STREAMING_MAX_USERS and now - stream.last_used < STREAMING_IDLE_SECONDS:
+            break
+        del STREAMING_STATES[user_id]
+        _STREAMING_STATS["evictions"] += 1
+
+
+def _get_stream(user_id: int):
+    with _STREAMING_LOCK:
+        _prune_streams_locked()
+        stream = STREAMING_STATES.get(user_id)
+        if stream is not None:
+            STREAMING_STATES.move_to_end(user_id)
+            stream.last_used = time.monotonic()
+        return stream
+
+
+def _numpy_runtime(model):
+    """The NumPy LSTM behind a model, if any (streaming needs direct access to the cell step)."""
+    if hasattr(model, "step") and hasattr(model, "head"):
+        return model
+    return getattr(model, "numpy_model", None)
+
+
+def _to_epoch(timestamp):
+    if timestamp is None:
+        return None
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return timestamp.timestamp()
+
+
+def streaming_forecast(user_id: int, model, scaler, history: list, steps: int = PREDICTION_STEPS):
+    """
+    Forecast from the user's cached LSTM state when it matches `history`,
+    otherwise recompute from the full window and keep the new state.
+    Returns None when streaming is unavailable (disabled or Keras backend).
+    """
+    from numpy_inference import StreamingLSTMState
+
+    runtime = _numpy_runtime(model)
+    if not STREAMING_INFERENCE_ENABLED or runtime is None:
+        return None
+
+    window = [float(v) for v in history[-LOOK_BACK:]]
+    stream = _get_stream(user_id)
+
+    if stream is not None and stream.model is model:
+        forecast = None
+        pushed = False
+        with stream.lock:
+            if stream.values != window and stream.values[1:] == window[:-1]:
+                # One reading the ingest listener didn't deliver (inference workers get none): push it here
+                stream.state.push(float(stream.scaler.transform(np.array([[window[-1]]]))[0, 0]))
+                stream.values = window
+                pushed = True
+            if stream.values == window:
+                forecast = stream.state.forecast(steps)
+        if forecast is not None:
+            with _STREAMING_LOCK:
+                if pushed:
+                    _STREAMING_STATS["readings_ingested"] += 1
+                _STREAMING_STATS["incremental_forecasts"] += 1
+            return forecast
+
+    # Full-window recompute (first request, model change, or the state no longer matches)
+    scaled = scaler.transform(np.array(window).reshape(-1, 1)).ravel()
+    stream = _UserStream(model, scaler, StreamingLSTMState(runtime, scaled), window)
+    with _STREAMING_LOCK:
+        STREAMING_STATES[user_id] = stream
+        STREAMING_STATES.move_to_end(user_id)
+        _prune_streams_locked()
+        _STREAMING_STATS["full_recomputes"] += 1
+    with stream.lock:
+        return stream.state.forecast(steps)
+
+
+def advance_streaming_state(user_id: int, glucose_value: float = None, timestamp=None):
+    """
+    Advances a user's streaming state by one reading (registered as an
+    on_new_glucose_reading listener). Gaps, out-of-order readings or unknown
+    values drop the state, so the next forecast does a full-window recompute.
+    """
+    stream = _get_stream(user_id)
+    if stream is None:
+        return
+
+    with stream.lock:
+        ts = _to_epoch(timestamp)
+        gap = (ts - stream.last_ts) if (ts is not None and stream.last_ts is not None) else None
+        if glucose_value is None or (gap is not None and (gap <= 0 or gap > STREAMING_MAX_GAP_SECONDS)):
+            invalidate = True
+        else:
+            invalidate = False
+            scaled = float(stream.scaler.transform(np.array([[float(glucose_value)]]))[0, 0])
+            stream.state.push(scaled)
+            stream.values = stream.values[1:] + [float(glucose_value)]
+            stream.last_ts = ts
+
+    with _STREAMING_LOCK:
+        if invalidate:
+            if STREAMING_STATES.get(user_id) is stream:
+                del STREAMING_STATES[user_id]
+            _STREAMING_STATS["invalidations"] += 1
+        else:
+            _STREAMING_STATS["readings_ingested"] += 1
+
+
+def drop_streaming_state(user_id: int):
+    with _STREAMING_LOCK:
+        STREAMING_STATES.pop(user_id, None)
+
+
+if CACHING_ENABLED:
+    register_glucose_reading_listener(advance_streaming_state)
+
+
+def get_inference_stats() -> dict:
+    """Expose micro-batching and streaming statistics (used by the /api/inference/stats endpoint)"""
+    stats = INFERENCE_ENGINE.get_stats()
+    with _STREAMING_LOCK:
+        _prune_streams_locked()
+        stats["streaming"] = {
+            "enabled": STREAMING_INFERENCE_ENABLED,
+            "active_users": len(STREAMING_STATES),
+            "max_users": STREAMING_MAX_USERS,
+            **_STREAMING_STATS
+        }
+    return stats
+
 
 # --- All functions below are now updated to accept a `user_id` ---
 # (Your existing robust logic remains, but it's now wrapped to use the dynamic model loader)
@@ -133,16 +571,18 @@ def predict_future_glucose(user_id: int, recent_glucose_history: list, include_a
         input_data = np.array(cleaned_history[-LOOK_BACK:]).reshape(-1, 1)
         scaled_input = scaler.transform(input_data)
         
-        predictions = []
-        current_sequence = scaled_input.reshape((1, LOOK_BACK, 1))
+        current_sequence = scaled_input.reshape((LOOK_BACK, 1))
         
-        # Step 4: Generate raw predictions
-        for _ in range(12):
-            pred_scaled = model.predict(current_sequence, verbose=0)
-            pred_glucose = scaler.inverse_transform(pred_scaled)[0][0]
-            predictions.append(pred_glucose)
-            new_sequence = np.append(current_sequence[0][1:], pred_scaled)
-            current_sequence = new_sequence.reshape((1, LOOK_BACK, 1))
+        # Step 4: Generate raw predictions. Prefer the user's streaming LSTM state (NumPy runtime);
+        # otherwise batch with concurrent requests for the same model.
+        pred_scaled = streaming_forecast(user_id, model, scaler, cleaned_history, PREDICTION_STEPS)
+        if pred_scaled is None:
+            if INFERENCE_BATCHING_ENABLED:
+                pred_scaled = INFERENCE_ENGINE.forecast(model, current_sequence, PREDICTION_STEPS)
+            else:
+                pred_scaled = run_forecast(model, current_sequence.reshape((1, LOOK_BACK, 1)), PREDICTION_STEPS)[0]
+        predictions = [float(p) for p in scaler.inverse_transform(pred_scaled.reshape(-1, 1)).ravel()]
+        forecast_mode = "direct" if is_direct_forecast_model(model) else "recursive"
         
         # Step 5: Post-process the predictions
         last_known = cleaned_history[-1]
@@ -151,7 +591,8 @@ def predict_future_glucose(user_id: int, recent_glucose_history: list, include_a
         
         response = {
             "prediction": int_predictions, "status": "success",
-            "last_known_glucose": int(last_known)
+            "last_known_glucose": int(last_known),
+            "forecast_mode": forecast_mode
         }
         
         if include_analysis:
@@ -177,7 +618,7 @@ def generate_hybrid_prediction(user_id: int, recent_glucose_history: list, futur
     """
     # Check cache first if caching is enabled
     if CACHING_ENABLED:
-        cached_result = cache.get_prediction(user_id, recent_glucose_history)
+        cached_result = cache.get_prediction(user_id, recent_glucose_history, future_events)
         if cached_result is not None:
             print(f"--- [Predictor] Returning cached prediction for user {user_id} ---")
             return cached_result
@@ -261,12 +702,13 @@ def generate_hybrid_prediction(user_id: int, recent_glucose_history: list, futur
         "generated_at": datetime.now().isoformat(),
         "circadian_enabled": CIRCADIAN_ENABLED,
         "caching_enabled": CACHING_ENABLED,
+        "inference_backend": PREDICTION_BACKEND,
         "prediction_intervals_minutes": 5,
         "total_horizon_minutes": len(final_predictions) * 5
     }
     
     # Cache the result if caching is enabled
     if CACHING_ENABLED:
-        cache.set_prediction(user_id, recent_glucose_history, baseline_response)
+        cache.set_prediction(user_id, recent_glucose_history, baseline_response, future_events)
 
     return baseline_response
\ No newline at end of file
@@ -1,24 +1,38 @@
 # file: recommendation_service.py
 
 import numpy as np
-from stable_baselines3 import DQN
-import torch
 
 import os
-from config import BASE_DIR
+from config import BASE_DIR, RECOMMENDATION_BACKEND
+from startup import LazyComponent, timed
 
 # --- Configuration & Model Loading ---
 MODEL_PATH = os.path.join(BASE_DIR, 'models', 'aura_dqn_agent.zip')
 DEVICE = "cpu" # We use CPU for inference as it's fast enough and avoids GPU issues locally
 
-print("Loading RL agent for recommendation service...")
-try:
-    # Load the trained agent
-    model = DQN.load(MODEL_PATH, device=DEVICE)
-    print("RL agent loaded successfully.")
-except Exception as e:
-    print(f"FATAL ERROR: Could not load the RL agent model. Error: {e}")
-    model = None
+def _load_rl_agent():
+    # torch + stable_baselines3 take seconds to import, so they load on first use
+    print(f"Loading RL agent for recommendation service ({RECOMMENDATION_BACKEND} backend)...")
+    try:
+        if RECOMMENDATION_BACKEND == "onnx":
+            # Exported Q-network (onnx_export.py); no torch import needed
+            from onnx_backend import load_dqn_policy
+            model = load_dqn_policy(MODEL_PATH)
+        else:
+            with timed("stable_baselines3"):
+                from stable_baselines3 import DQN
+            model = DQN.load(MODEL_PATH, device=DEVICE)
+        print("RL agent loaded successfully.")
+        return model
+    except Exception as e:
+        print(f"FATAL ERROR: Could not load the RL agent model. Error: {e}")
+        return None
+
+RL_AGENT = LazyComponent(f"rl_agent ({RECOMMENDATION_BACKEND})", _load_rl_agent, kind="model_load")
+
+def get_rl_model():
+    """The DQN agent, loaded on first call (None if it could not be loaded)."""
+    return RL_AGENT.get()
 
 # --- The Main API Function ---
 def get_insulin_recommendation(
@@ -36,6 +50,7 @@ def get_insulin_recommendation(
     Returns:
         A dictionary containing the recommendation and supporting information.
     """
+    model = get_rl_model()
     if model is None:
         return {
             "error": "RL model is not loaded. Cannot provide recommendation."
@@ -1,27 +1,23 @@
 import random
-import psycopg2
 from datetime import datetime, timedelta, timezone
-from database import get_db_connection
+from psycopg2.extras import execute_values
+from database import db_cursor, copy_glucose_readings, glucose_rollups_ready
+from cache_service import on_new_glucose_reading, on_new_meal_log
 
 def clear_user_data(user_id):
     """Deletes all non-user data for a specific user to ensure a clean slate."""
-    conn = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM meal_logs WHERE user_id = %s;", (user_id,))
-        cur.execute("DELETE FROM insulin_doses WHERE user_id = %s;", (user_id,))
-        cur.execute("DELETE FROM glucose_readings WHERE user_id = %s;", (user_id,))
-        conn.commit()
+        with db_cursor() as cur:
+            cur.execute("DELETE FROM meal_logs WHERE user_id = %s;", (user_id,))
+            cur.execute("DELETE FROM insulin_doses WHERE user_id = %s;", (user_id,))
+            cur.execute("DELETE FROM glucose_readings WHERE user_id = %s;", (user_id,))
+            if glucose_rollups_ready(cur):
+                cur.execute("DELETE FROM glucose_rollup_hourly WHERE user_id = %s;", (user_id,))
+                cur.execute("DELETE FROM glucose_rollup_daily WHERE user_id = %s;", (user_id,))
         print(f"Cleared existing data for user_id: {user_id}")
     except Exception as e:
+        # db_cursor rolled the transaction back
         print(f"An error occurred while clearing data: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
 
 # In simulator.py
 
@@ -32,8 +28,6 @@ def generate_and_insert_data(user_id, days_of_data=3):
     Generates and inserts more realistic time-series data.
     """
     clear_user_data(user_id)
-    conn = get_db_connection()
-    cur = conn.cursor()
 
     now = datetime.now(timezone.utc)
     start_time = now - timedelta(days=days_of_data)
@@ -45,6 +39,8 @@ def generate_and_insert_data(user_id, days_of_data=3):
     active_insulin_effect = 0 
     
     glucose_readings_to_insert = []
+    meal_logs_to_insert = []
+    insulin_doses_to_insert = []
     print(f"Generating data from {start_time} to {now}...")
 
     while current_time < now:
@@ -67,16 +63,10 @@ def generate_and_insert_data(user_id, days_of_data=3):
         if is_meal_time and random.random() < 0.15: # Less frequent but adds up
             meal_carbs = random.randint(30, 80)
             meal_description = f"Simulated Meal ({meal_carbs}g)"
-            cur.execute(
-                "INSERT INTO meal_logs (user_id, timestamp, meal_description, carb_count) VALUES (%s, %s, %s, %s)",
-                (user_id, current_time, meal_description, meal_carbs)
-            )
+            meal_logs_to_insert.append((user_id, current_time, meal_description, meal_carbs))
             
             insulin_dose = round(meal_carbs / 12, 1) # Using a 1:12 ratio
-            cur.execute(
-                "INSERT INTO insulin_doses (user_id, timestamp, dose_amount, dose_type) VALUES (%s, %s, %s, %s)",
-                (user_id, current_time, insulin_dose, 'bolus')
-            )
+            insulin_doses_to_insert.append((user_id, current_time, insulin_dose, 'bolus'))
 
             # Carbs cause a rise, but insulin will cause a drop.
             # We model the total effect of insulin over the next few hours.
@@ -94,22 +84,31 @@ def generate_and_insert_data(user_id, days_of_data=3):
         glucose_readings_to_insert.append((user_id, current_time, round(current_glucose, 2)))
         current_time += timedelta(minutes=5)
     
-    # --- The insertion logic remains the same ---
+    # --- Everything is written in one transaction on a pooled connection ---
+    # Meals and doses go in one multi-row INSERT each, readings through COPY
     print(f"Inserting {len(glucose_readings_to_insert)} glucose readings...")
     try:
-        for reading in glucose_readings_to_insert:
-            cur.execute(
-                "INSERT INTO glucose_readings (user_id, timestamp, glucose_value) VALUES (%s, %s, %s)",
-                reading
+        with db_cursor() as cur:
+            execute_values(
+                cur, "INSERT INTO meal_logs (user_id, timestamp, meal_description, carb_count) VALUES %s",
+                meal_logs_to_insert
             )
-        conn.commit()
+            execute_values(
+                cur, "INSERT INTO insulin_doses (user_id, timestamp, dose_amount, dose_type) VALUES %s",
+                insulin_doses_to_insert
+            )
+            copy_glucose_readings(cur, user_id, [(t, value) for _, t, value in glucose_readings_to_insert])
         print(f"Successfully inserted {len(glucose_readings_to_insert)} readings.")
     except Exception as e:
+        # db_cursor rolled the transaction back
         print(f"An error occurred during insert: {e}")
-        conn.rollback()
-    finally:
-        cur.close()
-        conn.close()
+        return
+
+    # Old data was cleared and replaced: drop the user's cached dashboard, analytics and predictions
+    on_new_meal_log(int(user_id))
+    if glucose_readings_to_insert:
+        _, latest_time, latest_value = glucose_readings_to_insert[-1]
+        on_new_glucose_reading(int(user_id), latest_value, latest_time)
 
 # ... (keep the if __name__ == '__main__' block) ...
 
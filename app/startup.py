@@ -0,0 +1,131 @@
+# file: startup.py
+# Lazy initialization of the heavy ML subsystems and a startup-time report
+#
+# TensorFlow/Keras, torch/stable_baselines3 and the NLP lookup maps are only
+# built the first time something needs them (or by the optional warmup thread),
+# so a fresh worker can answer /api/health immediately.
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+# Load every lazy component in a background thread right after startup
+WARMUP_ON_START = os.getenv("AURA_WARMUP_ON_START", "1") == "1"
+
+_PROCESS_STARTED = time.monotonic()
+_PROCESS_STARTED_AT = datetime.now().isoformat()
+
+_timings: List[dict] = []
+_timings_lock = threading.Lock()
+_components: Dict[str, "LazyComponent"] = {}
+_warmup = {"status": "not_started", "started_at": None, "finished_at": None, "seconds": None}
+
+
+@contextmanager
+def timed(name: str, kind: str = "import"):
+    """
+    Records how long the wrapped block took under `name`.
+    kind is "import", "model_load", or "warmup" (wrappers around the other two, not counted in the totals).
+    """
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        with _timings_lock:
+            _timings.append({
+                "name": name,
+                "kind": kind,
+                "seconds": round(elapsed, 4),
+                "status": status,
+                "thread": threading.current_thread().name,
+                "since_start_s": round(time.monotonic() - _PROCESS_STARTED, 3)
+            })
+        print(f"[Startup] {kind} {name}: {elapsed:.3f}s ({status})")
+
+
+class LazyComponent:
+    """
+    A value built on first use by `factory()`, exactly once, even when several
+    request threads (or the warmup thread) ask for it at the same time.
+    A failed build is recorded and retried on the next call.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], kind: str = "import"):
+        self.name = name
+        self.kind = kind
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        _components[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                with timed(self.name, self.kind):
+                    self._value = self._factory()
+                self._loaded = True
+        return self._value
+
+
+def warmup() -> None:
+    """Builds every registered component, logging (not raising) failures."""
+    _warmup.update(status="running", started_at=datetime.now().isoformat())
+    started = time.perf_counter()
+    failed = []
+    attempted = set()
+    # Importing one component can register more (e.g. the RL agent), so keep going until none are left
+    while True:
+        pending = [name for name in list(_components) if name not in attempted]
+        if not pending:
+            break
+        for name in pending:
+            attempted.add(name)
+            try:
+                _components[name].get()
+            except Exception as e:
+                failed.append(name)
+                print(f"[Startup] Warmup of {name} failed: {e}")
+    _warmup.update(
+        status="failed" if failed else "done",
+        finished_at=datetime.now().isoformat(),
+        seconds=round(time.perf_counter() - started, 3),
+        failed=failed
+    )
+    print(f"[Startup] Warmup finished in {_warmup['seconds']}s")
+
+
+def start_background_warmup() -> threading.Thread:
+    """Runs warmup() on a daemon thread so the server can start accepting requests right away."""
+    thread = threading.Thread(target=warmup, name="aura-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_startup_report() -> dict:
+    """Time spent per import and per model load, plus which components are ready."""
+    with _timings_lock:
+        timings = list(_timings)
+    return {
+        "process_started_at": _PROCESS_STARTED_AT,
+        "uptime_s": round(time.monotonic() - _PROCESS_STARTED, 3),
+        "warmup": dict(_warmup),
+        "components": {name: c.loaded for name, c in _components.items()},
+        "total_import_s": round(sum(t["seconds"] for t in timings if t["kind"] == "import"), 3),
+        "total_model_load_s": round(sum(t["seconds"] for t in timings if t["kind"] == "model_load"), 3),
+        "timings": timings
+    }
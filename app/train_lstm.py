@@ -0,0 +1,60 @@
+# file: train_lstm.py
+# Offline training for the default glucose predictor (same pipeline as notebooks/lstm_training.ipynb)
+#
+# Usage:
+#   python train_lstm.py                  # multi-horizon model (one forward pass per forecast)
+#   python train_lstm.py --single-step    # legacy one-step model (recursive forecasting)
+
+import argparse
+import os
+import xml.etree.ElementTree as ET
+import numpy as np
+import joblib
+from sklearn.preprocessing import MinMaxScaler
+
+from config import DATA_PATH, MODEL_PATH, BASE_DIR
+from model_trainer import (
+    LOOK_BACK, FORECAST_HORIZON, build_model,
+    create_sequences, create_multi_horizon_sequences
+)
+
+SCALER_PATH = os.path.join(BASE_DIR, 'models', 'scaler.gz')
+EPOCHS = 5
+BATCH_SIZE = 32
+
+
+def load_glucose_series(xml_path: str = DATA_PATH) -> np.ndarray:
+    """Reads the OhioT1DM-style <glucose_level> events into a (n, 1) float32 array."""
+    root = ET.parse(xml_path).getroot()
+    values = [float(event.get('value')) for event in root.findall('./glucose_level/event') if event.get('value')]
+    return np.array(values, dtype='float32').reshape(-1, 1)
+
+
+def train_default_model(multi_horizon: bool = True, epochs: int = EPOCHS,
+                        model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH, data_path: str = DATA_PATH):
+    print(f"--- [Offline Trainer] Loading data from {data_path} ---")
+    dataset = load_glucose_series(data_path)
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    dataset_scaled = scaler.fit_transform(dataset)
+
+    if multi_horizon:
+        trainX, trainY = create_multi_horizon_sequences(dataset_scaled, LOOK_BACK, FORECAST_HORIZON)
+    else:
+        trainX, trainY = create_sequences(dataset_scaled, LOOK_BACK)
+    trainX = np.reshape(trainX, (trainX.shape[0], trainX.shape[1], 1))
+    print(f"--- [Offline Trainer] {len(trainX)} training windows ({'multi-horizon' if multi_horizon else 'single-step'}) ---")
+
+    model = build_model(LOOK_BACK, FORECAST_HORIZON if multi_horizon else 1)
+    model.fit(trainX, trainY, epochs=epochs, batch_size=BATCH_SIZE, verbose=1)
+
+    model.save(model_path)
+    joblib.dump(scaler, scaler_path)
+    print(f"--- [Offline Trainer] Saved '{model_path}' and '{scaler_path}' ---")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the default Aura glucose predictor")
+    parser.add_argument('--single-step', action='store_true', help="Train the legacy one-step model")
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    args = parser.parse_args()
+    train_default_model(multi_horizon=not args.single_step, epochs=args.epochs)